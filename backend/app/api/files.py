@@ -3,12 +3,21 @@ File management endpoints.
 """
 import os
 import glob
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import FileResponse
+import asyncio
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, Response
 from typing import Optional
 
-from ..models import MidiFileMetadata, PaginatedResponse, BackendType, MusicStyle, Mood, MusicKey, MidiEditRequest
+from ..models import (
+    MidiFileMetadata, PaginatedResponse, BackendType, MusicStyle, Mood, MusicKey, MidiEditRequest,
+    ContinueRequest, GenerationStatus
+)
 from ..config import settings
+from ..utils.midi_notes import read_midi_notes
+from ..utils.thumbnail import thumbnail_path_for, write_thumbnail
+from ..services.score_service import score_service
+from ..services.job_store import job_store, FINISHED_STATUSES
+from .generation import submit_continuation
 
 try:
     import mido
@@ -71,7 +80,8 @@ async def list_files(
             "filename": filename,
             "file_size": stats.st_size,
             "created_at": stats.st_ctime,
-            "download_url": f"/api/files/{file_id}/download"
+            "download_url": f"/api/files/{file_id}/download",
+            "thumbnail_url": _thumbnail_url(file_id, filepath)
         }
         file_list.append(metadata)
 
@@ -100,6 +110,12 @@ async def list_files(
     )
 
 
+def _thumbnail_url(file_id: str, filepath: str) -> str:
+    """Build a versioned thumbnail URL that changes whenever the MIDI file does."""
+    version = os.stat(filepath).st_mtime_ns
+    return f"/api/files/{file_id}/thumbnail?v={version}"
+
+
 @router.get("/{file_id}")
 async def get_file_metadata(file_id: str):
     """Get metadata for a specific file."""
@@ -116,12 +132,41 @@ async def get_file_metadata(file_id: str):
                 "filename": filename,
                 "file_size": stats.st_size,
                 "created_at": stats.st_ctime,
-                "download_url": f"/api/files/{file_id}/download"
+                "download_url": f"/api/files/{file_id}/download",
+                "thumbnail_url": _thumbnail_url(file_id, filepath)
             }
 
     raise HTTPException(status_code=404, detail="File not found")
 
 
+@router.get("/{file_id}/thumbnail")
+async def get_file_thumbnail(file_id: str):
+    """
+    Get the piano-roll thumbnail for a MIDI file.
+
+    Thumbnails are rendered at finalize time and after edits. Files that
+    predate thumbnails get one rendered on first request.
+    """
+    midi_files = glob.glob(os.path.join(settings.GENERATED_MIDI_PATH, "*.mid"))
+
+    for filepath in midi_files:
+        if file_id in filepath:
+            thumb_path = thumbnail_path_for(filepath)
+            if not os.path.exists(thumb_path) and not await asyncio.to_thread(write_thumbnail, filepath):
+                raise HTTPException(status_code=500, detail="Thumbnail could not be rendered")
+
+            # URLs carry a version query, so the content behind them never changes
+            return FileResponse(
+                path=thumb_path,
+                media_type="image/svg+xml",
+                headers={
+                    "Cache-Control": f"public, max-age={settings.THUMBNAIL_CACHE_MAX_AGE}, immutable"
+                }
+            )
+
+    raise HTTPException(status_code=404, detail="File not found")
+
+
 @router.get("/{file_id}/download")
 async def download_file(file_id: str):
     """Download a MIDI file."""
@@ -149,6 +194,10 @@ async def delete_file(file_id: str):
     for filepath in midi_files:
         if file_id in filepath:
             os.remove(filepath)
+            thumb_path = thumbnail_path_for(filepath)
+            if os.path.exists(thumb_path):
+                os.remove(thumb_path)
+            score_service.invalidate(filepath)
             return {"message": "File deleted successfully", "file_id": file_id}
 
     raise HTTPException(status_code=404, detail="File not found")
@@ -176,6 +225,49 @@ async def search_files(q: str):
     return {"results": results, "total": len(results)}
 
 
+@router.post(
+    "/{file_id}/continue",
+    response_model=MidiFileMetadata,
+    responses={429: {"description": "Queue full, retry after the given delay"}}
+)
+async def continue_file(file_id: str, continue_request: ContinueRequest):
+    """
+    Extend a MIDI file with a newly generated section.
+
+    The tail of the file seeds the new section (Magenta primer melody or
+    the Simple engine's phrase state) and only that section is generated.
+    The original file is kept; the result is saved as a new file. The work
+    runs as a job in the backend's scheduler pool (visible to the job
+    status endpoints); this request waits for it.
+    """
+    if not MIDO_AVAILABLE:
+        raise HTTPException(status_code=500, detail="mido library not available")
+
+    midi_files = glob.glob(os.path.join(settings.GENERATED_MIDI_PATH, "*.mid"))
+
+    for filepath in midi_files:
+        if file_id in filepath:
+            job, retry_after = await submit_continuation(filepath, continue_request)
+            if retry_after is not None:
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"{job.parameters.backend.value} queue is full",
+                    headers={"Retry-After": str(retry_after)}
+                )
+            job_id = job.job_id
+            while True:
+                version = job_store.version(job_id)
+                job = job_store.get(job_id)
+                if job is None or job.status in FINISHED_STATUSES:
+                    break
+                await job_store.wait_for_change(job_id, version, settings.SSE_KEEPALIVE_INTERVAL)
+            if job is None or job.status != GenerationStatus.COMPLETED:
+                raise HTTPException(status_code=500, detail=(job and job.error) or "Continuation failed")
+            return job.result
+
+    raise HTTPException(status_code=404, detail="File not found")
+
+
 @router.get("/{file_id}/notes")
 async def get_file_notes(file_id: str):
     """Get all notes from a MIDI file for visualization and editing."""
@@ -186,53 +278,58 @@ async def get_file_notes(file_id: str):
 
     for filepath in midi_files:
         if file_id in filepath:
-            mid = mido.MidiFile(filepath)
-            notes = []
-            tempo = 500000  # default 120 BPM
-
-            for track_idx, track in enumerate(mid.tracks):
-                current_time = 0  # in ticks
-                active_notes = {}  # note -> (start_tick, velocity)
-
-                for msg in track:
-                    current_time += msg.time
-
-                    if msg.type == 'set_tempo':
-                        tempo = msg.tempo
-
-                    if msg.type == 'note_on' and msg.velocity > 0:
-                        active_notes[msg.note] = (current_time, msg.velocity)
-                    elif msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0):
-                        if msg.note in active_notes:
-                            start_tick, velocity = active_notes.pop(msg.note)
-                            dur_ticks = current_time - start_tick
-                            # Convert ticks to seconds
-                            start_sec = mido.tick2second(start_tick, mid.ticks_per_beat, tempo)
-                            dur_sec = mido.tick2second(dur_ticks, mid.ticks_per_beat, tempo)
-                            if dur_sec > 0:
-                                notes.append({
-                                    "midi": msg.note,
-                                    "time": round(start_sec, 4),
-                                    "duration": round(dur_sec, 4),
-                                    "velocity": velocity,
-                                    "track": track_idx,
-                                })
-
-            # Sort by time
-            notes.sort(key=lambda n: (n["time"], n["midi"]))
-
-            bpm = round(mido.tempo2bpm(tempo))
-            total_duration = max((n["time"] + n["duration"] for n in notes), default=0)
+            parsed = read_midi_notes(filepath)
+            return {"file_id": file_id, **parsed}
 
-            return {
-                "file_id": file_id,
-                "notes": notes,
-                "tempo": bpm,
-                "duration": round(total_duration, 2),
-                "ticks_per_beat": mid.ticks_per_beat,
-                "track_count": len(mid.tracks),
-                "note_count": len(notes),
-            }
+    raise HTTPException(status_code=404, detail="File not found")
+
+
+@router.get("/{file_id}/score")
+async def get_file_score(
+    file_id: str,
+    request: Request,
+    format: str = Query("musicxml", regex="^(musicxml|json)$")
+):
+    """
+    Get a quantized two-hand score for a MIDI file.
+
+    Args:
+        file_id: File identifier
+        format: "musicxml" for a MusicXML document (streamed per measure),
+                or "json" for the compact score model
+
+    Returns:
+        The score, cached per file version and tagged with an ETag
+    """
+    if not MIDO_AVAILABLE:
+        raise HTTPException(status_code=500, detail="mido library not available")
+
+    midi_files = glob.glob(os.path.join(settings.GENERATED_MIDI_PATH, "*.mid"))
+
+    for filepath in midi_files:
+        if file_id in filepath:
+            etag = f'"{file_id}-{score_service.version_of(filepath)}-{format}"'
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers=headers)
+
+            if format == "json":
+                score = await score_service.get_score(filepath)
+                return JSONResponse({"file_id": file_id, **score}, headers=headers)
+
+            media_type = "application/vnd.recordare.musicxml+xml"
+            cached_path = score_service.cached_musicxml(filepath)
+            if cached_path:
+                return FileResponse(path=cached_path, media_type=media_type, headers=headers)
+
+            # Rendering runs in Starlette's threadpool as the sync iterator is consumed
+            score = await score_service.get_score(filepath)
+            title = os.path.splitext(os.path.basename(filepath))[0]
+            return StreamingResponse(
+                score_service.stream_musicxml(filepath, score, title),
+                media_type=media_type,
+                headers=headers
+            )
 
     raise HTTPException(status_code=404, detail="File not found")
 
@@ -282,6 +379,10 @@ async def update_file_notes(file_id: str, edit_request: MidiEditRequest):
             mid.save(filepath)
             file_size = os.path.getsize(filepath)
 
+            # Notes changed, so the stored preview and score are stale
+            await asyncio.to_thread(write_thumbnail, filepath)
+            score_service.invalidate(filepath)
+
             return {
                 "file_id": file_id,
                 "filename": os.path.basename(filepath),
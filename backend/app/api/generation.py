@@ -1,7 +1,11 @@
 """
 Music generation endpoints.
 """
-from fastapi import APIRouter, HTTPException
+import os
+import asyncio
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import Optional, Tuple, Callable, Awaitable
 from uuid import uuid4
 from datetime import datetime
 
@@ -10,68 +14,343 @@ from ..models import (
     GenerationJob,
     GenerationStatus,
     GenerationStage,
-    MusicParameters
+    ContinueRequest
 )
-from ..services.generation_service import GenerationService
+from ..services.job_store import job_store, FINISHED_STATUSES
+from ..services.scheduler import scheduler
+from ..services.single_flight import single_flight, Flight
+from ..services.warm_pool import warm_pool
+from ..services.worker_bridge import worker_bridge
+from ..services.backend_router import backend_router
+from ..services.continuation_service import continuation_service
+from ..services.job_runner import (
+    run_generation, run_continuation,
+    update_queue_info, mark_cancelled, apply_progress, apply_result
+)
+from ..config import settings
 
 router = APIRouter()
 
-# In-memory job storage (would use Redis/database in production)
-active_jobs = {}
-
-# Generation service instance
-generation_service = GenerationService()
+# Tasks of REST jobs mirroring a Socket.IO generation (job_id -> task)
+_followers = {}
 
 
-@router.post("/generate", response_model=GenerationJob)
+@router.post(
+    "/generate",
+    response_model=GenerationJob,
+    responses={429: {"description": "Queue full, retry after the given delay"}}
+)
 async def start_generation(request: GenerationRequest):
     """
     Start a music generation job.
 
     Args:
-        request: Generation parameters
+        request: Generation parameters and priority class
 
     Returns:
-        GenerationJob with job_id for tracking
+        GenerationJob with job_id for tracking, or 429 with Retry-After
+        when the backend's queue is full. Duplicate seeded requests and
+        ``same_as`` requests get the in-flight job they coalesced onto.
+    """
+    job, retry_after = await submit_generation(request)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail=f"{job.parameters.backend.value} queue is full",
+            headers={"Retry-After": str(retry_after)}
+        )
+    return job
+
+
+async def submit_generation(
+    request: GenerationRequest,
+    job_id: Optional[str] = None,
+    sid: Optional[str] = None,
+    alias: Optional[str] = None,
+    inline: Optional[dict] = None,
+    announce: Optional[Callable[[GenerationJob], Awaitable[None]]] = None
+) -> Tuple[GenerationJob, Optional[int]]:
     """
+    Create a job for a generation request and queue it.
+
+    Shared by the REST endpoint and Socket.IO. Duplicate seeded requests
+    and ``same_as`` requests get the in-flight job they coalesced onto,
+    whose id differs from ``job_id``.
+
+    Args:
+        request: Generation parameters and priority class
+        job_id: Id for the new job (generated when not given)
+        sid: Socket.IO session a worker process should emit updates to
+        alias: The session's jobId for the job, used in those updates
+        inline: Inline payload options for those emits
+        announce: In worker mode, awaited with the new job before any
+                  worker can claim it (so its events come after)
+
+    Returns:
+        Tuple of (job, retry_after_seconds); retry_after is set when the
+        backend's queue is full. The rejected job is not stored (in worker
+        mode it was already published, and is marked failed)
+    """
+    # Attach to an identical in-flight generation if there is one
+    flight_key = single_flight.key_for(request.parameters)
+    flight = single_flight.join(key=flight_key, job_id=request.same_as)
+    if flight:
+        existing = job_store.get(flight.job_id)
+        if existing:
+            update_queue_info(existing)
+            return existing, None
+
+    # Pick a concrete backend for auto requests
+    parameters, routing = backend_router.resolve(request.parameters)
+    request = request.model_copy(update={"parameters": parameters})
+
     # Create job
-    job_id = str(uuid4())
+    job_id = job_id or str(uuid4())
     job = GenerationJob(
         job_id=job_id,
         status=GenerationStatus.PENDING,
         stage=GenerationStage.INITIALIZING,
         progress=0,
-        message="Job created",
+        message=f"Auto-selected {routing.chosen.value}: {routing.reason}" if routing else "Job created",
         parameters=request.parameters,
-        created_at=datetime.now()
+        created_at=datetime.now(),
+        priority=request.priority,
+        routing=routing
     )
 
-    # Store job
-    active_jobs[job_id] = job
+    # Serve a pre-generated piece if one is ready
+    warm_pool.record(request.parameters)
+    if not flight:
+        pooled = await warm_pool.take(request.parameters)
+        if pooled:
+            apply_result(job, pooled, None)
+            job.message = "Served from warm pool"
+            job_store.add(job)
+            return job, None
 
-    # Start generation asynchronously (fire and forget)
-    # Note: In production, use background tasks or Celery
-    import asyncio
-    asyncio.create_task(_run_generation(job_id, request.parameters))
+    if flight:
+        # Started outside this process's job store; follow it without a worker slot
+        job_store.add(job)
+        _followers[job_id] = asyncio.create_task(_follow_flight(job_id, flight))
+        return job, None
 
-    return job
+    if settings.GENERATION_MODE == "worker":
+        # Publish the pending job before any worker can claim it, so its
+        # snapshot can't land after (and overwrite) the worker's updates
+        job_store.add(job)
+        if announce:
+            await announce(job)
+        accepted, retry_after = await worker_bridge.enqueue(job, sid=sid, alias=alias, inline=inline)
+        if not accepted:
+            apply_result(job, None, "Queue full")
+            return job, retry_after
+    else:
+        # Queue generation in the backend's worker pool
+        accepted, retry_after = scheduler.submit(
+            job_id,
+            request.parameters.backend,
+            lambda: run_generation(job_id, request.parameters),
+            priority=request.priority
+        )
+        if not accepted:
+            return job, retry_after
+        job_store.add(job)
+
+    single_flight.lead(job_id, flight_key)
+    update_queue_info(job)
+
+    return job, None
+
+
+async def submit_continuation(
+    midi_path: str,
+    request: ContinueRequest
+) -> Tuple[GenerationJob, Optional[int]]:
+    """
+    Create a job that extends a file and queue it in the backend's pool.
+
+    Continuations always run in this process's scheduler (also in worker
+    mode, where workers only take generation requests). Key, style and
+    mood default to the source file's.
+
+    Returns:
+        Tuple of (job, retry_after_seconds); retry_after is set when the
+        backend's queue is full, and the rejected job is not stored
+    """
+    parameters = await continuation_service.parameters_for(midi_path, request)
+    job_id = str(uuid4())
+    job = GenerationJob(
+        job_id=job_id,
+        status=GenerationStatus.PENDING,
+        stage=GenerationStage.INITIALIZING,
+        progress=0,
+        message=f"Continuing {os.path.basename(midi_path)}",
+        parameters=parameters,
+        created_at=datetime.now()
+    )
+
+    accepted, retry_after = scheduler.submit(
+        job_id, parameters.backend, lambda: run_continuation(job_id, midi_path, parameters)
+    )
+    if not accepted:
+        return job, retry_after
+    job_store.add(job)
+    job.queue_position, job.estimated_wait_seconds = scheduler.queue_info(job_id)
+    return job, None
 
 
 @router.get("/generate/{job_id}/status", response_model=GenerationJob)
-async def get_generation_status(job_id: str):
+async def get_generation_status(
+    job_id: str,
+    request: Request,
+    wait: Optional[float] = Query(None, ge=0, le=60, description="Long-poll timeout in seconds")
+):
     """
     Get the status of a generation job.
 
+    Every response carries an ETag naming the job version. With ``wait``
+    and a matching If-None-Match header, the request blocks until the job
+    changes (returning it) or the timeout passes (returning 304).
+
     Args:
         job_id: Job identifier
+        wait: Long-poll timeout in seconds
 
     Returns:
         Current job status
     """
-    if job_id not in active_jobs:
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    seen = request.headers.get("if-none-match")
+    version = job_store.version(job_id)
+    if seen == _etag(job_id, version) and job.status not in FINISHED_STATUSES:
+        if not wait or not await job_store.wait_for_change(job_id, version, wait):
+            return Response(status_code=304, headers={"ETag": seen})
+        version = job_store.version(job_id)
+
+    update_queue_info(job)
+    return Response(
+        content=job.model_dump_json(),
+        media_type="application/json",
+        headers={"ETag": _etag(job_id, version)}
+    )
+
+
+@router.get("/generate/{job_id}/events")
+async def stream_generation_events(job_id: str):
+    """
+    Stream job updates as Server-Sent Events.
+
+    Sends a ``status`` event with the full job on every change, then a
+    final ``complete`` or ``failed`` event and closes. Idle periods are
+    filled with comment keep-alives.
+
+    Args:
+        job_id: Job identifier
+
+    Returns:
+        text/event-stream response
+    """
+    if job_store.get(job_id) is None:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    return active_jobs[job_id]
+    async def event_stream():
+        version = None
+        while True:
+            job = job_store.get(job_id)
+            current = job_store.version(job_id)
+            if current != version:
+                version = current
+                update_queue_info(job)
+                if job.status in FINISHED_STATUSES:
+                    event = "complete" if job.status == GenerationStatus.COMPLETED else "failed"
+                    yield f"id: {version}\nevent: {event}\ndata: {job.model_dump_json()}\n\n"
+                    return
+                yield f"id: {version}\nevent: status\ndata: {job.model_dump_json()}\n\n"
+
+            if not await job_store.wait_for_change(job_id, version, settings.SSE_KEEPALIVE_INTERVAL):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.delete(
+    "/generate/{job_id}",
+    response_model=GenerationJob,
+    responses={202: {
+        "description": "Not cancelled yet: other requests share the job, or its worker has not confirmed"
+    }}
+)
+async def cancel_generation(job_id: str):
+    """
+    Cancel a queued or running generation job.
+
+    Args:
+        job_id: Job identifier
+
+    Returns:
+        The job, now cancelled, or 202 with the job while other requests
+        share it or a worker process has yet to confirm the cancellation
+    """
+    job = await cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status not in FINISHED_STATUSES:
+        return Response(content=job.model_dump_json(), media_type="application/json", status_code=202)
+    if job.status != GenerationStatus.CANCELLED:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job already finished. Current status: {job.status}"
+        )
+
+    return job
+
+
+async def cancel_job(job_id: str) -> Optional[GenerationJob]:
+    """
+    Cancel a job wherever it is: queued, running, or following another flight.
+
+    A job that other coalesced requests still share is not cancelled; the
+    caller is detached and the job is returned still running. A job
+    running in a worker process is only cancelled once that worker
+    reports it; if it hasn't within a few seconds, the job is returned
+    still unfinished and the cancellation arrives as a later update.
+
+    Returns:
+        The job after cancellation, or None if it does not exist
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        return None
+    if job.status in FINISHED_STATUSES:
+        return job
+    if single_flight.leave(job_id):
+        return job
+
+    # Followers and continuations run in this process in worker mode too
+    in_process = job_id in _followers or job_id in scheduler
+    if settings.GENERATION_MODE == "worker" and not in_process:
+        if not await worker_bridge.cancel(job_id):
+            # Running in a worker process; wait for it to report back
+            version = job_store.version(job_id)
+            await job_store.wait_for_change(job_id, version, settings.WORKER_CANCEL_WAIT)
+            return job_store.get(job_id)
+
+    await scheduler.cancel(job_id)
+    follower = _followers.pop(job_id, None)
+    if follower:
+        follower.cancel()
+        await asyncio.wait([follower], timeout=5)
+
+    if job.status not in FINISHED_STATUSES:
+        mark_cancelled(job)
+    return job
 
 
 @router.get("/generate/{job_id}/result")
@@ -85,11 +364,10 @@ async def get_generation_result(job_id: str):
     Returns:
         File metadata and download URL
     """
-    if job_id not in active_jobs:
+    job = job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    job = active_jobs[job_id]
-
     if job.status != GenerationStatus.COMPLETED:
         raise HTTPException(
             status_code=400,
@@ -99,51 +377,32 @@ async def get_generation_result(job_id: str):
     return job.result
 
 
-async def _run_generation(job_id: str, parameters: MusicParameters):
+def _etag(job_id: str, version: int) -> str:
+    return f'"{job_id}-{version}"'
+
+
+async def _follow_flight(job_id: str, flight: Flight):
     """
-    Run generation in background and update job status.
+    Mirror another in-flight generation (e.g. one started over Socket.IO) into a job.
 
     Args:
-        job_id: Job identifier
-        parameters: Generation parameters
+        job_id: Job identifier of the coalesced request
+        flight: The generation being followed
     """
-    job = active_jobs[job_id]
-
-    # Update job to in_progress
+    job = job_store.get(job_id)
     job.status = GenerationStatus.IN_PROGRESS
-    job.stage = GenerationStage.GENERATING
-    job.progress = 10
+    job_store.save(job)
 
-    # Progress callback
     async def progress_callback(stage: str, progress: int, message: str):
-        job.stage = GenerationStage(stage)
-        job.progress = progress
-        job.message = message
+        apply_progress(job, stage, progress, message)
 
     try:
-        # Generate music
-        result, error = await generation_service.generate(parameters, progress_callback)
-
-        if result:
-            # Success
-            job.status = GenerationStatus.COMPLETED
-            job.stage = GenerationStage.COMPLETE
-            job.progress = 100
-            job.message = "Generation completed successfully"
-            job.result = result
-            job.completed_at = datetime.now()
-        else:
-            # Failure
-            job.status = GenerationStatus.FAILED
-            job.stage = GenerationStage.ERROR
-            job.error = error or "Unknown error"
-            job.message = f"Generation failed: {job.error}"
-            job.completed_at = datetime.now()
-
+        result, error = await single_flight.wait(flight, progress_callback)
+        apply_result(job, result, error)
+    except asyncio.CancelledError:
+        mark_cancelled(job)
+        raise
     except Exception as e:
-        # Exception
-        job.status = GenerationStatus.FAILED
-        job.stage = GenerationStage.ERROR
-        job.error = str(e)
-        job.message = f"Generation error: {str(e)}"
-        job.completed_at = datetime.now()
+        apply_result(job, None, str(e))
+    finally:
+        _followers.pop(job_id, None)
@@ -1,38 +1,43 @@
 """
 Health check and backend status endpoints.
 """
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from datetime import datetime
-import os
-import shutil
 
-from ..models import HealthResponse, BackendStatus
+from ..models import (
+    BackendType,
+    HealthResponse,
+    LivenessResponse,
+    ReadinessResponse,
+    BackendStatus
+)
 from ..config import settings
+from ..services.job_store import job_store
+from ..services.scheduler import scheduler
+from ..services.single_flight import single_flight
+from ..services.warm_pool import warm_pool
+from ..services.worker_bridge import worker_bridge
+from ..services.generation_service import hedge_stats
+from ..services.circuit_breaker import breakers
+from ..services.backend_router import backend_router
+from ..services.capabilities import capabilities
+from ..services.magenta_generator import resident_status
+from ..services.magenta_pool import magenta_pool
+from ..services.magenta_service import magenta_variations
+from ..services.continuation_service import continuation_service
+from ..services.gradio_pool import gradio_clients
+from ..services.prompt_cache import prompt_cache
 
 router = APIRouter()
 
 
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Check overall system health and backend availability."""
-    backends = {}
-
-    # Check Magenta availability
-    magenta_available = (
-        os.path.exists(settings.MAGENTA_BUNDLE_FILE) and
-        (shutil.which("melody_rnn_generate") is not None or _check_magenta_python())
-    )
-    backends["magenta"] = magenta_available
-
-    # Check HuggingFace availability (basic check - can always try)
-    backends["huggingface"] = True
-
-    # Simple MIDI always available if mido is installed
-    try:
-        import mido
-        backends["simple"] = True
-    except ImportError:
-        backends["simple"] = False
+    """Check overall system health and backend availability (cached probes)."""
+    backends = {
+        backend.value: capabilities.available(backend)
+        for backend in (BackendType.MAGENTA, BackendType.HUGGINGFACE, BackendType.SIMPLE)
+    }
 
     # Determine overall status
     if all(backends.values()):
@@ -42,60 +47,81 @@ async def health_check():
     else:
         status = "unhealthy"
 
+    checked = [c["checked_at"] for c in capabilities.snapshot().values()]
     return HealthResponse(
         status=status,
         backends=backends,
+        timestamp=datetime.now(),
+        resident_models=resident_status(),
+        checked_at=datetime.fromtimestamp(min(checked)) if checked else None
+    )
+
+
+@router.get("/health/live", response_model=LivenessResponse)
+async def liveness():
+    """Liveness probe for load balancers; does no backend work."""
+    return LivenessResponse(timestamp=datetime.now())
+
+
+@router.get(
+    "/health/ready",
+    response_model=ReadinessResponse,
+    responses={503: {"model": ReadinessResponse, "description": "Not ready to take jobs"}}
+)
+async def readiness(response: Response):
+    """Readiness probe: background services running and a backend able to serve jobs."""
+    reasons = []
+    if not capabilities.ready:
+        reasons.append("capability probes have not completed")
+    elif not any(capabilities.available(b) for b in (BackendType.SIMPLE, BackendType.MAGENTA, BackendType.HUGGINGFACE)):
+        reasons.append("no generation backend available")
+    if not job_store.started:
+        reasons.append("job store not started")
+    if not scheduler.started and settings.GENERATION_MODE != "worker":
+        reasons.append("scheduler not started")
+
+    if reasons:
+        response.status_code = 503
+    return ReadinessResponse(
+        ready=not reasons,
+        reasons=reasons,
+        capabilities=capabilities.snapshot(),
+        job_store_started=job_store.started,
+        scheduler_started=scheduler.started,
         timestamp=datetime.now()
     )
 
 
 @router.get("/backends", response_model=list[BackendStatus])
 async def get_backend_status():
-    """Get detailed status of each backend."""
+    """Get detailed status of each backend (cached probes, breaker state and result cache)."""
     statuses = []
-
-    # Magenta status
-    magenta_msg = None
-    if not os.path.exists(settings.MAGENTA_BUNDLE_FILE):
-        magenta_msg = f"Bundle file not found at {settings.MAGENTA_BUNDLE_FILE}"
-    elif not shutil.which("melody_rnn_generate") and not _check_magenta_python():
-        magenta_msg = "Magenta CLI and Python API not available"
-
-    statuses.append(BackendStatus(
-        name="magenta",
-        available=magenta_msg is None,
-        message=magenta_msg
-    ))
-
-    # HuggingFace status
-    statuses.append(BackendStatus(
-        name="huggingface",
-        available=True,
-        message="Cloud API - requires internet connection"
-    ))
-
-    # Simple MIDI status
-    try:
-        import mido
+    for backend in (BackendType.MAGENTA, BackendType.HUGGINGFACE, BackendType.SIMPLE):
+        capability = capabilities.get(backend)
         statuses.append(BackendStatus(
-            name="simple",
-            available=True,
-            message="Procedural generation available"
+            name=backend.value,
+            available=capability is not None and capability.available,
+            message=capability.message if capability else "Not probed yet",
+            breakers=breakers.for_backend(backend.value),
+            cache=prompt_cache.get_stats() if backend == BackendType.HUGGINGFACE else None
         ))
-    except ImportError:
-        statuses.append(BackendStatus(
-            name="simple",
-            available=False,
-            message="mido library not installed"
-        ))
-
     return statuses
 
 
-def _check_magenta_python() -> bool:
-    """Check if Magenta Python API is available."""
-    try:
-        from magenta.models.melody_rnn import melody_rnn_sequence_generator
-        return True
-    except ImportError:
-        return False
+@router.get("/metrics")
+async def get_metrics():
+    """Get internal counters for job storage, scheduling, coalescing, hedging, routing, the warm pool and continuations."""
+    return {
+        "jobs": job_store.get_stats(),
+        "scheduler": scheduler.get_stats(),
+        "coalescing": single_flight.get_stats(),
+        "hedging": hedge_stats.get_stats(),
+        "routing": backend_router.get_stats(),
+        "hf_clients": gradio_clients.get_stats(),
+        "magenta_workers": magenta_pool.get_stats() if magenta_pool.started else None,
+        "magenta_variations": magenta_variations.get_stats(),
+        "warm_pool": warm_pool.get_stats(),
+        "continuation": continuation_service.get_stats(),
+        "workers": worker_bridge.get_stats() if settings.GENERATION_MODE == "worker" else None,
+        "timestamp": datetime.now()
+    }
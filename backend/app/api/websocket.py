@@ -1,100 +1,285 @@
 """
 WebSocket handlers for real-time updates.
+
+Generation requests go through the same job scheduler as the REST API.
+Each session can run several jobs at once; every job the session started
+or subscribed to is relayed from the job store by its own task, and
+events are multiplexed by jobId. In worker mode with a Socket.IO message
+queue, workers emit a session's own jobs to it directly instead: the API
+announces the pending job before it can be claimed and reports its
+cancellation, and the worker sends everything in between.
 """
+import time
 import asyncio
 from datetime import datetime
+from typing import Optional
+from uuid import uuid4
 
 from ..models import (
+    GenerationRequest,
+    GenerationJob,
+    JobPriority,
     MusicParameters,
-    GenerationStatus,
-    GenerationStage
+    GenerationStatus
 )
-from ..services.generation_service import GenerationService
-
-# Generation service instance
-generation_service = GenerationService()
+from ..config import settings
+from ..services.job_store import job_store, FINISHED_STATUSES
+from ..services.job_events import emit_job_update, emit_error, result_event
+from ..services.job_runner import upgrade_possible
+from ..services.single_flight import single_flight
+from ..services.worker_bridge import worker_bridge
+from .generation import cancel_job, submit_generation
 
 # Active WebSocket sessions (sid -> session info)
 active_sessions = {}
 
+# Tasks waiting for a worker to confirm a cancellation
+_cancel_watchers = set()
+
 
 async def handle_connection(sio, sid, environ):
     """Handle new WebSocket connection."""
     print(f"Client connected: {sid}")
     active_sessions[sid] = {
         "connected_at": datetime.now(),
-        "current_job": None
+        "jobs": {},  # client jobId -> server job id, for jobs this session requested
+        "owned": set(),  # server job ids this session created (not coalesced onto)
+        "relays": {}  # client jobId -> relay task, for started and subscribed jobs
     }
 
 
 async def handle_disconnect(sio, sid):
     """Handle WebSocket disconnection."""
     print(f"Client disconnected: {sid}")
-    if sid in active_sessions:
-        del active_sessions[sid]
+    session = active_sessions.pop(sid, None)
+    if session:
+        for task in session["relays"].values():
+            task.cancel()
+        # Nobody is listening any more; free the capacity (jobs other
+        # requests share keep running for them)
+        for job_id in set(session["jobs"].values()):
+            await cancel_job(job_id)
+
+
+def _active_jobs(session: dict) -> int:
+    """Unfinished jobs a session started itself (finished ones are forgotten)."""
+    for alias, job_id in list(session["jobs"].items()):
+        job = job_store.get(job_id)
+        if (job is None or job.status in FINISHED_STATUSES) and alias not in session["relays"]:
+            del session["jobs"][alias]
+            session["owned"].discard(job_id)
+    return sum(
+        1 for job_id in session["jobs"].values()
+        if (job := job_store.get(job_id)) is not None and job.status not in FINISHED_STATUSES
+    )
 
 
 async def handle_generation_request(sio, sid, data):
     """
-    Handle generation request from WebSocket client.
+    Queue a generation job for a WebSocket client.
+
+    The job runs in the scheduler like a REST job; this handler returns as
+    soon as it is queued and a relay task streams its events (or, with
+    direct worker emits, the worker that claims it does). The server job
+    id is always a fresh UUID; the client's jobId only names the job
+    within this session.
 
     Args:
         sio: SocketIO server instance
         sid: Session ID
-        data: Request data containing parameters
+        data: Request data containing jobId, parameters and optionally
+              priority, sameAs, inlineMidi and inlineNotes
     """
+    job_id = data.get("jobId")
+    session = active_sessions.get(sid)
+    if session is None or not job_id:
+        return
+
     try:
-        # Parse parameters
-        job_id = data.get("jobId")
-        params_data = data.get("parameters", {})
-
-        # Create parameters model
-        parameters = MusicParameters(**params_data)
-
-        # Store job ID in session
-        if sid in active_sessions:
-            active_sessions[sid]["current_job"] = job_id
-
-        # Progress callback that emits to WebSocket
-        async def progress_callback(stage: str, progress: int, message: str):
-            await sio.emit("generation_progress", {
-                "jobId": job_id,
-                "stage": stage,
-                "progress": progress,
-                "message": message
-            }, room=sid)
-
-        # Send initial progress
-        await progress_callback("initializing", 0, "Starting generation...")
-
-        # Generate music
-        result, error = await generation_service.generate(parameters, progress_callback)
-
-        if result:
-            # Send completion event
-            await sio.emit("generation_complete", {
-                "jobId": job_id,
-                "fileId": result.file_id,
-                "filename": result.filename,
-                "fileSize": result.file_size,
-                "downloadUrl": f"/api/files/{result.file_id}/download"
-            }, room=sid)
-
-        else:
-            # Send error event
-            await sio.emit("generation_error", {
-                "jobId": job_id,
-                "error": error or "Unknown error",
-                "fallback": False  # Fallback already attempted
-            }, room=sid)
+        if job_id in session["relays"] or job_id in session["jobs"]:
+            await emit_error(sio, sid, job_id, "jobId already in use")
+            return
+        if _active_jobs(session) >= settings.WS_MAX_JOBS_PER_SESSION:
+            await emit_error(
+                sio, sid, job_id,
+                f"Too many concurrent jobs (limit {settings.WS_MAX_JOBS_PER_SESSION} per connection)"
+            )
+            return
+
+        request = GenerationRequest(
+            parameters=MusicParameters(**data.get("parameters", {})),
+            priority=JobPriority(data.get("priority", JobPriority.NORMAL.value)),
+            same_as=data.get("sameAs")
+        )
+        inline = _inline_options(data)
+        direct = _direct_emits()
+        server_job_id = str(uuid4())
+
+        async def announce(created: GenerationJob):
+            await emit_job_update(sio, sid, created, job_id)
+
+        job, retry_after = await submit_generation(
+            request,
+            job_id=server_job_id,
+            sid=sid if direct else None,
+            alias=job_id if direct else None,
+            inline=inline if direct else None,
+            announce=announce if direct else None
+        )
+        if retry_after is not None:
+            await emit_error(sio, sid, job_id, f"Server busy, retry in {retry_after}s")
+            return
+
+        # Events use the client's jobId, also when coalesced onto another job
+        session["jobs"][job_id] = job.job_id
+        owned = job.job_id == server_job_id
+        if owned:
+            session["owned"].add(job.job_id)
+        if not (direct and owned and job.status not in FINISHED_STATUSES):
+            _start_relay(sio, sid, job_id, job.job_id, inline)
+        # Otherwise the claiming worker emits the rest through the message queue
 
     except Exception as e:
-        # Send error event
-        await sio.emit("generation_error", {
-            "jobId": data.get("jobId"),
-            "error": str(e),
-            "fallback": False
-        }, room=sid)
+        await emit_error(sio, sid, job_id, str(e))
+
+
+async def handle_subscribe_request(sio, sid, data):
+    """
+    Stream the progress of any existing job (e.g. one started over REST).
+
+    Args:
+        sio: SocketIO server instance
+        sid: Session ID
+        data: Request data containing jobId, and optionally inlineMidi and
+              inlineNotes
+    """
+    job_id = data.get("jobId")
+    session = active_sessions.get(sid)
+    if session is None or not job_id or job_id in session["relays"]:
+        return
+    if job_store.get(job_id) is None:
+        await emit_error(sio, sid, job_id, "Job not found")
+        return
+    _start_relay(sio, sid, job_id, job_id, _inline_options(data))
+
+
+async def handle_unsubscribe_request(sio, sid, data):
+    """Stop streaming a job's events to this session (the job keeps running)."""
+    session = active_sessions.get(sid)
+    task = session["relays"].get(data.get("jobId")) if session else None
+    if task:
+        task.cancel()
+
+
+def _direct_emits() -> bool:
+    """Whether workers emit to sessions themselves (worker mode with a message queue)."""
+    return settings.GENERATION_MODE == "worker" and bool(settings.SOCKETIO_MESSAGE_QUEUE)
+
+
+def _inline_options(data: dict) -> dict:
+    """Which result payloads the client wants pushed with generation_complete."""
+    return {"midi": bool(data.get("inlineMidi")), "notes": bool(data.get("inlineNotes"))}
+
+
+def _start_relay(sio, sid: str, alias: str, job_id: str, inline: Optional[dict] = None):
+    task = asyncio.create_task(_relay_job(sio, sid, alias, job_id, inline or {}))
+    relays = active_sessions[sid]["relays"]
+    relays[alias] = task
+    task.add_done_callback(lambda _: relays.pop(alias, None) if relays.get(alias) is task else None)
+
+
+async def _relay_job(sio, sid: str, alias: str, job_id: str, inline: dict):
+    """
+    Emit a job's updates to one session until it finishes.
+
+    A job completed by a hedged Simple MIDI result is followed a while
+    longer, so its AI upgrade is delivered too.
+    """
+    version = None
+    completed_at = None
+    while True:
+        job = job_store.get(job_id)
+        if job is None:
+            await emit_error(sio, sid, alias, "Job not found")
+            return
+
+        current = job_store.version(job_id)
+        if current != version:
+            version = current
+            if job.status == GenerationStatus.COMPLETED and job.result:
+                if completed_at is None:
+                    completed_at = time.monotonic()
+                    await sio.emit("generation_complete", await result_event(alias, job.result, inline), room=sid)
+                if job.upgrade:
+                    await sio.emit("generation_upgrade", await result_event(alias, job.upgrade, inline), room=sid)
+                    return
+                if not upgrade_possible(job):
+                    return
+            else:
+                await emit_job_update(sio, sid, job, alias)
+                if job.status in FINISHED_STATUSES:
+                    return
+
+        if completed_at is not None and time.monotonic() - completed_at > settings.WS_UPGRADE_WAIT:
+            return
+        await job_store.wait_for_change(job_id, version, settings.WS_HEARTBEAT_INTERVAL)
+
+
+async def handle_cancel_request(sio, sid, data):
+    """
+    Cancel a generation started on this session, or any job by id.
+
+    While other requests share the job (this one coalesced onto theirs,
+    or they onto this one's), this request only stops following it and
+    the job keeps running for them. Any other jobId is taken as a server
+    job id (e.g. a subscribed REST job).
+
+    Args:
+        sio: SocketIO server instance
+        sid: Session ID
+        data: Request data containing jobId
+    """
+    job_id = data.get("jobId")
+    session = active_sessions.get(sid, {"jobs": {}, "owned": set(), "relays": {}})
+    target = session["jobs"].get(job_id, job_id)
+
+    if job_id in session["jobs"] and single_flight.leave(target):
+        relay = session["relays"].get(job_id)
+        if relay:
+            relay.cancel()
+        session["jobs"].pop(job_id, None)
+        if target in session["owned"]:
+            session["owned"].discard(target)
+            if _direct_emits():
+                await worker_bridge.detach(target)
+        await sio.emit("generation_cancelled", {"jobId": job_id}, room=sid)
+        return
+
+    job = await cancel_job(target)
+    if job is not None and job.status == GenerationStatus.CANCELLED:
+        # A relay following the job reports the cancellation itself
+        if job_id not in session["relays"]:
+            await sio.emit("generation_cancelled", {"jobId": job_id}, room=sid)
+    elif job is not None and job.status not in FINISHED_STATUSES:
+        # A worker process is still stopping it
+        if job_id not in session["relays"]:
+            task = asyncio.create_task(_report_cancelled(sio, sid, job_id, target))
+            _cancel_watchers.add(task)
+            task.add_done_callback(_cancel_watchers.discard)
+    else:
+        await emit_error(sio, sid, job_id, "Job not found or already finished")
+
+
+async def _report_cancelled(sio, sid: str, alias: str, job_id: str):
+    """Emit generation_cancelled once a worker confirms a cancellation (workers never send it)."""
+    deadline = time.monotonic() + settings.WS_UPGRADE_WAIT
+    while time.monotonic() < deadline and sid in active_sessions:
+        job = job_store.get(job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            if job is not None and job.status == GenerationStatus.CANCELLED:
+                await sio.emit("generation_cancelled", {"jobId": alias}, room=sid)
+            return
+        await job_store.wait_for_change(job_id, job_store.version(job_id), settings.WS_HEARTBEAT_INTERVAL)
 
 
 def register_handlers(sio):
@@ -116,6 +301,18 @@ def register_handlers(sio):
     async def generate_request(sid, data):
         await handle_generation_request(sio, sid, data)
 
+    @sio.event
+    async def cancel(sid, data):
+        await handle_cancel_request(sio, sid, data)
+
+    @sio.event
+    async def subscribe(sid, data):
+        await handle_subscribe_request(sio, sid, data)
+
+    @sio.event
+    async def unsubscribe(sid, data):
+        await handle_unsubscribe_request(sio, sid, data)
+
     @sio.event
     async def ping(sid, data):
         """Handle ping for keep-alive."""
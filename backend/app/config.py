@@ -30,28 +30,114 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./app/storage/metadata.db"
 
+    # Job Store
+    JOB_STORE_PATH: str = "app/storage/jobs.db"
+    JOB_STORE_MAX_ENTRIES: int = 1000  # jobs kept in memory; running jobs are never evicted, so may exceed it
+    JOB_STORE_TTL_SECONDS: int = 3600  # finished jobs stay in memory this long
+    JOB_STORE_FLUSH_INTERVAL: float = 2.0  # seconds between write-behind flushes
+
+    # Scheduler (worker pools per backend)
+    # Unset: 1, or with MAGENTA_WORKERS enough concurrent jobs to fill every worker's batch
+    SCHEDULER_MAGENTA_WORKERS: Optional[int] = None
+    SCHEDULER_HUGGINGFACE_WORKERS: int = 4
+    SCHEDULER_SIMPLE_WORKERS: int = 4
+    SCHEDULER_MAX_QUEUE_DEPTH: int = 20  # waiting jobs per backend before 429
+
+    # Warm Pool (idle-time pre-generation for popular combinations)
+    WARM_POOL_ENABLED: bool = True
+    WARM_POOL_PATH: str = "app/storage/warm_pool"
+    WARM_POOL_BACKENDS: str = "simple,magenta"  # comma-separated; HF is rate-limited
+    WARM_POOL_SIZE: int = 2  # ready pieces per hot combination
+    WARM_POOL_HOT_COMBOS: int = 5
+    WARM_POOL_MIN_REQUESTS: int = 3  # requests before a combination counts as hot
+    WARM_POOL_DECAY_SECONDS: int = 3600  # request counts halve this often
+    WARM_POOL_CPU_BUDGET: float = 0.25  # max fraction of wall time spent refilling; 0 disables refills
+    WARM_POOL_MAX_LOAD: float = 0.5  # refill only below this load average per core
+    WARM_POOL_INTERVAL: float = 5.0  # seconds between refill checks
+
+    # Hedged fallback (race Simple MIDI against a slow AI backend)
+    HEDGE_LATENCY_BUDGET: float = 20.0  # seconds before Simple MIDI starts in parallel; 0 disables
+    HEDGE_DELIVER_UPGRADE: bool = True  # keep the AI run going and deliver it as an upgrade
+
+    # Circuit breakers (per backend/model)
+    BREAKER_WINDOW: int = 20  # recent calls considered
+    BREAKER_MIN_CALLS: int = 3  # calls in the window before the breaker can open
+    BREAKER_ERROR_RATE: float = 0.5  # error rate that opens the breaker
+    BREAKER_OPEN_SECONDS: float = 30.0  # fast-fail period before a half-open probe
+
+    # Auto backend routing
+    AUTO_LATENCY_TARGET: float = 60.0  # seconds; AI backends expected to be slower are skipped
+    AUTO_STATS_WINDOW: int = 20  # recent generations per backend
+
+    # Capability probes (cached for health endpoints and routing)
+    CAPABILITY_PROBE_INTERVAL: float = 60.0  # seconds between background refreshes
+    CAPABILITY_PROBE_TIMEOUT: float = 15.0  # per remote probe, including Gradio client setup
+
+    # Multi-process deployment
+    GENERATION_MODE: str = "inline"  # "inline" (API runs jobs) or "worker" (python -m app.worker runs them)
+    SHARED_STATE_URL: str = "local://"  # worker mode needs "sqlite:///app/storage/shared.db" or a redis:// URL
+    NODE_ID: str = ""  # defaults to hostname-pid
+    WORKER_BACKENDS: str = "simple,magenta,huggingface"
+    SHARED_EVENT_POLL_INTERVAL: float = 0.1  # seconds
+    SHARED_EVENT_RETENTION: int = 300  # seconds of job events kept
+    SHARED_QUEUE_RETRY_AFTER: int = 10  # Retry-After when the shared queue is full
+    WORKER_CANCEL_WAIT: float = 5.0  # seconds a cancel request waits for the worker to confirm
+
     # HuggingFace Configuration
     HF_TOKEN: Optional[str] = None
     HF_PRIMARY_MODEL: str = "facebook/musicgen-small"
     HF_FALLBACK_MODEL: str = "sander-wood/music-transformer"
+    HF_CLIENT_POOL_SIZE: int = 4  # idle Gradio clients kept per model
+    HF_CLIENT_MAX_AGE: int = 900  # seconds before a pooled client is recycled
+    HF_CLIENT_PING_AFTER: int = 180  # idle seconds after which a pooled client is pinged before reuse
+    HF_PROGRESS_INTERVAL: float = 1.0  # seconds between Space queue/ETA progress updates
+    HF_CACHE_PATH: str = "app/storage/hf_cache"
+    HF_CACHE_POLICY: str = "deadline"  # off | exact | deadline
+    HF_CACHE_DEADLINE: float = 60.0  # "deadline": reuse when a new generation is expected to take longer
+    HF_CACHE_VARIANTS: int = 3  # cached pieces per model/prompt/parameters
+    HF_CACHE_MAX_BYTES: int = 50 * 1024 * 1024
+    HF_CACHE_MAX_AGE: int = 7 * 24 * 3600  # seconds
 
     # Magenta Configuration
     MAGENTA_BUNDLE_FILE: str = "app/storage/magenta_models/attention_rnn.mag"
     MAGENTA_CONFIG: str = "attention_rnn"
-    MAGENTA_TEMPERATURE: float = 1.0
+    MAGENTA_TEMPERATURE: float = 1.0  # sampling temperature on every Magenta path (API, workers, CLI)
     MAGENTA_TIMEOUT: int = 300  # seconds
+    MAGENTA_PRELOAD: bool = False  # load the resident generator at startup instead of first use
+    MAGENTA_WORKERS: int = 0  # inference processes; 0 runs the Python API in-process
+    MAGENTA_BATCH_WINDOW: float = 0.05  # seconds a worker waits to group more requests
+    MAGENTA_BATCH_MAX: int = 4  # requests per group (sampled one after another)
+    MAGENTA_WORKER_HEARTBEAT: float = 5.0  # seconds between liveness checks
+    MAGENTA_WORKER_HANG_TIMEOUT: float = 60.0  # silence before a busy worker is killed and replaced
+    MAGENTA_CLI_NUM_OUTPUTS: int = 3  # CLI pieces per run; extras become ready variations
+    MAGENTA_VARIATION_POOL_SIZE: int = 8  # surplus CLI pieces kept per steps/primer
 
     # Generation Settings
     DEFAULT_TEMPO: int = 100
     MIN_TEMPO: int = 40
     MAX_TEMPO: int = 180
 
+    # Score Settings
+    SCORE_GRID: float = 0.25  # beats (sixteenth notes); 1, 0.5, 0.25, 0.125 or 0.0625
+    SCORE_CACHE_SIZE: int = 64  # score models kept in memory
+
+    # Continuation Settings
+    CONTINUATION_CACHE_SIZE: int = 32  # parsed file tails kept for continuing recent files
+    CONTINUATION_PRIMER_STEPS: int = 32  # sixteenth steps of the tail used to seed Magenta
+
     # WebSocket Settings
     WS_HEARTBEAT_INTERVAL: int = 30  # seconds
+    WS_MAX_JOBS_PER_SESSION: int = 4  # unfinished jobs one Socket.IO connection may run
+    WS_UPGRADE_WAIT: int = 300  # seconds a hedged job is followed for its AI upgrade
+    WS_INLINE_MAX_BYTES: int = 256 * 1024  # largest MIDI file pushed inline with generation_complete
+    SOCKETIO_MESSAGE_QUEUE: Optional[str] = None  # redis://, unix:// or amqp:// URL shared by every API process and worker
+    SOCKETIO_CHANNEL: str = "piano-socketio"  # pub/sub channel on that queue
+    SSE_KEEPALIVE_INTERVAL: int = 15  # seconds between SSE keep-alive comments
 
     # File Settings
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS: List[str] = [".mid", ".midi"]
+    THUMBNAIL_CACHE_MAX_AGE: int = 365 * 24 * 3600  # seconds (URLs are versioned)
 
     # Pagination
     DEFAULT_PAGE_SIZE: int = 12
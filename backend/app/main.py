@@ -2,6 +2,7 @@
 FastAPI main application.
 Entry point for the Piano Music Generator backend.
 """
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -9,6 +10,15 @@ import socketio
 
 from .config import settings
 from .api import generation, files, health, websocket
+from .services.job_store import job_store
+from .services.job_runner import generation_service
+from .services.scheduler import scheduler
+from .services.warm_pool import warm_pool
+from .services.shared_state import shared_state, require_cross_process
+from .services.worker_bridge import worker_bridge
+from .services.capabilities import capabilities
+from .services.magenta_pool import magenta_pool
+from .services.socket_manager import create_client_manager
 
 # Create FastAPI app
 app = FastAPI(
@@ -26,12 +36,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    """Start background tasks."""
+    if settings.GENERATION_MODE == "worker":
+        # Jobs run in `python -m app.worker` processes; follow them via shared state
+        require_cross_process(shared_state)
+        job_store.attach_shared(shared_state, publisher=worker_bridge.publish_job)
+        worker_bridge.start()
+    job_store.start()
+    scheduler.start()
+    warm_pool.start()
+    capabilities.start()
+    if settings.MAGENTA_PRELOAD or settings.MAGENTA_WORKERS > 0:
+        asyncio.create_task(generation_service.magenta.preload())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Persist outstanding state and stop worker processes before exit."""
+    await job_store.stop()
+    if settings.GENERATION_MODE == "worker":
+        await worker_bridge.stop()
+    if magenta_pool.started:
+        await magenta_pool.stop()
+
+
 # Create Socket.IO server
 sio = socketio.AsyncServer(
     async_mode='asgi',
     cors_allowed_origins=settings.allowed_origins_list,
     logger=True,
-    engineio_logger=True
+    engineio_logger=True,
+    client_manager=create_client_manager()
 )
 
 # Register WebSocket event handlers
@@ -12,6 +12,7 @@ class BackendType(str, Enum):
     HUGGINGFACE = "huggingface"
     MAGENTA = "magenta"
     SIMPLE = "simple"
+    AUTO = "auto"  # routed to a concrete backend when the job is created
 
 
 class MusicStyle(str, Enum):
@@ -59,6 +60,14 @@ class GenerationStatus(str, Enum):
     IN_PROGRESS = "in_progress"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobPriority(str, Enum):
+    """Scheduling priority classes."""
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
 
 
 class GenerationStage(str, Enum):
@@ -79,11 +88,17 @@ class MusicParameters(BaseModel):
     mood: Mood
     duration: Duration
     prompt: Optional[str] = Field(None, description="Custom prompt for HuggingFace backend")
+    seed: Optional[int] = Field(None, description="Random seed; identical seeded requests share one generation")
+    latency_budget: Optional[float] = Field(
+        None, ge=0, description="Seconds before Simple MIDI is raced against the AI backend (0 disables)"
+    )
 
 
 class GenerationRequest(BaseModel):
     """Request to generate music."""
     parameters: MusicParameters
+    priority: JobPriority = JobPriority.NORMAL
+    same_as: Optional[str] = Field(None, description="Attach to this in-flight job instead of starting a new one")
 
 
 class MidiFileMetadata(BaseModel):
@@ -97,6 +112,37 @@ class MidiFileMetadata(BaseModel):
     duration_seconds: Optional[float] = None
     track_count: Optional[int] = None
     note_count: Optional[int] = None
+    cached: bool = Field(False, description="Served from the HuggingFace prompt cache")
+
+
+class ContinueRequest(BaseModel):
+    """Request to extend an existing piece with a newly generated section."""
+    backend: Literal["simple", "magenta"] = "simple"
+    duration: Duration = Duration.THIRTY_SEC
+    style: Optional[MusicStyle] = Field(None, description="Defaults to the source file's style")
+    key: Optional[MusicKey] = Field(None, description="Defaults to the source file's key")
+    mood: Optional[Mood] = Field(None, description="Defaults to the source file's mood")
+    seed: Optional[int] = Field(None, description="Random seed for the new section")
+
+
+class RoutingCandidate(BaseModel):
+    """One backend as seen by the auto router when it made a decision."""
+    backend: BackendType
+    available: bool
+    expected_latency_seconds: float
+    success_rate: float
+    samples: int = Field(description="Recent generations the statistics are based on")
+    probe_latency_seconds: Optional[float] = None
+    breaker_open: bool = False
+    message: Optional[str] = None
+
+
+class RoutingDecision(BaseModel):
+    """Why an auto request was sent to its backend."""
+    chosen: BackendType
+    reason: str
+    latency_target_seconds: float
+    candidates: List[RoutingCandidate]
 
 
 class GenerationJob(BaseModel):
@@ -111,6 +157,13 @@ class GenerationJob(BaseModel):
     completed_at: Optional[datetime] = None
     result: Optional[MidiFileMetadata] = None
     error: Optional[str] = None
+    priority: JobPriority = JobPriority.NORMAL
+    queue_position: Optional[int] = Field(None, description="1-based position while queued")
+    estimated_wait_seconds: Optional[float] = None
+    routing: Optional[RoutingDecision] = Field(None, description="Set when the request used the auto backend")
+    upgrade: Optional[MidiFileMetadata] = Field(
+        None, description="AI result that arrived after a faster Simple MIDI result was delivered"
+    )
 
 
 class GenerationProgressEvent(BaseModel):
@@ -160,11 +213,66 @@ class PaginatedResponse(BaseModel):
     has_prev: bool
 
 
+class ResidentModelStatus(BaseModel):
+    """A model kept loaded in the API process."""
+    bundle: str
+    config: str
+    loaded: bool
+    loaded_at: Optional[float] = Field(None, description="Unix time of the last (re)load")
+    load_seconds: Optional[float] = None
+    loads: int = 0
+    uses: int = 0
+    error: Optional[str] = None
+
+
 class HealthResponse(BaseModel):
     """Health check response."""
     status: Literal["healthy", "degraded", "unhealthy"]
     backends: dict[str, bool]
     timestamp: datetime
+    resident_models: List[ResidentModelStatus] = Field(default_factory=list)
+    checked_at: Optional[datetime] = Field(None, description="Oldest cached capability probe used")
+
+
+class LivenessResponse(BaseModel):
+    """Cheap liveness check: the process is serving requests."""
+    status: Literal["alive"] = "alive"
+    timestamp: datetime
+
+
+class CapabilityStatus(BaseModel):
+    """Cached result of one backend capability probe."""
+    available: bool
+    message: str
+    probe_seconds: float
+    checked_at: float = Field(description="Unix time of the probe")
+    age_seconds: float
+
+
+class ReadinessResponse(BaseModel):
+    """Deep readiness check from cached probes and background services."""
+    ready: bool
+    reasons: List[str] = Field(default_factory=list, description="Why the service is not ready")
+    capabilities: dict[str, CapabilityStatus]
+    job_store_started: bool
+    scheduler_started: bool
+    timestamp: datetime
+
+
+class BreakerStatus(BaseModel):
+    """Circuit breaker state for one backend option (model, API or CLI)."""
+    name: str
+    state: Literal["closed", "open", "half_open"]
+    error_rate: float
+    window_calls: int
+    p50_latency_seconds: Optional[float] = None
+    p95_latency_seconds: Optional[float] = None
+    retry_in_seconds: Optional[float] = None
+    last_error: Optional[str] = None
+    successes: int = 0
+    failures: int = 0
+    rejected: int = 0
+    opened: int = 0
 
 
 class BackendStatus(BaseModel):
@@ -172,6 +280,8 @@ class BackendStatus(BaseModel):
     name: str
     available: bool
     message: Optional[str] = None
+    breakers: List[BreakerStatus] = Field(default_factory=list)
+    cache: Optional[dict] = Field(None, description="Result cache counters (HuggingFace only)")
 
 
 class MidiNote(BaseModel):
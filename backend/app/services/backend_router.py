@@ -0,0 +1,125 @@
+"""
+Latency-aware routing for the "auto" backend.
+Cached capability probes and rolling per-backend outcome statistics decide
+which concrete backend serves an auto request.
+"""
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from ..models import BackendType, MusicParameters, RoutingDecision, RoutingCandidate
+from ..config import settings
+from .circuit_breaker import breakers, OPEN
+from .capabilities import capabilities
+
+# Expected end-to-end seconds before any generation has been observed
+PRIOR_LATENCY = {
+    BackendType.SIMPLE: 1.0,
+    BackendType.MAGENTA: 30.0,
+    BackendType.HUGGINGFACE: 45.0,
+}
+
+# AI backends in order of preference when expected latencies tie
+AI_BACKENDS = (BackendType.HUGGINGFACE, BackendType.MAGENTA)
+
+
+class BackendRouter:
+    """
+    Routes auto requests to the fastest AI backend that can serve them.
+
+    - Availability comes from the capability cache, which probes every
+      backend in the background, so requests never wait on a probe.
+    - record() keeps the last AUTO_STATS_WINDOW generation outcomes per
+      backend. Expected latency is the mean successful run time divided
+      by the success rate, since failures cost a fallback run.
+    - route() picks the AI backend with the lowest expected latency that
+      is up, not fully tripped by its circuit breakers and within the
+      latency target; Simple MIDI serves everything else. Requests with a
+      custom prompt only consider HuggingFace, the one model that uses it.
+    """
+
+    def __init__(self):
+        self._outcomes: Dict[BackendType, Deque[Tuple[bool, float]]] = {
+            b: deque(maxlen=settings.AUTO_STATS_WINDOW) for b in PRIOR_LATENCY
+        }
+        self.stats = {"routed": {b.value: 0 for b in PRIOR_LATENCY}}
+
+    def record(self, backend: BackendType, ok: bool, latency: float):
+        """Record the outcome of one generation on a concrete backend."""
+        if backend in self._outcomes:
+            self._outcomes[backend].append((ok, latency))
+
+    def _success_rate(self, backend: BackendType) -> float:
+        outcomes = self._outcomes[backend]
+        if not outcomes:
+            return 1.0
+        return sum(1 for ok, _ in outcomes if ok) / len(outcomes)
+
+    def _expected_latency(self, backend: BackendType) -> float:
+        successes = [latency for ok, latency in self._outcomes[backend] if ok]
+        latency = sum(successes) / len(successes) if successes else PRIOR_LATENCY[backend]
+        return latency / max(self._success_rate(backend), 0.1)
+
+    def expected_latency(self, backend: BackendType) -> float:
+        """Expected end-to-end seconds for a generation on a concrete backend."""
+        return self._expected_latency(backend)
+
+    def _candidate(self, backend: BackendType) -> RoutingCandidate:
+        capability = capabilities.get(backend)
+        tripped = breakers.for_backend(backend.value)
+        breaker_open = bool(tripped) and all(b["state"] == OPEN for b in tripped)
+        return RoutingCandidate(
+            backend=backend,
+            available=(capability is None or capability.available) and not breaker_open,
+            expected_latency_seconds=round(self._expected_latency(backend), 2),
+            success_rate=round(self._success_rate(backend), 3),
+            samples=len(self._outcomes[backend]),
+            probe_latency_seconds=capability.probe_seconds if capability else None,
+            breaker_open=breaker_open,
+            message=capability.message if capability else "not probed yet",
+        )
+
+    def route(self, parameters: MusicParameters) -> RoutingDecision:
+        """Choose a concrete backend for an auto request."""
+        target = parameters.latency_budget or settings.AUTO_LATENCY_TARGET
+        candidates = [self._candidate(b) for b in PRIOR_LATENCY]
+        by_backend = {c.backend: c for c in candidates}
+
+        eligible = AI_BACKENDS if not parameters.prompt else (BackendType.HUGGINGFACE,)
+        usable = sorted(
+            (by_backend[b] for b in eligible
+             if by_backend[b].available and by_backend[b].expected_latency_seconds <= target),
+            key=lambda c: (c.expected_latency_seconds, AI_BACKENDS.index(c.backend))
+        )
+
+        if usable:
+            chosen = usable[0].backend
+            reason = f"fastest available AI backend (~{usable[0].expected_latency_seconds:g}s expected)"
+        else:
+            chosen = BackendType.SIMPLE
+            reason = f"no AI backend available within {target:g}s"
+
+        self.stats["routed"][chosen.value] += 1
+        return RoutingDecision(
+            chosen=chosen,
+            reason=reason,
+            latency_target_seconds=target,
+            candidates=candidates,
+        )
+
+    def resolve(self, parameters: MusicParameters) -> Tuple[MusicParameters, Optional[RoutingDecision]]:
+        """Replace an auto backend with the routed one; other requests pass through."""
+        if parameters.backend != BackendType.AUTO:
+            return parameters, None
+        decision = self.route(parameters)
+        return parameters.model_copy(update={"backend": decision.chosen}), decision
+
+    def get_stats(self) -> dict:
+        """Return routing counters and the current view of every backend."""
+        return {
+            **self.stats,
+            "backends": [self._candidate(b).model_dump() for b in PRIOR_LATENCY],
+        }
+
+
+# Shared instance used by the generation endpoints
+backend_router = BackendRouter()
@@ -0,0 +1,175 @@
+"""
+Cached backend capability probes.
+Checks what each backend needs (tools, packages, bundle files, remote
+Spaces) at startup and on a background interval, so health endpoints and
+the auto router read cached results instead of probing per request.
+"""
+import os
+import time
+import shutil
+import asyncio
+import importlib.util
+from functools import partial
+from typing import Dict, Optional, Tuple
+
+from ..models import BackendType
+from ..config import settings
+from .gradio_pool import gradio_clients
+
+
+class Capability:
+    """Cached result of one backend probe."""
+
+    def __init__(self, available: bool, message: str, probe_seconds: float):
+        self.available = available
+        self.message = message
+        self.probe_seconds = probe_seconds
+        self.checked_at = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "available": self.available,
+            "message": self.message,
+            "probe_seconds": round(self.probe_seconds, 3),
+            "checked_at": self.checked_at,
+            "age_seconds": round(time.time() - self.checked_at, 1),
+        }
+
+
+def _installed(package: str) -> bool:
+    """Whether a top-level package is importable, without importing it."""
+    return importlib.util.find_spec(package) is not None
+
+
+def probe_simple() -> Tuple[bool, str]:
+    if _installed("mido"):
+        return True, "Procedural generation available"
+    return False, "mido library not installed"
+
+
+def probe_magenta() -> Tuple[bool, str]:
+    if not os.path.exists(settings.MAGENTA_BUNDLE_FILE):
+        return False, f"Bundle file not found at {settings.MAGENTA_BUNDLE_FILE}"
+    if shutil.which("melody_rnn_generate"):
+        return True, "Magenta CLI available"
+    # find_spec keeps TensorFlow out of the process until a job needs it
+    if _installed("magenta"):
+        return True, "Magenta Python API available"
+    return False, "Magenta CLI and Python API not available"
+
+
+# Client setups per model, kept past a probe timeout since the setup
+# thread cannot be interrupted
+_setups: Dict[str, asyncio.Task] = {}
+
+
+def _pool_late_client(model: str, setup: asyncio.Task):
+    """Pool a client whose setup finished after its probe gave up on it."""
+    if setup.cancelled() or setup.exception() is not None:
+        return
+    gradio_clients.release(model, settings.HF_TOKEN, setup.result(), True)
+
+
+async def probe_huggingface() -> Tuple[bool, str]:
+    """
+    Reach each configured Space through the shared Gradio client pool.
+
+    The client resolves HF_PRIMARY_MODEL / HF_FALLBACK_MODEL exactly as
+    generation does (Space id or URL), and a healthy client is left in the
+    pool for the next request. A client setup that outlives
+    CAPABILITY_PROBE_TIMEOUT keeps running and pools its client when done;
+    the Space is not probed again until it finishes, so a hung Space holds
+    at most one setup thread.
+    """
+    errors = []
+    for model in (settings.HF_PRIMARY_MODEL, settings.HF_FALLBACK_MODEL):
+        setup = _setups.get(model)
+        if setup is not None and not setup.done():
+            errors.append(f"{model}: previous probe still waiting for the Space")
+            continue
+
+        setup = _setups[model] = asyncio.create_task(gradio_clients.acquire(model, settings.HF_TOKEN))
+        try:
+            pooled = await asyncio.wait_for(asyncio.shield(setup), settings.CAPABILITY_PROBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            setup.add_done_callback(partial(_pool_late_client, model))
+            errors.append(f"{model}: no response within {settings.CAPABILITY_PROBE_TIMEOUT:g}s")
+            continue
+        except Exception as e:
+            errors.append(f"{model}: {e}")
+            continue
+
+        healthy = await asyncio.to_thread(gradio_clients.ping, pooled, settings.HF_TOKEN)
+        gradio_clients.release(model, settings.HF_TOKEN, pooled, healthy)
+        if healthy:
+            return True, f"{model} reachable"
+        errors.append(f"{model}: not responding")
+    return False, "; ".join(errors)
+
+
+PROBES = {
+    BackendType.SIMPLE: probe_simple,
+    BackendType.MAGENTA: probe_magenta,
+    BackendType.HUGGINGFACE: probe_huggingface,
+}
+
+
+class CapabilityCache:
+    """
+    Probe results per backend, refreshed every CAPABILITY_PROBE_INTERVAL
+    seconds by a background task. Local probes are cheap and run first
+    in a worker thread; the HuggingFace probe is a coroutine that sets up
+    Gradio clients off the event loop.
+    """
+
+    def __init__(self):
+        self._results: Dict[BackendType, Capability] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+
+    def get(self, backend: BackendType) -> Optional[Capability]:
+        """Cached capability, or None before the first probe finished."""
+        return self._results.get(backend)
+
+    def available(self, backend: BackendType) -> bool:
+        capability = self._results.get(backend)
+        return capability is not None and capability.available
+
+    @property
+    def ready(self) -> bool:
+        """Every backend has been probed at least once."""
+        return len(self._results) == len(PROBES)
+
+    async def refresh(self):
+        """Probe every backend once."""
+        for backend, probe in PROBES.items():
+            started = time.monotonic()
+            try:
+                if asyncio.iscoroutinefunction(probe):
+                    available, message = await probe()
+                else:
+                    available, message = await asyncio.to_thread(probe)
+            except Exception as e:
+                available, message = False, f"Probe failed: {e}"
+            self._results[backend] = Capability(available, message, time.monotonic() - started)
+        self.refreshes += 1
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Capability probe failed: {e}")
+            await asyncio.sleep(settings.CAPABILITY_PROBE_INTERVAL)
+
+    def start(self):
+        """Start the background refresh loop (first probe runs immediately)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    def snapshot(self) -> dict:
+        return {backend.value: c.to_dict() for backend, c in self._results.items()}
+
+
+# Shared instance used by the health endpoints and the auto router
+capabilities = CapabilityCache()
@@ -0,0 +1,131 @@
+"""
+Circuit breakers for generation backends.
+Tracks recent outcomes per backend/model so a failing option is skipped
+immediately instead of paying its connect-and-fail cost on every request.
+"""
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from ..config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Rolling-window breaker for one backend option.
+
+    - closed: calls pass; the last BREAKER_WINDOW outcomes are kept. Once at
+      least BREAKER_MIN_CALLS are recorded and the error rate reaches
+      BREAKER_ERROR_RATE, the breaker opens.
+    - open: calls fail fast for BREAKER_OPEN_SECONDS.
+    - half_open: a single probe call is let through; success closes the
+      breaker, failure re-opens it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        # (ok, latency_seconds) for recent calls
+        self.window: Deque[Tuple[bool, float]] = deque(maxlen=settings.BREAKER_WINDOW)
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.last_error: Optional[str] = None
+        self.totals = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now; counts fast-failed calls."""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < settings.BREAKER_OPEN_SECONDS:
+                self.totals["rejected"] += 1
+                return False
+            self.state = HALF_OPEN
+            self.probing = False
+
+        if self.state == HALF_OPEN:
+            if self.probing:
+                self.totals["rejected"] += 1
+                return False
+            self.probing = True
+        return True
+
+    def record_success(self, latency: float):
+        self.window.append((True, latency))
+        self.totals["successes"] += 1
+        if self.state == HALF_OPEN:
+            self.state = CLOSED
+            self.probing = False
+            self.window.clear()
+            self.window.append((True, latency))
+
+    def record_failure(self, latency: float, error: Optional[str] = None):
+        self.window.append((False, latency))
+        self.totals["failures"] += 1
+        self.last_error = error
+        if self.state == HALF_OPEN or (
+            len(self.window) >= settings.BREAKER_MIN_CALLS
+            and self.error_rate() >= settings.BREAKER_ERROR_RATE
+        ):
+            self._open()
+
+    def release(self):
+        """Give back a half-open probe slot without recording an outcome (e.g. cancelled call)."""
+        self.probing = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probing = False
+        self.totals["opened"] += 1
+
+    def error_rate(self) -> float:
+        if not self.window:
+            return 0.0
+        return sum(1 for ok, _ in self.window if not ok) / len(self.window)
+
+    def _latency(self, quantile: float) -> Optional[float]:
+        latencies = sorted(latency for _, latency in self.window)
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(quantile * len(latencies)))], 2)
+
+    def stats(self) -> dict:
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = round(max(0.0, settings.BREAKER_OPEN_SECONDS - (time.monotonic() - self.opened_at)), 1)
+        return {
+            "name": self.name,
+            "state": self.state,
+            "error_rate": round(self.error_rate(), 3),
+            "window_calls": len(self.window),
+            "p50_latency_seconds": self._latency(0.5),
+            "p95_latency_seconds": self._latency(0.95),
+            "retry_in_seconds": retry_in,
+            "last_error": self.last_error,
+            **self.totals,
+        }
+
+
+class BreakerRegistry:
+    """Breakers keyed by "backend:option", created on first use."""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name)
+        return breaker
+
+    def for_backend(self, backend: str) -> list:
+        """Stats of every breaker belonging to a backend."""
+        prefix = f"{backend}:"
+        return [b.stats() for name, b in sorted(self._breakers.items()) if name.startswith(prefix)]
+
+
+# Shared instance used by the backend services
+breakers = BreakerRegistry()
@@ -0,0 +1,190 @@
+"""
+Continuation service.
+Extends existing pieces: the tail of a file seeds the next section, which is
+generated on its own and appended, so only the new part costs anything.
+"""
+import os
+import math
+import asyncio
+import tempfile
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+from ..models import (
+    BackendType, ContinueRequest, MidiFileMetadata, MusicParameters, MusicKey, MusicStyle, Mood
+)
+from ..utils.midi_notes import read_midi_notes
+from ..utils.midi_tags import read_tags
+from ..utils.midi_append import append_midi
+from .generation_service import GenerationService
+
+DURATION_SECONDS = {"30 sec": 30, "1 min": 60, "2 min": 120}
+DURATION_STEPS = {"30 sec": 64, "1 min": 128, "2 min": 256}
+
+# Magenta melody events
+NO_EVENT = -2
+
+
+def _tail_state(midi_path: str, primer_steps: int) -> Dict[str, Any]:
+    """
+    Summarize where a piece leaves off.
+
+    The melody is taken as the highest note at each onset. The primer is
+    its last `primer_steps` sixteenth steps as Magenta melody events.
+    """
+    parsed = read_midi_notes(midi_path)
+    tempo = max(settings.MIN_TEMPO, min(settings.MAX_TEMPO, parsed["tempo"]))
+    seconds_per_step = 60.0 / parsed["tempo"] / 4
+
+    # Highest pitch starting on each sixteenth step
+    melody: Dict[int, int] = {}
+    for note in parsed["notes"]:
+        step = round(note["time"] / seconds_per_step)
+        melody[step] = max(melody.get(step, 0), note["midi"])
+
+    end_step = math.ceil(parsed["duration"] / seconds_per_step)
+    first = max(0, end_step - primer_steps)
+    primer = [melody.get(step, NO_EVENT) for step in range(first, end_step)]
+    # The first event must start a note for Magenta to read the primer
+    while primer and primer[0] == NO_EVENT:
+        primer.pop(0)
+
+    last_step = max(melody, default=None)
+    return {
+        "tempo": tempo,
+        "tags": read_tags(midi_path),
+        # New sections start on the next bar
+        "end_beats": math.ceil(end_step / 16) * 4,
+        "last_pitch": melody[last_step] if last_step is not None else None,
+        "primer": primer or [60],
+    }
+
+
+def _enum_or(enum, value: Optional[str], default):
+    try:
+        return enum(value)
+    except ValueError:
+        return default
+
+
+class ContinuationService:
+    """
+    Appends newly generated sections to existing MIDI files.
+
+    - Simple MIDI resumes its phrase, dynamics and chord cycle at the
+      piece's end beat, with the melody starting next to its last pitch.
+    - Magenta is primed with the tail of the melody and only the new steps
+      are kept.
+
+    Melody RNN doesn't expose its hidden state, so what is cached is each
+    file's parsed tail (keyed by path and mtime, in a small LRU): repeat
+    continuations of a recent file skip re-reading it, and the resident
+    generator bounds the model work to the primer plus the new steps.
+    """
+
+    def __init__(self, max_cached: int = None):
+        self.max_cached = max_cached or settings.CONTINUATION_CACHE_SIZE
+        self._tails: "OrderedDict[Tuple[str, int], Dict[str, Any]]" = OrderedDict()
+        self.generation = GenerationService()
+        self.stats = {"continued": 0, "failed": 0, "tail_hits": 0, "tail_misses": 0}
+
+    async def tail(self, midi_path: str) -> Dict[str, Any]:
+        """Return the tail state of a file, using the cache when current."""
+        key = (midi_path, os.stat(midi_path).st_mtime_ns)
+        if key in self._tails:
+            self._tails.move_to_end(key)
+            self.stats["tail_hits"] += 1
+            return self._tails[key]
+
+        self.stats["tail_misses"] += 1
+        state = await asyncio.to_thread(_tail_state, midi_path, settings.CONTINUATION_PRIMER_STEPS)
+        self._tails[key] = state
+        while len(self._tails) > self.max_cached:
+            self._tails.popitem(last=False)
+        return state
+
+    async def parameters_for(self, midi_path: str, request: ContinueRequest) -> MusicParameters:
+        """
+        Parameters for a continuation of a file.
+
+        Key, style and mood left out of the request come from the file's
+        tags (written at generation time), then its filename's mood slug.
+        """
+        state = await self.tail(midi_path)
+        tags = state["tags"]
+        mood_slug = os.path.basename(midi_path).split("_")[1:2]
+        return MusicParameters(
+            backend=BackendType(request.backend),
+            style=request.style or _enum_or(MusicStyle, tags.get("style"), MusicStyle.CLASSICAL),
+            key=request.key or _enum_or(MusicKey, tags.get("key"), MusicKey.C_MAJOR),
+            tempo=state["tempo"],
+            mood=request.mood or _enum_or(
+                Mood, tags.get("mood") or "".join(mood_slug).capitalize(), Mood.HAPPY
+            ),
+            duration=request.duration,
+            seed=request.seed,
+        )
+
+    async def continue_file(
+        self,
+        midi_path: str,
+        parameters: MusicParameters
+    ) -> Tuple[Optional[MidiFileMetadata], Optional[str]]:
+        """
+        Generate a section following a file and save base + section as a new file.
+
+        Args:
+            midi_path: File to extend
+            parameters: From parameters_for (backend "simple" or "magenta")
+
+        Returns:
+            Tuple of (MidiFileMetadata, error_message)
+        """
+        state = await self.tail(midi_path)
+        backend = parameters.backend
+
+        if backend == BackendType.MAGENTA:
+            section, error = await self.generation.magenta.continue_melody(
+                state["primer"], DURATION_STEPS[parameters.duration.value]
+            )
+            if not section:
+                # Same fallback as regular Magenta jobs
+                backend = BackendType.SIMPLE
+        if backend == BackendType.SIMPLE:
+            section, error = await self.generation.simple.generate(
+                tempo=state["tempo"],
+                duration_sec=DURATION_SECONDS[parameters.duration.value],
+                mood=parameters.mood.value,
+                key=parameters.key.value,
+                style=parameters.style.value,
+                seed=parameters.seed,
+                start_pitch=state["last_pitch"],
+                beat_offset=state["end_beats"]
+            )
+        if not section:
+            self.stats["failed"] += 1
+            return None, error
+
+        tf = tempfile.NamedTemporaryFile(delete=False, suffix=".mid")
+        tf.close()
+        try:
+            await asyncio.to_thread(append_midi, midi_path, section, tf.name, 4)
+        except Exception as e:
+            os.remove(tf.name)
+            self.stats["failed"] += 1
+            return None, f"Could not append section: {e}"
+        finally:
+            os.remove(section)
+
+        self.stats["continued"] += 1
+        return await self.generation._finalize_file(
+            tf.name, parameters.model_copy(update={"backend": backend}), backend
+        )
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "cached_tails": len(self._tails)}
+
+
+# Shared instance used by the continuation jobs
+continuation_service = ContinuationService()
@@ -3,17 +3,69 @@ Main generation service orchestrator.
 Coordinates all backends with intelligent fallback chain.
 """
 import os
+import time
 import shutil
+import asyncio
 import datetime
-from typing import Tuple, Optional, Callable, Awaitable
+from typing import Tuple, Optional, Callable, Awaitable, Set
 from uuid import uuid4
 
 from ..models import MusicParameters, BackendType, MidiFileMetadata
 from ..utils.prompt_generator import generate_ai_prompt
+from ..utils.thumbnail import write_thumbnail, thumbnail_path_for
+from ..utils.midi_tags import write_tags
 from ..config import settings
 from .magenta_service import MagentaService
 from .huggingface_service import HuggingFaceService
 from .simple_midi_service import SimpleMidiService
+from .backend_router import backend_router
+
+UpgradeCallback = Callable[[MidiFileMetadata], Awaitable[None]]
+
+
+class HedgeStats:
+    """Counters for hedged (raced) generations, shared by every GenerationService."""
+
+    def __init__(self):
+        self.stats = {
+            "hedged": 0,
+            "primary_wins": 0,
+            "fallback_wins": 0,
+            "upgrades": 0,
+            "losers_cancelled": 0,
+            "time_saved_seconds": 0.0,
+        }
+        # Moving average of successful AI run time
+        self.primary_avg: Optional[float] = None
+
+    def record_primary(self, elapsed: float):
+        if self.primary_avg is None:
+            self.primary_avg = elapsed
+        else:
+            self.primary_avg = 0.8 * self.primary_avg + 0.2 * elapsed
+
+    def record_saved(self, seconds: float):
+        self.stats["time_saved_seconds"] += max(0.0, seconds)
+
+    def record_race(self, primary_done: float, primary_ok: bool, hedge_started: float, hedge_done: float):
+        """
+        Record the time a served hedge result saved, once both branches finished.
+
+        Unhedged, the result would have come when the AI run finished, or
+        after that plus a Simple MIDI run if it failed.
+        """
+        unhedged = primary_done if primary_ok else primary_done + (hedge_done - hedge_started)
+        self.record_saved(unhedged - hedge_done)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "time_saved_seconds": round(self.stats["time_saved_seconds"], 1),
+            "primary_avg_seconds": round(self.primary_avg, 1) if self.primary_avg else None,
+        }
+
+
+hedge_stats = HedgeStats()
 
 
 class GenerationService:
@@ -24,17 +76,23 @@ class GenerationService:
     - HuggingFace: HF Space → Simple MIDI
     - Magenta: Magenta Python API/CLI → Simple MIDI
     - Simple: Simple MIDI only
+
+    HuggingFace requests are hedged: once the latency budget passes,
+    Simple MIDI starts in parallel and the first usable result wins.
     """
 
-    def __init__(self):
+    def __init__(self, storage_path: str = None):
+        self.storage_path = storage_path or settings.GENERATED_MIDI_PATH
         self.magenta = MagentaService()
         self.huggingface = HuggingFaceService()
         self.simple = SimpleMidiService()
+        self._upgrades: Set[asyncio.Task] = set()
 
     async def generate(
         self,
         parameters: MusicParameters,
-        progress_callback: Optional[Callable[[str, int, str], Awaitable[None]]] = None
+        progress_callback: Optional[Callable[[str, int, str], Awaitable[None]]] = None,
+        upgrade_callback: Optional[UpgradeCallback] = None
     ) -> Tuple[Optional[MidiFileMetadata], Optional[str]]:
         """
         Generate music based on parameters with intelligent fallback.
@@ -43,17 +101,30 @@ class GenerationService:
             parameters: Music generation parameters
             progress_callback: Optional async callback for progress updates
                               (stage, progress_percent, message)
+            upgrade_callback: Optional async callback receiving the AI result
+                              when a hedged Simple MIDI result was returned first
 
         Returns:
             Tuple of (MidiFileMetadata, error_message)
         """
+        # Endpoints resolve auto when the job is created; this covers direct callers
+        parameters, _ = backend_router.resolve(parameters)
+
         # Route to appropriate backend
+        started = time.monotonic()
         if parameters.backend == BackendType.MAGENTA:
-            return await self._generate_magenta(parameters, progress_callback)
+            result, error = await self._generate_magenta(parameters, progress_callback)
         elif parameters.backend == BackendType.HUGGINGFACE:
-            return await self._generate_huggingface(parameters, progress_callback)
+            result, error = await self._generate_huggingface(parameters, progress_callback, upgrade_callback)
         else:
-            return await self._generate_simple(parameters, progress_callback)
+            result, error = await self._generate_simple(parameters, progress_callback)
+
+        # A fallback result counts against the requested backend; cache hits say nothing about it.
+        # HuggingFace records the AI run itself, since a hedge win doesn't mean it failed.
+        if parameters.backend != BackendType.HUGGINGFACE and (result is None or not result.cached):
+            ok = result is not None and result.backend == parameters.backend
+            backend_router.record(parameters.backend, ok, time.monotonic() - started)
+        return result, error
 
     async def _generate_magenta(
         self,
@@ -79,7 +150,8 @@ class GenerationService:
         out_path, error = await self.magenta.generate(
             steps=steps,
             primer="60",  # Middle C
-            target_key=parameters.key.value
+            target_key=parameters.key.value,
+            progress_callback=progress_callback
         )
 
         if out_path:
@@ -98,11 +170,19 @@ class GenerationService:
     async def _generate_huggingface(
         self,
         parameters: MusicParameters,
-        progress_callback: Optional[Callable] = None
+        progress_callback: Optional[Callable] = None,
+        upgrade_callback: Optional[UpgradeCallback] = None
     ) -> Tuple[Optional[MidiFileMetadata], Optional[str]]:
-        """Generate using HuggingFace with fallback to Simple MIDI."""
-        if progress_callback:
-            await progress_callback("initializing", 10, "Preparing AI prompt...")
+        """Generate using HuggingFace, hedged with Simple MIDI after the latency budget."""
+        reported = 0  # highest percent sent, so progress never moves backwards
+
+        async def report(stage: str, percent: int, message: str):
+            nonlocal reported
+            if progress_callback:
+                reported = max(reported, percent)
+                await progress_callback(stage, reported, message)
+
+        await report("initializing", 10, "Preparing AI prompt...")
 
         # Generate AI prompt
         prompt = parameters.prompt or generate_ai_prompt(
@@ -113,11 +193,8 @@ class GenerationService:
             duration=parameters.duration.value
         )
 
-        if progress_callback:
-            await progress_callback("generating", 30, "Contacting HuggingFace Space...")
-
-        # Try HuggingFace
-        out_path, error = await self.huggingface.generate(
+        # Serve a cached piece for this prompt when the cache policy allows
+        cached = await self.huggingface.lookup_cached(
             prompt=prompt,
             style=parameters.style.value,
             key=parameters.key.value,
@@ -125,18 +202,151 @@ class GenerationService:
             mood=parameters.mood.value,
             duration=parameters.duration.value
         )
+        if cached:
+            await report("processing", 90, "Serving a cached HuggingFace piece...")
+            return await self._finalize_file(cached, parameters, BackendType.HUGGINGFACE, cached=True)
 
-        if out_path:
-            if progress_callback:
-                await progress_callback("processing", 90, "Finalizing MIDI file...")
+        await report("generating", 30, "Contacting HuggingFace Space...")
 
-            return await self._finalize_file(out_path, parameters, BackendType.HUGGINGFACE)
+        budget = parameters.latency_budget
+        if budget is None:
+            budget = settings.HEDGE_LATENCY_BUDGET
 
-        # Fallback to Simple MIDI
-        if progress_callback:
-            await progress_callback("generating", 50, f"HuggingFace failed: {error}. Using Simple MIDI fallback...")
+        hedge: Optional[asyncio.Task] = None
+        hedge_won = False
 
-        return await self._generate_simple_fallback(parameters, progress_callback)
+        async def hf_progress(stage: str, percent: int, message: str):
+            # Once Simple MIDI has won the job is complete; an upgrade run stays quiet
+            if not hedge_won:
+                await report(stage, percent, message)
+
+        started = time.monotonic()
+        primary = asyncio.create_task(self.huggingface.generate(
+            prompt=prompt,
+            style=parameters.style.value,
+            key=parameters.key.value,
+            tempo=parameters.tempo,
+            mood=parameters.mood.value,
+            duration=parameters.duration.value,
+            progress_callback=hf_progress
+        ))
+        # When each branch finished, for the router and time-saved accounting
+        finished = {}
+        primary.add_done_callback(lambda _: finished.setdefault("primary", time.monotonic()))
+
+        try:
+            await asyncio.wait([primary], timeout=budget or None)
+
+            if not primary.done():
+                hedge_stats.stats["hedged"] += 1
+                await report(
+                    "generating", 50,
+                    f"HuggingFace is taking over {budget:g}s; starting Simple MIDI in parallel..."
+                )
+                hedge_started = time.monotonic()
+                hedge = asyncio.create_task(self._generate_simple_fallback(parameters))
+                hedge.add_done_callback(lambda _: finished.setdefault("hedge", time.monotonic()))
+                await asyncio.wait([primary, hedge], return_when=asyncio.FIRST_COMPLETED)
+
+            if primary.done():
+                out_path, error = primary.result()
+                backend_router.record(BackendType.HUGGINGFACE, bool(out_path), finished["primary"] - started)
+                if out_path:
+                    hedge_stats.record_primary(finished["primary"] - started)
+                    if hedge:
+                        hedge_stats.stats["primary_wins"] += 1
+                        await self._cancel_loser(hedge)
+                    await report("processing", 90, "Finalizing MIDI file...")
+                    return await self._finalize_file(out_path, parameters, BackendType.HUGGINGFACE)
+
+                # Fallback to Simple MIDI (already running if hedged)
+                await report("generating", 50, f"HuggingFace failed: {error}. Using Simple MIDI fallback...")
+                if hedge:
+                    result, error = await hedge
+                    if result:
+                        hedge_stats.record_race(finished["primary"], False, hedge_started, finished["hedge"])
+                    return result, error
+                return await self._generate_simple_fallback(parameters, progress_callback)
+
+            # Simple MIDI finished first
+            result, error = hedge.result()
+            if not result:
+                out_path, error = await primary
+                backend_router.record(BackendType.HUGGINGFACE, bool(out_path), finished["primary"] - started)
+                if out_path:
+                    hedge_stats.record_primary(finished["primary"] - started)
+                    await report("processing", 90, "Finalizing MIDI file...")
+                    return await self._finalize_file(out_path, parameters, BackendType.HUGGINGFACE)
+                return None, error or "All generation methods failed"
+
+            # The AI run's outcome is unknown until it finishes, so neither the
+            # router nor the time-saved total hear about it before then
+            hedge_stats.stats["fallback_wins"] += 1
+            hedge_won = True
+            if upgrade_callback and settings.HEDGE_DELIVER_UPGRADE:
+                task = asyncio.create_task(
+                    self._deliver_upgrade(primary, parameters, upgrade_callback, started, finished, hedge_started)
+                )
+                self._upgrades.add(task)
+                task.add_done_callback(self._upgrades.discard)
+            else:
+                await self._cancel_loser(primary)
+            return result, None
+
+        except asyncio.CancelledError:
+            primary.cancel()
+            if hedge:
+                hedge.cancel()
+            raise
+
+    async def _cancel_loser(self, task: asyncio.Task):
+        """Cancel the slower branch of a race, discarding any file it already produced."""
+        task.cancel()
+        await asyncio.wait([task])
+        hedge_stats.stats["losers_cancelled"] += 1
+        if task.cancelled() or task.exception():
+            return
+        result = task.result()[0]
+        if isinstance(result, MidiFileMetadata):
+            self._discard(result)
+        elif result and os.path.exists(result):
+            os.remove(result)
+
+    def _discard(self, metadata: MidiFileMetadata):
+        path = os.path.join(self.storage_path, metadata.filename)
+        for p in (path, thumbnail_path_for(path)):
+            if os.path.exists(p):
+                os.remove(p)
+
+    async def _deliver_upgrade(
+        self,
+        primary: asyncio.Task,
+        parameters: MusicParameters,
+        upgrade_callback: UpgradeCallback,
+        started: float,
+        finished: dict,
+        hedge_started: float
+    ):
+        """Let a losing AI run finish in the background and hand its result over."""
+        try:
+            out_path, error = await primary
+        except Exception as e:
+            print(f"Hedged HuggingFace run failed: {e}")
+            out_path = None
+        # Both branches are done now
+        elapsed = finished["primary"] - started
+        backend_router.record(BackendType.HUGGINGFACE, bool(out_path), elapsed)
+        hedge_stats.record_race(finished["primary"], bool(out_path), hedge_started, finished["hedge"])
+        if not out_path:
+            return
+
+        hedge_stats.record_primary(elapsed)
+        metadata, _ = await self._finalize_file(out_path, parameters, BackendType.HUGGINGFACE)
+        hedge_stats.stats["upgrades"] += 1
+        try:
+            await upgrade_callback(metadata)
+        except Exception as e:
+            print(f"Upgrade delivery failed: {e}")
 
     async def _generate_simple(
         self,
@@ -158,7 +368,8 @@ class GenerationService:
             duration_sec=duration_sec,
             mood=parameters.mood.value,
             key=parameters.key.value,
-            style=parameters.style.value
+            style=parameters.style.value,
+            seed=parameters.seed
         )
 
         if out_path:
@@ -186,7 +397,8 @@ class GenerationService:
             duration_sec=duration_sec,
             mood=parameters.mood.value,
             key=parameters.key.value,
-            style=parameters.style.value
+            style=parameters.style.value,
+            seed=parameters.seed
         )
 
         if out_path:
@@ -198,7 +410,8 @@ class GenerationService:
         self,
         temp_path: str,
         parameters: MusicParameters,
-        actual_backend: BackendType
+        actual_backend: BackendType,
+        cached: bool = False
     ) -> Tuple[MidiFileMetadata, None]:
         """
         Move file to persistent storage and create metadata.
@@ -207,6 +420,7 @@ class GenerationService:
             temp_path: Temporary file path
             parameters: Generation parameters
             actual_backend: The backend that actually generated the file
+            cached: Whether the file came from the prompt cache
 
         Returns:
             Tuple of (MidiFileMetadata, None)
@@ -218,15 +432,26 @@ class GenerationService:
         filename = f"piano_{mood_slug}_{timestamp}_{file_id}.mid"
 
         # Final path in persistent storage
-        final_path = os.path.join(settings.GENERATED_MIDI_PATH, filename)
+        final_path = os.path.join(self.storage_path, filename)
 
         # Move/copy file to persistent storage
         if temp_path != final_path:
             shutil.move(temp_path, final_path)
 
-        # Get file size
+        # Record key, style and mood in the file, for continuations
+        try:
+            await asyncio.to_thread(
+                write_tags, final_path, parameters.key.value, parameters.style.value, parameters.mood.value
+            )
+        except Exception as e:
+            print(f"Could not tag {filename}: {e}")
+
+        # Get file size (after tagging, which rewrites the file)
         file_size = os.path.getsize(final_path)
 
+        # Render the gallery thumbnail once, off the event loop
+        await asyncio.to_thread(write_thumbnail, final_path)
+
         # Create metadata
         metadata = MidiFileMetadata(
             file_id=file_id,
@@ -234,7 +459,8 @@ class GenerationService:
             file_size=file_size,
             backend=actual_backend,
             parameters=parameters,
-            created_at=datetime.datetime.now()
+            created_at=datetime.datetime.now(),
+            cached=cached
         )
 
         return metadata, None
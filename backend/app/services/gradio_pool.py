@@ -0,0 +1,138 @@
+"""
+Pooled Gradio clients.
+Creating a gradio_client.Client fetches the Space config and opens a new
+connection, so clients are kept per model and reused across requests.
+"""
+import time
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import requests
+from gradio_client import Client
+
+from ..config import settings
+
+
+class PooledClient:
+    """A Gradio client checked out of the pool."""
+
+    def __init__(self, client: Any, setup_seconds: float):
+        self.client = client
+        self.setup_seconds = setup_seconds
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.uses = 0
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+    @property
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_used
+
+
+class GradioClientPool:
+    """
+    Idle Gradio clients per (model, token), shared by every HuggingFaceService.
+
+    - Clients are created lazily, off the event loop, on first use.
+    - A client goes back to the pool only if its call succeeded; a failed
+      or cancelled call drops it, so the next request starts fresh.
+    - Clients older than HF_CLIENT_MAX_AGE seconds are recycled, and at
+      most HF_CLIENT_POOL_SIZE idle clients are kept per model.
+    - A client idle for over HF_CLIENT_PING_AFTER seconds is pinged before
+      it is handed out, and dropped if its Space no longer answers.
+    - The most recently used client is handed out first, since its
+      keep-alive connection is the most likely to still be open.
+    """
+
+    def __init__(self, max_idle: int = None, max_age: float = None, ping_after: float = None):
+        self.max_idle = max_idle or settings.HF_CLIENT_POOL_SIZE
+        self.max_age = max_age or settings.HF_CLIENT_MAX_AGE
+        self.ping_after = ping_after or settings.HF_CLIENT_PING_AFTER
+        self._idle: Dict[tuple, Deque[PooledClient]] = {}
+        self.stats = {
+            "created": 0,
+            "reused": 0,
+            "recycled_unhealthy": 0,
+            "recycled_expired": 0,
+            "recycled_failed_ping": 0,
+            "dropped_surplus": 0,
+            "setup_seconds": 0.0,
+        }
+
+    async def acquire(self, model: str, token: Optional[str] = None) -> PooledClient:
+        """Check out a client for a model, creating one if none is idle."""
+        idle = self._idle.get((model, token))
+        while idle:
+            pooled = idle.pop()
+            if pooled.age > self.max_age:
+                self.stats["recycled_expired"] += 1
+                continue
+            if pooled.idle_seconds > self.ping_after and not await asyncio.to_thread(self.ping, pooled, token):
+                self.stats["recycled_failed_ping"] += 1
+                continue
+            self.stats["reused"] += 1
+            return pooled
+
+        started = time.monotonic()
+        client = await asyncio.to_thread(Client, model, hf_token=token)
+        setup = time.monotonic() - started
+        self.stats["created"] += 1
+        self.stats["setup_seconds"] += setup
+        return PooledClient(client, setup)
+
+    def release(self, model: str, token: Optional[str], pooled: PooledClient, healthy: bool):
+        """Return a client after use; unhealthy, expired or surplus clients are dropped."""
+        pooled.uses += 1
+        pooled.last_used = time.monotonic()
+        if not healthy:
+            self.stats["recycled_unhealthy"] += 1
+            return
+        if pooled.age > self.max_age:
+            self.stats["recycled_expired"] += 1
+            return
+        idle = self._idle.setdefault((model, token), deque())
+        if len(idle) >= self.max_idle:
+            self.stats["dropped_surplus"] += 1
+            return
+        idle.append(pooled)
+
+    def ping(self, pooled: PooledClient, token: Optional[str] = None) -> bool:
+        """
+        Whether a client's Space still answers, by fetching its config.
+
+        Uses the URL the client resolved, so Space ids and direct URLs are
+        checked the same way generation reaches them. Blocking; run it in
+        a worker thread.
+        """
+        src = getattr(pooled.client, "src", None)
+        if not src:
+            return True
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        try:
+            r = requests.get(f"{src.rstrip('/')}/config", headers=headers, timeout=settings.CAPABILITY_PROBE_TIMEOUT)
+            return r.ok
+        except requests.RequestException:
+            return False
+
+    def get_stats(self) -> dict:
+        """Return pool counters, including the setup time reuse avoided."""
+        created = self.stats["created"]
+        avg_setup = self.stats["setup_seconds"] / created if created else None
+        checkouts = created + self.stats["reused"]
+        saved = self.stats["reused"] * avg_setup if avg_setup else 0.0
+        return {
+            **self.stats,
+            "setup_seconds": round(self.stats["setup_seconds"], 2),
+            "avg_setup_seconds": round(avg_setup, 3) if avg_setup else None,
+            "setup_seconds_saved": round(saved, 2),
+            "setup_seconds_saved_per_request": round(saved / checkouts, 3) if checkouts else None,
+            "idle": {model: len(clients) for (model, _), clients in self._idle.items()},
+        }
+
+
+# Shared instance used by HuggingFaceService
+gradio_clients = GradioClientPool()
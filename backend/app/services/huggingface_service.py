@@ -4,13 +4,28 @@ Uses Gradio client to interact with HuggingFace models.
 Ported from original app_streamlit.py HuggingFace integration.
 """
 import os
+import time
 import base64
+import asyncio
 import tempfile
 import requests
-from typing import Tuple, Optional, Any
-from gradio_client import Client
+from typing import Tuple, Optional, Any, Callable, Awaitable
 
 from ..config import settings
+from .circuit_breaker import breakers
+from .gradio_pool import gradio_clients
+from .prompt_cache import prompt_cache
+from .backend_router import backend_router
+from ..models import BackendType
+
+ProgressCallback = Callable[[str, int, str], Awaitable[None]]
+
+MIDI_HEADER = b"MThd"
+STAGING_SUFFIX = ".part"
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Shared HTTP session so result downloads reuse connections to the Space
+_http = requests.Session()
 
 
 class HuggingFaceService:
@@ -28,7 +43,8 @@ class HuggingFaceService:
         key: str,
         tempo: int,
         mood: str,
-        duration: str
+        duration: str,
+        progress_callback: Optional[ProgressCallback] = None
     ) -> Tuple[Optional[str], Optional[str]]:
         """
         Generate music using HuggingFace Spaces.
@@ -40,38 +56,117 @@ class HuggingFaceService:
             tempo: Tempo in BPM
             mood: Musical mood
             duration: Duration
+            progress_callback: Optional async callback for queue position and ETA
 
         Returns:
             Tuple of (output_file_path, error_message)
         """
-        # Enhance prompt with parameters
-        enhanced_prompt = f"{prompt}. Style: {style}, Key: {key}, Tempo: {tempo} BPM, Mood: {mood}, Duration: {duration}"
-
-        # Try primary model
-        result, error = await self._try_model(self.primary_model, enhanced_prompt)
-        if result:
-            return self._save_midi_from_result(result)
+        enhanced_prompt, cache_keys = self._prepare(prompt, style, key, tempo, mood, duration)
 
-        # Try fallback model
-        result, error = await self._try_model(self.fallback_model, enhanced_prompt)
-        if result:
-            return self._save_midi_from_result(result)
+        error = None
+        for model in (self.primary_model, self.fallback_model):
+            result, error = await self._try_model(model, enhanced_prompt, progress_callback)
+            if not result:
+                continue
+            out_path, error = await asyncio.to_thread(self._save_midi_from_result, result)
+            if out_path:
+                try:
+                    await asyncio.to_thread(prompt_cache.store, cache_keys[model], out_path)
+                except OSError as e:
+                    print(f"Could not cache HuggingFace result: {e}")
+            return out_path, error
 
         return None, error or "All HuggingFace models failed"
 
-    async def _try_model(self, model_name: str, prompt: str) -> Tuple[Any, Optional[str]]:
-        """Try to generate music with a specific model."""
+    async def lookup_cached(
+        self,
+        prompt: str,
+        style: str,
+        key: str,
+        tempo: int,
+        mood: str,
+        duration: str
+    ) -> Optional[str]:
+        """
+        A cached piece for this request, when HF_CACHE_POLICY allows serving one.
+
+        Kept apart from generate() so callers can tell a cache hit from a
+        Space call and leave it out of latency and hedging statistics.
+
+        Returns:
+            Path of a staged copy of the cached piece, or None
+        """
+        _, cache_keys = self._prepare(prompt, style, key, tempo, mood, duration)
+        return await asyncio.to_thread(
+            prompt_cache.lookup, list(cache_keys.values()),
+            backend_router.expected_latency(BackendType.HUGGINGFACE)
+        )
+
+    def _prepare(self, prompt: str, style: str, key: str, tempo: int, mood: str, duration: str):
+        """Return the enhanced prompt and the cache key per model."""
+        enhanced_prompt = f"{prompt}. Style: {style}, Key: {key}, Tempo: {tempo} BPM, Mood: {mood}, Duration: {duration}"
+        cache_params = {"style": style, "key": key, "tempo": tempo, "mood": mood, "duration": duration}
+        cache_keys = {
+            model: prompt_cache.key_for(model, enhanced_prompt, cache_params)
+            for model in (self.primary_model, self.fallback_model)
+        }
+        return enhanced_prompt, cache_keys
+
+    async def _try_model(
+        self,
+        model_name: str,
+        prompt: str,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> Tuple[Any, Optional[str]]:
+        """Try to generate music with a specific model, skipping it while its breaker is open."""
+        breaker = breakers.get(f"huggingface:{model_name}")
+        if not breaker.allow():
+            return None, f"{model_name} skipped: circuit open after recent failures"
+
+        job = None
+        pooled = None
+        healthy = False
+        started = time.monotonic()
         try:
-            client = Client(model_name, hf_token=self.token)
-            result = client.predict(prompt, 10, api_name="/predict")
+            # Reuse a connected client for this Space when one is idle. Client setup
+            # isn't part of the call's latency; only a setup failure is timed with it.
+            pooled = await gradio_clients.acquire(model_name, self.token)
+            started = time.monotonic()
+            # Submit as a Gradio job so it can be cancelled, and await its future on the
+            # loop: no thread stays blocked on a job that is cancelled but keeps running
+            job = pooled.client.submit(prompt, 10, api_name="/predict")
+            waiter = asyncio.wrap_future(job.future)
+            reporter = _StatusReporter(model_name, progress_callback)
+            while not waiter.done():
+                await asyncio.wait([waiter], timeout=settings.HF_PROGRESS_INTERVAL)
+                if not waiter.done():
+                    await reporter.report(job.status())
+            result = waiter.result()
+            healthy = True
+            breaker.record_success(time.monotonic() - started)
             return result, None
+        except asyncio.CancelledError:
+            breaker.release()
+            if job is not None:
+                job.cancel()
+                waiter.cancel()
+            raise
         except Exception as e:
+            breaker.record_failure(time.monotonic() - started, str(e))
             return None, f"{model_name} failed: {str(e)}"
+        finally:
+            if pooled is not None:
+                gradio_clients.release(model_name, self.token, pooled, healthy)
 
     def _save_midi_from_result(self, res: Any) -> Tuple[Optional[str], Optional[str]]:
         """
         Parse and save MIDI from various response formats.
         Handles: bytes, URLs, base64 strings, file paths, dicts, lists.
+        Blocking (downloads and disk writes); run it in a worker thread.
+
+        Every payload must start with a MIDI header and stay under
+        MAX_FILE_SIZE. Results are staged next to the gallery, so
+        finalizing them is a rename rather than a copy.
         """
         # Normalize lists/tuples - take first element
         if isinstance(res, (list, tuple)) and len(res) > 0:
@@ -86,11 +181,11 @@ class HuggingFaceService:
 
         # Bytes/bytearray -> write directly
         if isinstance(res, (bytes, bytearray)):
+            error = _check_midi(res[:4], len(res))
+            if error:
+                return None, error
             try:
-                tf = tempfile.NamedTemporaryFile(delete=False, suffix=".mid", dir=settings.GENERATED_MIDI_PATH)
-                tf.write(res)
-                tf.close()
-                return tf.name, None
+                return _stage([res]), None
             except Exception as e:
                 return None, f"Failed to save bytes: {e}"
 
@@ -99,29 +194,127 @@ class HuggingFaceService:
             # URL -> download
             if res.startswith("http"):
                 try:
-                    r = requests.get(res, timeout=30)
-                    r.raise_for_status()
-                    tf = tempfile.NamedTemporaryFile(delete=False, suffix=".mid", dir=settings.GENERATED_MIDI_PATH)
-                    tf.write(r.content)
-                    tf.close()
-                    return tf.name, None
+                    return _download(res), None
                 except Exception as e:
                     return None, f"Failed to download from URL: {e}"
 
-            # Try base64 decode
-            try:
-                b = base64.b64decode(res)
-                # Basic sanity: MIDI header starts with 'MThd'
-                if b and b[:4] == b"MThd":
-                    tf = tempfile.NamedTemporaryFile(delete=False, suffix=".mid", dir=settings.GENERATED_MIDI_PATH)
-                    tf.write(b)
-                    tf.close()
-                    return tf.name, None
-            except Exception:
-                pass
-
-            # Local path
-            if os.path.exists(res):
+            # Base64, only when it can be MIDI (base64 of "MThd..." starts "TVRoZ")
+            data = res.split("base64,", 1)[-1].strip()
+            if data.startswith("TVRoZ") and len(data) <= (settings.MAX_FILE_SIZE * 4) // 3 + 4:
+                try:
+                    return _stage([base64.b64decode(data)]), None
+                except Exception as e:
+                    return None, f"Failed to decode base64 result: {e}"
+
+            # Local path (e.g. a file the Gradio client downloaded)
+            if os.path.isfile(res):
+                with open(res, "rb") as f:
+                    error = _check_midi(f.read(4), os.path.getsize(res))
+                if error:
+                    return None, error
                 return res, None
 
         return None, f"Could not parse result format: {type(res)}"
+
+
+def _check_midi(head: bytes, size: int) -> Optional[str]:
+    """Reject payloads that are too large or do not start with a MIDI header."""
+    if size > settings.MAX_FILE_SIZE:
+        return f"Result is larger than {settings.MAX_FILE_SIZE} bytes"
+    if head[:4] != MIDI_HEADER:
+        return "Result is not a MIDI file"
+    return None
+
+
+def _stage(chunks) -> str:
+    """
+    Write chunks to a staging file in the gallery directory.
+
+    The ".part" suffix keeps it out of the gallery listing until it is
+    finalized. Chunks must already be validated; the file is removed if
+    writing fails.
+    """
+    tf = tempfile.NamedTemporaryFile(delete=False, suffix=STAGING_SUFFIX, dir=settings.GENERATED_MIDI_PATH)
+    try:
+        with tf:
+            for chunk in chunks:
+                tf.write(chunk)
+    except BaseException:
+        os.remove(tf.name)
+        raise
+    return tf.name
+
+
+def _download(url: str) -> str:
+    """Stream a result URL to a staging file, enforcing the header and size cap."""
+    with _http.get(url, stream=True, timeout=30) as r:
+        r.raise_for_status()
+        declared = int(r.headers.get("Content-Length") or 0)
+        if declared > settings.MAX_FILE_SIZE:
+            raise ValueError(f"Result is larger than {settings.MAX_FILE_SIZE} bytes")
+
+        def chunks():
+            received = 0
+            head = b""
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                received += len(chunk)
+                if received > settings.MAX_FILE_SIZE:
+                    raise ValueError(f"Result is larger than {settings.MAX_FILE_SIZE} bytes")
+                # Sniff the header as soon as four bytes have arrived
+                if len(head) < 4:
+                    head += chunk[:4 - len(head)]
+                    if len(head) == 4 and head != MIDI_HEADER:
+                        raise ValueError("Result is not a MIDI file")
+                yield chunk
+            if head != MIDI_HEADER:
+                raise ValueError("Result is not a MIDI file")
+
+        return _stage(chunks())
+
+
+class _StatusReporter:
+    """
+    Turns Gradio job status updates into progress callbacks.
+
+    Queued jobs report their position and ETA; running jobs advance from
+    30% to 85% against the Space's ETA. Unchanged messages are not resent.
+    """
+
+    def __init__(self, model_name: str, progress_callback: Optional[ProgressCallback]):
+        self.model_name = model_name
+        self.progress_callback = progress_callback
+        self.processing_since: Optional[float] = None
+        self.last: Optional[Tuple[int, str]] = None
+
+    async def report(self, status: Any):
+        if self.progress_callback is None or status is None:
+            return
+        code = getattr(getattr(status, "code", None), "name", "")
+        eta = getattr(status, "eta", None)
+
+        if code == "IN_QUEUE":
+            rank = getattr(status, "rank", None)
+            size = getattr(status, "queue_size", None)
+            position = f"position {rank + 1}" if rank is not None else "queued"
+            if rank is not None and size:
+                position += f" of {size}"
+            message = f"{self.model_name}: {position} in queue"
+            if eta:
+                message += f", ~{eta:.0f}s to start"
+            percent = 30
+        elif code in ("PROCESSING", "ITERATING", "PROGRESS"):
+            if self.processing_since is None:
+                self.processing_since = time.monotonic()
+            elapsed = time.monotonic() - self.processing_since
+            percent = 30 + int(55 * min(1.0, elapsed / eta)) if eta else 40
+            message = f"{self.model_name}: generating"
+            if eta:
+                message += f" (~{max(0.0, eta - elapsed):.0f}s left)"
+        elif code in ("STARTING", "JOINING_QUEUE", "SENDING_DATA"):
+            percent, message = 30, f"{self.model_name}: connecting"
+        else:
+            return
+
+        if (percent, message) != self.last:
+            self.last = (percent, message)
+            await self.progress_callback("generating", percent, message)
@@ -0,0 +1,94 @@
+"""
+Socket.IO events for job updates.
+Translates job snapshots into the events the client expects; used by the
+API's relays and by workers emitting straight to a session.
+"""
+import os
+import asyncio
+from typing import Optional
+
+from ..models import GenerationJob, GenerationStatus, MidiFileMetadata
+from ..config import settings
+from ..utils.midi_notes import read_midi_notes, columnar_notes
+
+
+async def emit_error(sio, sid: str, job_id: Optional[str], error: str):
+    """Emit a generation_error for a job."""
+    await sio.emit("generation_error", {
+        "jobId": job_id,
+        "error": error,
+        "fallback": False
+    }, room=sid)
+
+
+async def result_event(job_id: str, result: MidiFileMetadata, inline: dict) -> dict:
+    """
+    File event with the MIDI bytes and/or columnar notes attached on request.
+
+    Bytes travel as a Socket.IO binary attachment. Files over
+    WS_INLINE_MAX_BYTES are not attached; the client downloads them.
+    """
+    event = _file_event(job_id, result)
+    if not (inline.get("midi") or inline.get("notes")) or result.file_size > settings.WS_INLINE_MAX_BYTES:
+        return event
+
+    path = os.path.join(settings.GENERATED_MIDI_PATH, result.filename)
+    try:
+        if inline.get("midi"):
+            event["midi"] = await asyncio.to_thread(_read_bytes, path)
+        if inline.get("notes"):
+            event["notes"] = columnar_notes(await asyncio.to_thread(read_midi_notes, path))
+    except Exception as e:
+        print(f"Inline payload for {job_id} failed: {e}")
+    return event
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _file_event(job_id: str, result: MidiFileMetadata) -> dict:
+    """Payload for generation_complete / generation_upgrade."""
+    return {
+        "jobId": job_id,
+        "fileId": result.file_id,
+        "filename": result.filename,
+        "fileSize": result.file_size,
+        "downloadUrl": f"/api/files/{result.file_id}/download"
+    }
+
+
+async def emit_job_update(
+    sio,
+    sid: str,
+    job: GenerationJob,
+    job_id: Optional[str] = None,
+    inline: Optional[dict] = None
+):
+    """
+    Translate a job update into the Socket.IO event the client expects.
+
+    Args:
+        sio: SocketIO server instance, or a client manager (workers)
+        sid: Session to notify
+        job: Current job state
+        job_id: The client's jobId for the job, if different
+        inline: Result payloads to attach ({"midi": bool, "notes": bool})
+    """
+    job_id = job_id or job.job_id
+    if job.status == GenerationStatus.COMPLETED and job.upgrade:
+        await sio.emit("generation_upgrade", await result_event(job_id, job.upgrade, inline or {}), room=sid)
+    elif job.status == GenerationStatus.COMPLETED and job.result:
+        await sio.emit("generation_complete", await result_event(job_id, job.result, inline or {}), room=sid)
+    elif job.status == GenerationStatus.CANCELLED:
+        await sio.emit("generation_cancelled", {"jobId": job_id}, room=sid)
+    elif job.status in (GenerationStatus.FAILED, GenerationStatus.COMPLETED):
+        await emit_error(sio, sid, job_id, job.error or "Unknown error")
+    else:
+        await sio.emit("generation_progress", {
+            "jobId": job_id,
+            "stage": job.stage.value,
+            "progress": job.progress,
+            "message": job.message
+        }, room=sid)
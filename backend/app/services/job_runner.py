@@ -0,0 +1,150 @@
+"""
+Job execution shared by the API and the generation workers.
+Runs generation and continuation jobs and records their progress, result
+or cancellation in the job store.
+"""
+import asyncio
+from datetime import datetime
+
+from ..models import GenerationJob, GenerationStatus, GenerationStage, MusicParameters
+from ..config import settings
+from .generation_service import GenerationService
+from .continuation_service import continuation_service
+from .job_store import job_store
+from .scheduler import scheduler
+from .single_flight import single_flight
+from .worker_bridge import worker_bridge
+
+# Shared instance used by the API and the generation workers
+generation_service = GenerationService()
+
+
+def update_queue_info(job: GenerationJob):
+    """Refresh queue position and wait estimate for a pending job."""
+    if job.status == GenerationStatus.PENDING and settings.GENERATION_MODE == "worker":
+        job.queue_position, job.estimated_wait_seconds = worker_bridge.queue_info(job.job_id)
+    elif job.status == GenerationStatus.PENDING:
+        job.queue_position, job.estimated_wait_seconds = scheduler.queue_info(job.job_id)
+    else:
+        job.queue_position, job.estimated_wait_seconds = None, None
+
+
+async def run_generation(job_id: str, parameters: MusicParameters, service: GenerationService = None):
+    """
+    Run generation in background and update job status.
+
+    Args:
+        job_id: Job identifier
+        parameters: Generation parameters
+        service: Service to generate with (e.g. the warm pool's, which
+                 stores pieces in the pool); the shared one by default
+    """
+    service = service or generation_service
+    job = job_store.get(job_id)
+    flight = single_flight.get(job_id)
+
+    # Update job to in_progress
+    job.status = GenerationStatus.IN_PROGRESS
+    job.stage = GenerationStage.GENERATING
+    job.progress = 10
+    update_queue_info(job)
+    job_store.save(job)
+
+    # Progress callback (also feeds requests coalesced onto this job)
+    async def progress_callback(stage: str, progress: int, message: str):
+        apply_progress(job, stage, progress, message)
+        if flight:
+            await single_flight.progress(flight, stage, progress, message)
+
+    result, error = None, None
+    try:
+        # Generate music
+        result, error = await service.generate(
+            parameters, progress_callback, upgrade_callback=lambda upgrade: apply_upgrade(job, upgrade)
+        )
+        apply_result(job, result, error)
+
+    except asyncio.CancelledError:
+        error = "Job cancelled"
+        mark_cancelled(job)
+        raise
+
+    except Exception as e:
+        # Exception
+        error = str(e)
+        job.status = GenerationStatus.FAILED
+        job.stage = GenerationStage.ERROR
+        job.error = error
+        job.message = f"Generation error: {error}"
+        job.completed_at = datetime.now()
+        job_store.save(job)
+
+    finally:
+        if flight:
+            single_flight.finish(flight, result, error)
+
+
+async def run_continuation(job_id: str, midi_path: str, parameters: MusicParameters):
+    """Run a continuation job and record its outcome."""
+    job = job_store.get(job_id)
+    job.status = GenerationStatus.IN_PROGRESS
+    job.stage = GenerationStage.GENERATING
+    job.progress = 10
+    job.queue_position, job.estimated_wait_seconds = None, None
+    job_store.save(job)
+
+    try:
+        result, error = await continuation_service.continue_file(midi_path, parameters)
+        apply_result(job, result, error)
+    except asyncio.CancelledError:
+        mark_cancelled(job)
+        raise
+    except Exception as e:
+        apply_result(job, None, f"Continuation error: {e}")
+
+
+def mark_cancelled(job: GenerationJob):
+    job.status = GenerationStatus.CANCELLED
+    job.stage = GenerationStage.ERROR
+    job.error = "Job cancelled"
+    job.message = "Generation cancelled"
+    job.completed_at = datetime.now()
+    job_store.save(job)
+
+
+def apply_progress(job: GenerationJob, stage: str, progress: int, message: str):
+    job.stage = GenerationStage(stage)
+    job.progress = progress
+    job.message = message
+    job_store.save(job)
+
+
+async def apply_upgrade(job: GenerationJob, upgrade):
+    """Attach a late AI result to a job that already completed with Simple MIDI."""
+    job.upgrade = upgrade
+    job.message = "AI version ready"
+    job_store.save(job)
+
+
+def apply_result(job: GenerationJob, result, error):
+    """Record the outcome of a generation on its job."""
+    if result:
+        # Success
+        job.status = GenerationStatus.COMPLETED
+        job.stage = GenerationStage.COMPLETE
+        job.progress = 100
+        job.message = "Generation completed successfully"
+        job.result = result
+    else:
+        # Failure
+        job.status = GenerationStatus.FAILED
+        job.stage = GenerationStage.ERROR
+        job.error = error or "Unknown error"
+        job.message = f"Generation failed: {job.error}"
+    job.completed_at = datetime.now()
+    job_store.save(job)
+
+
+def upgrade_possible(job: GenerationJob) -> bool:
+    """Whether a completed job may still receive an AI upgrade."""
+    return settings.HEDGE_DELIVER_UPGRADE and job.result.backend != job.parameters.backend
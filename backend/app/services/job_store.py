@@ -0,0 +1,277 @@
+"""
+Generation job store.
+Bounded in-memory job table with TTL eviction and write-behind SQLite persistence.
+"""
+import os
+import time
+import sqlite3
+import asyncio
+import datetime
+from contextlib import closing
+from collections import OrderedDict
+from typing import Dict, Optional, Callable
+
+from ..models import GenerationJob, GenerationStatus, GenerationStage
+from ..config import settings
+from .shared_state import SharedState
+
+FINISHED_STATUSES = (GenerationStatus.COMPLETED, GenerationStatus.FAILED, GenerationStatus.CANCELLED)
+
+
+class JobStore:
+    """
+    Keeps generation jobs addressable by job_id.
+
+    - Lookups hit an in-memory dict first and fall back to SQLite, so jobs
+      survive restarts and evictions.
+    - Finished jobs are evicted from memory after a TTL, and the oldest
+      finished jobs are evicted early when the cap is reached. Running jobs
+      count towards the cap but are never evicted, since the generation task
+      mutates them in place, so the cap is soft: it can be exceeded by the
+      jobs in flight, which the scheduler's worker and queue limits bound.
+    - Writes are batched: save() only marks a job dirty, and a background
+      task flushes dirty jobs to SQLite every few seconds.
+    - The SQLite file (JOB_STORE_PATH unless given) is created on first
+      use, so importing the module touches no files.
+    """
+
+    def __init__(
+        self,
+        db_path: str = None,
+        max_entries: int = None,
+        ttl_seconds: int = None,
+        flush_interval: float = None
+    ):
+        self._db_path = db_path
+        self.max_entries = max_entries or settings.JOB_STORE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or settings.JOB_STORE_TTL_SECONDS
+        self.flush_interval = flush_interval or settings.JOB_STORE_FLUSH_INTERVAL
+
+        self._jobs: Dict[str, GenerationJob] = {}
+        # job_id -> monotonic finish time, oldest first
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        # job_id -> job awaiting a flush
+        self._dirty: Dict[str, GenerationJob] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        # job_id -> change counter, and events for clients waiting on a change
+        self._versions: Dict[str, int] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+        # Multi-process mode: snapshots go to / come from shared state
+        self.shared: Optional[SharedState] = None
+        self.publisher: Optional[Callable[[GenerationJob], None]] = None
+
+        self._schema_ready = False
+
+        self.stats = {
+            "memory_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "evicted_ttl": 0,
+            "evicted_cap": 0,
+            "flushes": 0,
+            "rows_written": 0,
+        }
+
+    @property
+    def db_path(self) -> str:
+        return self._db_path or settings.JOB_STORE_PATH
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            with closing(sqlite3.connect(self.db_path, timeout=10)) as conn, conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    "job_id TEXT PRIMARY KEY, status TEXT, created_at TEXT, data TEXT)"
+                )
+            self._schema_ready = True
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    # ------------------------------------------------------------------ access
+
+    def attach_shared(self, shared: SharedState, publisher: Callable[[GenerationJob], None] = None):
+        """
+        Use shared state for lookups of jobs owned by other processes.
+
+        Args:
+            shared: Shared state backend
+            publisher: Called with every locally saved job (worker processes
+                       use this to publish progress)
+        """
+        self.shared = shared
+        self.publisher = publisher
+
+    def add(self, job: GenerationJob):
+        """Register a new job."""
+        self._jobs[job.job_id] = job
+        self.save(job)
+
+    def apply(self, job: GenerationJob):
+        """Take over a job snapshot published by another process."""
+        self._jobs[job.job_id] = job
+        self._mark_changed(job)
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        """Look up a job in memory, then in shared state, then in SQLite."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            self.stats["memory_hits"] += 1
+            return job
+
+        job = self._dirty.get(job_id)
+        if job is None and self.shared is not None:
+            data = self.shared.load_job(job_id)
+            if data:
+                # May still be running in another process
+                self.stats["db_hits"] += 1
+                return GenerationJob.model_validate_json(data)
+        job = job or self._load(job_id)
+        if job is None:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["db_hits"] += 1
+        if job.status not in FINISHED_STATUSES and self.shared is None:
+            # Persisted mid-run by a process that is gone now
+            job.status = GenerationStatus.FAILED
+            job.stage = GenerationStage.ERROR
+            job.error = "Job interrupted by server restart"
+            job.message = f"Generation failed: {job.error}"
+            job.completed_at = datetime.datetime.now()
+            self._dirty[job_id] = job
+        return job
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+    def save(self, job: GenerationJob):
+        """Mark a job as changed; it is persisted on the next flush."""
+        self._mark_changed(job)
+        if self.publisher:
+            try:
+                self.publisher(job)
+            except Exception as e:
+                print(f"Job publish failed for {job.job_id}: {e}")
+
+    def _mark_changed(self, job: GenerationJob):
+        self._dirty[job.job_id] = job
+        self._versions[job.job_id] = self._versions.get(job.job_id, 0) + 1
+        event = self._changed.pop(job.job_id, None)
+        if event:
+            event.set()
+        if job.status in FINISHED_STATUSES and job.job_id not in self._finished:
+            self._finished[job.job_id] = time.monotonic()
+        self._evict()
+
+    def version(self, job_id: str) -> int:
+        """Change counter for a job; bumps on every save."""
+        return self._versions.get(job_id, 0)
+
+    async def wait_for_change(self, job_id: str, version: int, timeout: float) -> bool:
+        """
+        Wait until a job's version moves past `version`.
+
+        Returns:
+            True if the job changed, False on timeout
+        """
+        if self.version(job_id) != version:
+            return True
+        event = self._changed.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # ---------------------------------------------------------------- eviction
+
+    def _evict(self):
+        """Drop expired finished jobs, then the oldest ones while over the cap."""
+        now = time.monotonic()
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if now - finished_at >= self.ttl_seconds:
+                self._drop(job_id)
+                self.stats["evicted_ttl"] += 1
+            elif len(self._jobs) > self.max_entries:
+                self._drop(job_id)
+                self.stats["evicted_cap"] += 1
+            else:
+                break
+
+    def _drop(self, job_id: str):
+        del self._finished[job_id]
+        self._jobs.pop(job_id, None)
+        self._versions.pop(job_id, None)
+        self._changed.pop(job_id, None)
+
+    # ------------------------------------------------------------- persistence
+
+    def _load(self, job_id: str) -> Optional[GenerationJob]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return GenerationJob.model_validate_json(row[0]) if row else None
+
+    def _write(self, rows: list):
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO jobs (job_id, status, created_at, data) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+    async def flush(self):
+        """Write all dirty jobs to SQLite in one transaction."""
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        rows = [
+            (job.job_id, job.status.value, job.created_at.isoformat(), job.model_dump_json())
+            for job in batch.values()
+        ]
+        try:
+            await asyncio.to_thread(self._write, rows)
+        except Exception as e:
+            print(f"Job store flush failed: {e}")
+            # Keep newer versions that arrived during the write
+            self._dirty = {**batch, **self._dirty}
+            return
+        self.stats["flushes"] += 1
+        self.stats["rows_written"] += len(rows)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self._evict()
+            await self.flush()
+
+    @property
+    def started(self) -> bool:
+        return self._flush_task is not None
+
+    def start(self):
+        """Start the background flush task."""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flush task and persist anything outstanding."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    def get_stats(self) -> dict:
+        """Return store size and eviction/persistence counters."""
+        return {
+            **self.stats,
+            "in_memory": len(self._jobs),
+            "finished_in_memory": len(self._finished),
+            "running_in_memory": sum(1 for job_id in self._jobs if job_id not in self._finished),
+            "pending_writes": len(self._dirty),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+# Shared instance used by the generation endpoints
+job_store = JobStore()
@@ -0,0 +1,156 @@
+"""
+Resident Magenta generators.
+Reading the bundle, building the TensorFlow graph and restoring the
+checkpoint takes seconds, so each bundle is loaded once per process and
+reused until the bundle file changes.
+"""
+import os
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+
+class ResidentGenerator:
+    """
+    A Melody RNN generator kept loaded for one bundle file.
+
+    get() loads on first use and reloads when the bundle's mtime changes.
+    Inference is serialized with a lock: the generator shares one
+    TensorFlow session, and Magenta jobs already run one at a time.
+    """
+
+    def __init__(self, bundle_file: str, config: str = "attention_rnn"):
+        self.bundle_file = bundle_file
+        self.config = config
+        self._generator: Any = None
+        self._mtime_ns: Optional[int] = None
+        self._load_lock = threading.Lock()
+        self._run_lock = threading.Lock()
+
+        self.loaded_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.loads = 0
+        self.uses = 0
+        self.last_error: Optional[str] = None
+
+    def _load(self):
+        from magenta.models.shared import sequence_generator_bundle
+        from magenta.models.melody_rnn import melody_rnn_sequence_generator
+
+        started = time.monotonic()
+        bundle = sequence_generator_bundle.read_bundle_file(self.bundle_file)
+        generator_map = melody_rnn_sequence_generator.get_generator_map()
+        if self.config not in generator_map:
+            raise ValueError(f"Bundle/generator mismatch: '{self.config}' not available")
+
+        generator = generator_map[self.config](checkpoint=None, bundle=bundle)
+        generator.initialize()
+
+        self.load_seconds = time.monotonic() - started
+        self.loaded_at = time.time()
+        self.loads += 1
+        return generator
+
+    def get(self):
+        """Return the loaded generator, (re)loading it if needed."""
+        mtime_ns = os.stat(self.bundle_file).st_mtime_ns
+        with self._load_lock:
+            if self._generator is None or mtime_ns != self._mtime_ns:
+                try:
+                    self._generator = self._load()
+                    self._mtime_ns = mtime_ns
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                    raise
+            return self._generator
+
+    def generate(
+        self,
+        primer_pitches: List[int],
+        steps: int,
+        temperature: float = 1.0,
+        strip_primer: bool = False
+    ):
+        """
+        Generate a NoteSequence continuing a primer melody.
+
+        Args:
+            primer_pitches: Primer melody as melody events (MIDI pitches,
+                            -2 to hold, -1 for note-off), one per step
+            steps: Number of generation steps
+            temperature: Sampling temperature
+            strip_primer: Return only the new section, starting at time zero
+
+        Returns:
+            Generated NoteSequence
+        """
+        return self.generate_many(primer_pitches, steps, 1, temperature, strip_primer)[0]
+
+    def generate_many(
+        self,
+        primer_pitches: List[int],
+        steps: int,
+        count: int,
+        temperature: float = 1.0,
+        strip_primer: bool = False
+    ):
+        """
+        Generate `count` sequences from one primer, holding the session once.
+
+        The seed and options are built once, but the sequences are sampled
+        one after another: Melody RNN's generator has no batched sampling.
+        """
+        from magenta.protobuf import generator_pb2
+        from magenta.music import sequences_lib
+
+        generator = self.get()
+        seed = sequences_lib.melody_to_sequence(list(primer_pitches), start_step=0)
+
+        gen_options = generator_pb2.GeneratorOptions()
+        gen_options.args["temperature"].float_value = temperature
+        start_time = seed.total_time
+        end_time = start_time + float(steps) * 0.5  # Rough step → seconds mapping
+        gen_options.generate_sections.add(start_time=start_time, end_time=end_time)
+
+        with self._run_lock:
+            self.uses += count
+            sequences = [generator.generate(seed, gen_options) for _ in range(count)]
+
+        if strip_primer:
+            sequences = [
+                sequences_lib.extract_subsequence(s, start_time, max(s.total_time, start_time))
+                for s in sequences
+            ]
+        return sequences
+
+    def status(self) -> dict:
+        return {
+            "bundle": self.bundle_file,
+            "config": self.config,
+            "loaded": self._generator is not None,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 2) if self.load_seconds else None,
+            "loads": self.loads,
+            "uses": self.uses,
+            "error": self.last_error,
+        }
+
+
+_residents: Dict[str, ResidentGenerator] = {}
+_residents_lock = threading.Lock()
+
+
+def resident_generator(bundle_file: str, config: str = "attention_rnn") -> ResidentGenerator:
+    """Process-wide resident generator for a bundle file."""
+    key = os.path.abspath(bundle_file)
+    with _residents_lock:
+        resident = _residents.get(key)
+        if resident is None:
+            resident = _residents[key] = ResidentGenerator(bundle_file, config)
+        return resident
+
+
+def resident_status() -> List[dict]:
+    """Status of every resident generator in this process."""
+    return [r.status() for r in _residents.values()]
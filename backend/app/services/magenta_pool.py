@@ -0,0 +1,303 @@
+"""
+Magenta inference worker processes.
+Long-lived processes each hold a resident generator and take requests from
+a shared IPC queue, so TensorFlow runs outside the API's event loop and
+can use more than one core. Requests arriving close together are grouped:
+a group shares one primer setup and one hold of the session, but Melody RNN
+still samples its sequences one after another, so the gain is parallelism
+across workers rather than batched inference.
+"""
+import os
+import time
+import queue
+import asyncio
+import tempfile
+import itertools
+import multiprocessing
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+
+
+def _worker_main(index: int, bundle_file: str, requests, results, batch_window: float, batch_max: int):
+    """Worker process entry point: load the model once, then serve request groups."""
+    from .magenta_generator import resident_generator
+
+    try:
+        from magenta.music import sequence_proto_to_midi_file
+        resident = resident_generator(bundle_file)
+        resident.get()
+    except Exception as e:
+        results.put(("fatal", index, None, str(e)))
+        return
+    results.put(("ready", index, None, resident.load_seconds))
+
+    stopping = False
+    while not stopping:
+        try:
+            first = requests.get(timeout=settings.MAGENTA_WORKER_HEARTBEAT)
+        except queue.Empty:
+            results.put(("alive", index, None, None))
+            continue
+        if first is None:
+            break
+
+        # Collect whatever else arrives within the grouping window
+        batch = [first]
+        deadline = time.monotonic() + batch_window
+        while len(batch) < batch_max:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+
+        results.put(("claimed", index, [r["id"] for r in batch], None))
+
+        # Requests with the same primer and length share one seed/options setup
+        batch.sort(key=lambda r: (r["primer"], r["steps"], r["strip"]))
+        for _, group in itertools.groupby(batch, key=lambda r: (r["primer"], r["steps"], r["strip"])):
+            group = list(group)
+            try:
+                sequences = resident.generate_many(
+                    group[0]["primer"], group[0]["steps"], len(group),
+                    settings.MAGENTA_TEMPERATURE, strip_primer=group[0]["strip"]
+                )
+            except Exception as e:
+                for r in group:
+                    results.put(("done", index, r["id"], (None, f"Magenta generation error: {e}")))
+                continue
+
+            for r, sequence in zip(group, sequences):
+                try:
+                    if r["offset"]:
+                        for note in sequence.notes:
+                            note.pitch = max(21, min(108, note.pitch + r["offset"]))
+                    tf = tempfile.NamedTemporaryFile(delete=False, suffix=".mid")
+                    tf.close()
+                    sequence_proto_to_midi_file(sequence, tf.name)
+                    results.put(("done", index, r["id"], (tf.name, None)))
+                except Exception as e:
+                    results.put(("done", index, r["id"], (None, f"Magenta save error: {e}")))
+
+
+class MagentaProcessPool:
+    """
+    Pool of MAGENTA_WORKERS inference processes fed by one request queue.
+
+    - Each worker waits up to MAGENTA_BATCH_WINDOW seconds after its first
+      request for more (up to MAGENTA_BATCH_MAX) and serves them together.
+      The scheduler allows enough concurrent Magenta jobs to fill them
+      (see scheduler.magenta_slots).
+    - Workers report "claimed" before running a group, "done" per request
+      and heartbeat while idle. A monitor replaces workers that died, or
+      went silent for MAGENTA_WORKER_HANG_TIMEOUT while busy (3 heartbeats
+      while idle), and fails the requests they had claimed, so callers fall
+      through to the Magenta CLI.
+    - Results come back over a second queue and resolve asyncio futures.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.bundle_file: Optional[str] = None
+        self._ctx = multiprocessing.get_context("spawn")
+        self._requests = None
+        self._results = None
+        self._procs: List[Optional[multiprocessing.Process]] = []
+        self._claimed: Dict[int, List[int]] = {}
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._tasks: List[asyncio.Task] = []
+        self._last_seen: Dict[int, float] = {}
+        self._ready: set = set()
+        # index -> load error; such workers are not restarted
+        self._fatal: Dict[int, str] = {}
+        self.stats = {
+            "submitted": 0, "completed": 0, "failed": 0, "batches": 0,
+            "batched_requests": 0, "restarts": 0, "hung": 0,
+        }
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, bundle_file: str):
+        """Spawn the workers and the result/monitor tasks (idempotent)."""
+        if self.started:
+            return
+        self.bundle_file = bundle_file
+        self._requests = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._procs = [None] * self.workers
+        for index in range(self.workers):
+            self._spawn(index)
+        self._tasks = [
+            asyncio.create_task(self._read_results()),
+            asyncio.create_task(self._monitor()),
+        ]
+
+    def _spawn(self, index: int):
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.bundle_file, self._requests, self._results,
+                  settings.MAGENTA_BATCH_WINDOW, settings.MAGENTA_BATCH_MAX),
+            daemon=True,
+            name=f"magenta-worker-{index}",
+        )
+        proc.start()
+        self._procs[index] = proc
+        self._claimed[index] = []
+        self._last_seen[index] = time.monotonic()
+
+    async def generate(
+        self,
+        bundle_file: str,
+        primer_pitches: List[int],
+        steps: int,
+        offset: int,
+        strip_primer: bool = False
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Run one generation in a worker process.
+
+        Returns:
+            Tuple of (output_file_path, error_message)
+        """
+        self.start(bundle_file)
+        if len(self._fatal) == self.workers:
+            return None, f"Magenta workers unavailable: {next(iter(self._fatal.values()))}"
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._futures[request_id] = future
+        self._requests.put({
+            "id": request_id,
+            "primer": tuple(primer_pitches),
+            "steps": steps,
+            "offset": offset,
+            "strip": strip_primer,
+        })
+        self.stats["submitted"] += 1
+
+        try:
+            return await asyncio.wait_for(future, timeout=settings.MAGENTA_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None, "Magenta worker timed out"
+        finally:
+            # A late or cancelled result is discarded by _resolve
+            self._futures.pop(request_id, None)
+
+    def _resolve(self, request_id: int, outcome: Tuple[Optional[str], Optional[str]]):
+        future = self._futures.get(request_id)
+        path, error = outcome
+        if future is None or future.done():
+            if path and os.path.exists(path):
+                os.remove(path)
+            return
+        self.stats["completed" if path else "failed"] += 1
+        future.set_result(outcome)
+
+    async def _read_results(self):
+        while True:
+            try:
+                kind, index, payload, extra = await asyncio.to_thread(self._results.get, True, 1.0)
+            except queue.Empty:
+                continue
+            self._last_seen[index] = time.monotonic()
+
+            if kind == "ready":
+                self._ready.add(index)
+                print(f"Magenta worker {index} ready (model loaded in {extra:.1f}s)")
+            elif kind == "fatal":
+                self._fatal[index] = extra
+                print(f"Magenta worker {index} could not load the model: {extra}")
+                if len(self._fatal) == self.workers:
+                    # Nobody will serve the queue; fail waiting callers now
+                    for request_id in list(self._futures):
+                        self._resolve(request_id, (None, f"Magenta workers unavailable: {extra}"))
+            elif kind == "claimed":
+                self._claimed[index] = list(payload)
+                self.stats["batches"] += 1
+                self.stats["batched_requests"] += len(payload)
+            elif kind == "done":
+                if payload in self._claimed.get(index, []):
+                    self._claimed[index].remove(payload)
+                self._resolve(payload, extra)
+
+    def _silence_limit(self, index: int) -> float:
+        """Seconds without a message before a live worker counts as hung."""
+        if index in self._ready and not self._claimed.get(index):
+            return 3 * settings.MAGENTA_WORKER_HEARTBEAT
+        # Loading the model or generating: only "done" messages come through
+        return max(settings.MAGENTA_WORKER_HANG_TIMEOUT, 3 * settings.MAGENTA_WORKER_HEARTBEAT)
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(settings.MAGENTA_WORKER_HEARTBEAT)
+            now = time.monotonic()
+            for index, proc in enumerate(self._procs):
+                if proc is None or index in self._fatal:
+                    continue
+                if proc.is_alive():
+                    silent = now - self._last_seen.get(index, now)
+                    if silent < self._silence_limit(index):
+                        continue
+                    reason = f"no heartbeat for {silent:.0f}s"
+                    proc.kill()
+                    await asyncio.to_thread(proc.join, 5)
+                    self.stats["hung"] += 1
+                else:
+                    reason = f"exit code {proc.exitcode}"
+                lost = self._claimed.get(index, [])
+                for request_id in lost:
+                    self._resolve(request_id, (None, f"Magenta worker lost ({reason})"))
+                print(f"Restarting Magenta worker {index} ({reason}, {len(lost)} requests lost)")
+                self.stats["restarts"] += 1
+                self._ready.discard(index)
+                self._spawn(index)
+
+    async def stop(self):
+        """Stop workers and background tasks."""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        for _ in self._procs:
+            self._requests.put(None)
+        for proc in self._procs:
+            if proc is not None:
+                await asyncio.to_thread(proc.join, 5)
+                if proc.is_alive():
+                    proc.kill()
+
+    def get_stats(self) -> dict:
+        """Return worker liveness and batching counters."""
+        now = time.monotonic()
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "workers": self.workers,
+            "started": self.started,
+            "ready_workers": len(self._ready),
+            "avg_batch_size": round(self.stats["batched_requests"] / batches, 2) if batches else None,
+            "pending": len(self._futures),
+            "processes": [
+                {
+                    "index": index,
+                    "pid": proc.pid if proc is not None else None,
+                    "alive": proc is not None and proc.is_alive(),
+                    "error": self._fatal.get(index),
+                    "claimed": len(self._claimed.get(index, [])),
+                    "last_seen_seconds_ago": round(now - self._last_seen.get(index, now), 1),
+                }
+                for index, proc in enumerate(self._procs)
+            ],
+        }
+
+
+# Shared instance; used by MagentaService when MAGENTA_WORKERS > 0
+magenta_pool = MagentaProcessPool(settings.MAGENTA_WORKERS)
@@ -3,12 +3,26 @@ Magenta music generation service.
 Ported from original app_streamlit.py run_magenta_generate() function.
 """
 import os
+import time
 import shutil
-import subprocess
+import asyncio
 import tempfile
 import glob
-from typing import Tuple, Optional
+from collections import deque
+from typing import Deque, Dict, List, Tuple, Optional, Callable, Awaitable
+from uuid import uuid4
+
 from ..utils.key_transposer import get_offset
+from ..utils.midi_append import trim_start, transpose_file
+from .circuit_breaker import breakers
+from .magenta_generator import resident_generator
+from .magenta_pool import magenta_pool
+from ..config import settings
+
+ProgressCallback = Callable[[str, int, str], Awaitable[None]]
+
+# Melody RNN output runs at 120 qpm with four steps per quarter note
+STEP_SECONDS = 0.125
 
 
 class MagentaService:
@@ -24,7 +38,8 @@ class MagentaService:
         self,
         steps: int = 128,
         primer: str = "60",
-        target_key: str = "C major"
+        target_key: str = "C major",
+        progress_callback: Optional[ProgressCallback] = None
     ) -> Tuple[Optional[str], Optional[str]]:
         """
         Generate music using Magenta.
@@ -33,17 +48,144 @@ class MagentaService:
             steps: Number of generation steps (64-256)
             primer: Primer melody (comma-separated MIDI pitches or single pitch)
             target_key: Target musical key for transposition
+            progress_callback: Optional async callback for CLI progress
 
         Returns:
             Tuple of (output_file_path, error_message)
         """
-        # Try Python API first (preferred)
-        out_path, error = await self._generate_python_api(steps, primer, target_key)
+        # A surplus output from an earlier CLI run with the same settings is
+        # already paid for; then the Python API (preferred), then the CLI.
+        # CLI output is in C; move it to the key.
+        out_path = magenta_variations.take((steps, primer))
+        if not out_path:
+            out_path, error = await self._guarded(
+                "python", lambda: self._generate_python_api(steps, primer, target_key)
+            )
+            if out_path:
+                return out_path, None
+
+            out_path, error = await self._guarded(
+                "cli", lambda: self._generate_cli(
+                    steps, primer, target_key, fallback_error=error, progress_callback=progress_callback
+                )
+            )
+            if not out_path:
+                return None, error
+
+        try:
+            await asyncio.to_thread(transpose_file, out_path, get_offset(target_key))
+        except Exception as e:
+            return None, f"Could not transpose Magenta output: {e}"
+        return out_path, None
+
+    async def continue_melody(
+        self,
+        primer_events: List[int],
+        steps: int
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Continue an existing melody and return only the new section.
+
+        Args:
+            primer_events: Tail of the melody as melody events, one per
+                           step (MIDI pitch, -2 hold, -1 note-off), already
+                           in the piece's key
+            steps: Number of new steps to generate
+
+        Returns:
+            Tuple of (output_file_path, error_message)
+        """
+        primer = "[" + ", ".join(str(e) for e in primer_events) + "]"
+
+        # Pooled CLI surplus first, then the Python API, then the CLI. The
+        # Python API strips the primer itself; CLI output still starts with it
+        out_path = magenta_variations.take((steps, primer))
+        if not out_path:
+            out_path, error = await self._guarded(
+                "python", lambda: self._continue_python_api(primer_events, steps)
+            )
+            if out_path:
+                return out_path, None
+
+            out_path, error = await self._guarded(
+                "cli", lambda: self._generate_cli(steps, primer, "C major", fallback_error=error)
+            )
+            if not out_path:
+                return None, error
+
+        try:
+            await asyncio.to_thread(trim_start, out_path, len(primer_events) * STEP_SECONDS)
+        except Exception as e:
+            return None, f"Could not strip Magenta primer: {e}"
+        return out_path, None
+
+    async def _continue_python_api(
+        self,
+        primer_events: List[int],
+        steps: int
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Continue a melody with the resident generator (or worker pool)."""
+        try:
+            from magenta.music import sequence_proto_to_midi_file
+        except Exception as e:
+            return None, f"Magenta Python API not available: {e}"
+
+        if not os.path.exists(self.bundle_file):
+            return None, f"Bundle not found at {self.bundle_file}. Run `./magenta_generate.sh` to download it."
+
+        try:
+            if settings.MAGENTA_WORKERS > 0:
+                return await magenta_pool.generate(
+                    self.bundle_file, primer_events, steps, 0, strip_primer=True
+                )
+
+            sequence = await asyncio.to_thread(
+                resident_generator(self.bundle_file).generate, primer_events, steps,
+                settings.MAGENTA_TEMPERATURE, True
+            )
+            tf = tempfile.NamedTemporaryFile(delete=False, suffix=".mid")
+            tf.close()
+            sequence_proto_to_midi_file(sequence, tf.name)
+            return tf.name, None
+
+        except ImportError as e:
+            return None, f"Magenta Python API not available: {e}"
+        except Exception as e:
+            return None, f"Magenta generation error: {e}"
+
+    async def _guarded(
+        self,
+        option: str,
+        run: Callable[[], Awaitable[Tuple[Optional[str], Optional[str]]]]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Run one generation option through its circuit breaker."""
+        breaker = breakers.get(f"magenta:{option}")
+        if not breaker.allow():
+            return None, f"Magenta {option} skipped: circuit open ({breaker.last_error})"
+
+        started = time.monotonic()
+        try:
+            out_path, error = await run()
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
         if out_path:
-            return out_path, None
+            breaker.record_success(time.monotonic() - started)
+        else:
+            breaker.record_failure(time.monotonic() - started, error)
+        return out_path, error
 
-        # Fall back to CLI if Python API fails
-        return await self._generate_cli(steps, primer, target_key, fallback_error=error)
+    async def preload(self):
+        """Load the resident generator (or start the worker pool) ahead of the first request."""
+        if not os.path.exists(self.bundle_file):
+            return
+        if settings.MAGENTA_WORKERS > 0:
+            magenta_pool.start(self.bundle_file)
+            return
+        try:
+            await asyncio.to_thread(resident_generator(self.bundle_file).get)
+        except Exception as e:
+            print(f"Magenta preload failed: {e}")
 
     async def _generate_python_api(
         self,
@@ -51,12 +193,9 @@ class MagentaService:
         primer: str,
         target_key: str
     ) -> Tuple[Optional[str], Optional[str]]:
-        """Generate using Magenta Python API."""
+        """Generate using Magenta Python API (resident generator, inference off the event loop)."""
         try:
-            from magenta.models.shared import sequence_generator_bundle
-            from magenta.models.melody_rnn import melody_rnn_sequence_generator
-            from magenta.protobuf import generator_pb2
-            from magenta.music import sequences_lib, sequence_proto_to_midi_file
+            from magenta.music import sequence_proto_to_midi_file
         except Exception as e:
             return None, f"Magenta Python API not available: {e}"
 
@@ -64,31 +203,22 @@ class MagentaService:
             return None, f"Bundle not found at {self.bundle_file}. Run `./magenta_generate.sh` to download it."
 
         try:
-            # Load bundle and initialize generator
-            bundle = sequence_generator_bundle.read_bundle_file(self.bundle_file)
-            generator_map = melody_rnn_sequence_generator.get_generator_map()
-
-            if "attention_rnn" not in generator_map:
-                return None, "Bundle/generator mismatch: 'attention_rnn' not available"
-
-            generator = generator_map["attention_rnn"](checkpoint=None, bundle=bundle)
-            generator.initialize()
-
             # Create primer melody sequence
             primer_pitches = [int(x) for x in str(primer).split(",") if x.strip().isdigit()]
             if not primer_pitches:
                 primer_pitches = [60]  # Default to Middle C
-            seed = sequences_lib.melody_to_sequence(primer_pitches, start_step=0)
 
-            # Set generation options
-            gen_options = generator_pb2.GeneratorOptions()
-            gen_options.args["temperature"].float_value = 1.0
-            start_time = seed.total_time
-            end_time = start_time + float(steps) * 0.5  # Rough step → seconds mapping
-            gen_options.generate_sections.add(start_time=start_time, end_time=end_time)
+            # Worker processes do inference, transposition and saving themselves
+            if settings.MAGENTA_WORKERS > 0:
+                return await magenta_pool.generate(
+                    self.bundle_file, primer_pitches, steps, get_offset(target_key)
+                )
 
-            # Generate sequence
-            sequence = generator.generate(seed, gen_options)
+            # Generate sequence (the bundle is loaded once and reused)
+            sequence = await asyncio.to_thread(
+                resident_generator(self.bundle_file).generate, primer_pitches, steps,
+                settings.MAGENTA_TEMPERATURE
+            )
 
             # Transpose to target key
             offset = get_offset(target_key)
@@ -102,6 +232,8 @@ class MagentaService:
             sequence_proto_to_midi_file(sequence, tf.name)
             return tf.name, None
 
+        except ImportError as e:
+            return None, f"Magenta Python API not available: {e}"
         except Exception as e:
             return None, f"Magenta generation error: {e}"
 
@@ -110,9 +242,16 @@ class MagentaService:
         steps: int,
         primer: str,
         target_key: str,
-        fallback_error: Optional[str] = None
+        fallback_error: Optional[str] = None,
+        progress_callback: Optional[ProgressCallback] = None
     ) -> Tuple[Optional[str], Optional[str]]:
-        """Generate using Magenta CLI (fallback)."""
+        """
+        Generate using Magenta CLI (fallback).
+
+        Each run writes into its own directory, so concurrent jobs never
+        pick up each other's files. The CLI produces MAGENTA_CLI_NUM_OUTPUTS
+        pieces; the first is returned and the rest go to the variation pool.
+        """
         cli_missing = not shutil.which("melody_rnn_generate")
 
         if not os.path.exists(self.bundle_file):
@@ -121,28 +260,144 @@ class MagentaService:
         if cli_missing:
             return None, fallback_error or "Magenta CLI not found and Python API failed. See MAGENTA_SETUP.md."
 
+        num_outputs = max(1, settings.MAGENTA_CLI_NUM_OUTPUTS)
+        job_dir = tempfile.mkdtemp(prefix="job_", dir=self.output_dir)
         cmd = [
             "melody_rnn_generate",
             "--config=attention_rnn",
             f"--bundle_file={self.bundle_file}",
-            f"--output_dir={self.output_dir}",
-            "--num_outputs=1",
+            f"--output_dir={job_dir}",
+            f"--num_outputs={num_outputs}",
             f"--num_steps={steps}",
             f"--primer_melody={primer}",
+            f"--temperature={settings.MAGENTA_TEMPERATURE}",
         ]
 
         try:
-            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
+            except Exception as e:
+                return None, f"Magenta CLI execution failed: {e}"
+
+            stderr_tail: Deque[str] = deque(maxlen=20)
+            watcher = asyncio.create_task(
+                self._watch_outputs(proc, job_dir, num_outputs, stderr_tail, progress_callback)
+            )
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(self._read_stderr(proc, stderr_tail), proc.wait()),
+                    timeout=settings.MAGENTA_TIMEOUT
+                )
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                # Timed out or job cancelled: don't leave the CLI running
+                try:
+                    proc.kill()
+                except ProcessLookupError:
+                    pass  # exited on its own meanwhile
+                await proc.wait()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                return None, "Magenta CLI timed out"
+            finally:
+                watcher.cancel()
+
             if proc.returncode != 0:
-                return None, f"Magenta CLI failed: {proc.stderr[:1000]}"
-        except Exception as e:
-            return None, f"Magenta CLI execution failed: {e}"
+                return None, f"Magenta CLI failed: {chr(10).join(stderr_tail)[:1000]}"
+
+            mids = sorted(self._outputs(job_dir))
+            if not mids:
+                return None, "No MIDI files produced by Magenta."
+
+            # Move results out of the job directory before it is removed
+            first = self._claim_output(mids[0])
+            for surplus in mids[1:]:
+                magenta_variations.add((steps, primer), self._claim_output(surplus))
+            return first, None
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def _outputs(self, job_dir: str) -> List[str]:
+        return glob.glob(os.path.join(job_dir, "*.mid")) + glob.glob(os.path.join(job_dir, "*.midi"))
+
+    def _claim_output(self, path: str) -> str:
+        dest = os.path.join(self.output_dir, f"{uuid4().hex}.mid")
+        shutil.move(path, dest)
+        return dest
+
+    @staticmethod
+    async def _read_stderr(proc, tail: Deque[str]):
+        """Drain stderr line by line, keeping the tail for error messages."""
+        async for line in proc.stderr:
+            text = line.decode(errors="replace").rstrip()
+            if text:
+                tail.append(text)
+
+    async def _watch_outputs(
+        self,
+        proc,
+        job_dir: str,
+        num_outputs: int,
+        tail: Deque[str],
+        progress_callback: Optional[ProgressCallback]
+    ):
+        """Report progress as the CLI writes each output file."""
+        if progress_callback is None:
+            return
+        reported = -1
+        while proc.returncode is None:
+            done = len(self._outputs(job_dir))
+            if done != reported:
+                reported = done
+                latest = tail[-1][:120] if tail else "running"
+                await progress_callback(
+                    "generating", 30 + int(60 * done / num_outputs),
+                    f"Magenta CLI: {done}/{num_outputs} outputs ({latest})"
+                )
+            await asyncio.sleep(1.0)
+
+
+class VariationPool:
+    """
+    Surplus Magenta CLI outputs, kept for later requests with the same
+    steps and primer (the CLI output does not depend on anything else;
+    every path samples at MAGENTA_TEMPERATURE).
+    Pieces are stored as the CLI wrote them, in C; callers transpose on take.
+    """
+
+    def __init__(self, max_per_key: int):
+        self.max_per_key = max_per_key
+        self._pieces: Dict[Tuple[int, str], Deque[str]] = {}
+        self.stats = {"added": 0, "served": 0, "dropped": 0}
+
+    def add(self, key: Tuple[int, str], path: str):
+        pieces = self._pieces.setdefault(key, deque())
+        if len(pieces) >= self.max_per_key:
+            os.remove(path)
+            self.stats["dropped"] += 1
+            return
+        pieces.append(path)
+        self.stats["added"] += 1
+
+    def take(self, key: Tuple[int, str]) -> Optional[str]:
+        pieces = self._pieces.get(key)
+        while pieces:
+            path = pieces.popleft()
+            if os.path.exists(path):
+                self.stats["served"] += 1
+                return path
+        return None
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "ready": sum(len(p) for p in self._pieces.values()),
+            "max_per_key": self.max_per_key,
+        }
 
-        # Find newest MIDI file in output directory
-        mids = glob.glob(os.path.join(self.output_dir, "*.mid")) + \
-               glob.glob(os.path.join(self.output_dir, "*.midi"))
-        if not mids:
-            return None, "No MIDI files produced by Magenta."
 
-        newest = max(mids, key=os.path.getmtime)
-        return newest, None
+# Shared across MagentaService instances in this process
+magenta_variations = VariationPool(settings.MAGENTA_VARIATION_POOL_SIZE)
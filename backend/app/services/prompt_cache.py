@@ -0,0 +1,192 @@
+"""
+Persistent HuggingFace result cache.
+Stores generated pieces on disk keyed by model, normalized prompt and
+parameters, so repeated prompts can be served without calling a Space.
+"""
+import os
+import re
+import glob
+import json
+import time
+import random
+import shutil
+import hashlib
+import tempfile
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from ..config import settings
+
+POLICIES = ("off", "exact", "deadline")
+
+
+class PromptCache:
+    """
+    Up to HF_CACHE_VARIANTS pieces per (model, prompt, parameters) key.
+
+    Reuse policy (HF_CACHE_POLICY):
+    - "off": never read or write the cache.
+    - "exact": serve a cached variant whenever the key matches.
+    - "deadline": serve a cached variant only when a new generation is
+      expected to take longer than HF_CACHE_DEADLINE seconds, or when
+      there is no latency estimate yet (a cold start, when generating is
+      slowest); otherwise generate and add the result as another variant.
+
+    Entries live as files named "<key>_<created>_<id>.mid". Age is counted
+    from the creation time in the name, so a popular entry still expires
+    after HF_CACHE_MAX_AGE; serving an entry touches its mtime, which only
+    orders the least-recently-used eviction down to HF_CACHE_MAX_BYTES.
+
+    Entry, key and byte totals for get_stats() come from the directory scan
+    each store() already does for eviction, so stats never touch the disk
+    after the first call.
+    """
+
+    def __init__(self, path: str = None, policy: str = None):
+        self.path = path or settings.HF_CACHE_PATH
+        self.policy = policy or settings.HF_CACHE_POLICY
+        if self.policy not in POLICIES:
+            raise ValueError(f"HF_CACHE_POLICY must be one of {POLICIES}, got {self.policy!r}")
+        os.makedirs(self.path, exist_ok=True)
+        self._rng = random.Random()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "stored": 0, "evicted": 0}
+        # entries/keys/bytes as of the last scan; None until the first one
+        self._totals: Optional[Dict[str, int]] = None
+
+    @staticmethod
+    def normalize(prompt: str) -> str:
+        """Lowercase, collapse whitespace and drop trailing punctuation."""
+        return re.sub(r"\s+", " ", prompt.lower()).strip().rstrip(".!?,; ")
+
+    def key_for(self, model: str, prompt: str, parameters: Dict) -> str:
+        raw = json.dumps([model, self.normalize(prompt), parameters], sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    @staticmethod
+    def created_at(path: str) -> float:
+        """Creation time of an entry (from its name; mtime for entries named without one)."""
+        parts = os.path.basename(path)[:-len(".mid")].split("_")
+        if len(parts) == 3 and parts[1].isdigit():
+            return float(parts[1])
+        return os.path.getmtime(path)
+
+    def _variants(self, key: str) -> List[str]:
+        now = time.time()
+        variants = []
+        for path in glob.glob(os.path.join(self.path, f"{key}_*.mid")):
+            try:
+                if now - self.created_at(path) <= settings.HF_CACHE_MAX_AGE:
+                    variants.append(path)
+            except OSError:
+                pass
+        return variants
+
+    def lookup(self, keys: List[str], expected_latency: Optional[float] = None) -> Optional[str]:
+        """
+        Serve a cached variant for the first key that has one, per the policy.
+
+        Blocking (disk I/O); run it in a worker thread.
+
+        Args:
+            keys: Cache keys to try, in order
+            expected_latency: Expected seconds for a new generation, or None
+                              if unknown (the "deadline" policy then serves)
+
+        Returns:
+            A staged copy of the cached piece (the caller owns it), or None
+        """
+        if self.policy == "off":
+            return None
+
+        for key in keys:
+            variants = self._variants(key)
+            if not variants:
+                continue
+            if (
+                self.policy == "deadline"
+                and expected_latency is not None
+                and expected_latency <= settings.HF_CACHE_DEADLINE
+            ):
+                self.stats["bypassed"] += 1
+                return None
+
+            path = self._rng.choice(variants)
+            try:
+                os.utime(path)
+                # Copy: the gallery file may later be edited in place
+                tf = tempfile.NamedTemporaryFile(delete=False, suffix=".part", dir=settings.GENERATED_MIDI_PATH)
+                tf.close()
+                shutil.copyfile(path, tf.name)
+            except OSError:
+                continue
+            self.stats["hits"] += 1
+            return tf.name
+
+        self.stats["misses"] += 1
+        return None
+
+    def store(self, key: str, midi_path: str):
+        """Add a generated piece as a variant of a key. Blocking; run it in a worker thread."""
+        if self.policy == "off":
+            return
+
+        variants = sorted(self._variants(key), key=self.created_at)
+        while len(variants) >= settings.HF_CACHE_VARIANTS:
+            os.remove(variants.pop(0))
+            self.stats["evicted"] += 1
+
+        name = f"{key}_{int(time.time())}_{uuid4().hex[:8]}.mid"
+        shutil.copyfile(midi_path, os.path.join(self.path, name))
+        self.stats["stored"] += 1
+        self._evict()
+
+    def _entries(self) -> List[Tuple[str, os.stat_result]]:
+        entries = []
+        for path in glob.glob(os.path.join(self.path, "*.mid")):
+            try:
+                entries.append((path, os.stat(path)))
+            except OSError:
+                pass
+        return entries
+
+    def _evict(self):
+        now = time.time()
+        entries = []
+        for path, stat in self._entries():
+            if now - self.created_at(path) > settings.HF_CACHE_MAX_AGE:
+                os.remove(path)
+                self.stats["evicted"] += 1
+            else:
+                entries.append((path, stat))
+
+        entries.sort(key=lambda e: e[1].st_mtime)
+        total = sum(stat.st_size for _, stat in entries)
+        while entries and total > settings.HF_CACHE_MAX_BYTES:
+            path, stat = entries.pop(0)
+            os.remove(path)
+            total -= stat.st_size
+            self.stats["evicted"] += 1
+        self._totals = self._count(entries)
+
+    @staticmethod
+    def _count(entries: List[Tuple[str, os.stat_result]]) -> Dict[str, int]:
+        return {
+            "entries": len(entries),
+            "keys": len({os.path.basename(path).split("_")[0] for path, _ in entries}),
+            "bytes": sum(stat.st_size for _, stat in entries),
+        }
+
+    def get_stats(self) -> dict:
+        if self._totals is None:
+            self._totals = self._count(self._entries())
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["bypassed"]
+        return {
+            **self.stats,
+            "policy": self.policy,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+            **self._totals,
+        }
+
+
+# Shared instance used by HuggingFaceService
+prompt_cache = PromptCache()
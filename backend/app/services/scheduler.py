@@ -0,0 +1,223 @@
+"""
+Generation job scheduler.
+Admission control and per-backend worker pools in front of GenerationService.
+"""
+import math
+import time
+import asyncio
+import itertools
+from typing import Dict, Tuple, Optional, Callable, Awaitable
+
+from ..models import BackendType, JobPriority
+from ..config import settings
+
+PRIORITY_RANK = {
+    JobPriority.HIGH: 0,
+    JobPriority.NORMAL: 1,
+    JobPriority.LOW: 2,
+}
+
+
+def magenta_slots() -> int:
+    """
+    Concurrent Magenta jobs. In-process inference runs one at a time; with
+    worker processes, one slot per request they can group, or they idle.
+    """
+    if settings.SCHEDULER_MAGENTA_WORKERS is not None:
+        return settings.SCHEDULER_MAGENTA_WORKERS
+    return max(1, settings.MAGENTA_WORKERS * settings.MAGENTA_BATCH_MAX)
+
+
+class BackendPool:
+    """A bounded priority queue drained by a fixed number of workers."""
+
+    def __init__(self, name: str, workers: int, max_depth: int):
+        self.name = name
+        self.workers = workers
+        self.max_depth = max_depth
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        # job_id -> (rank, seq) for jobs still waiting
+        self.pending: Dict[str, Tuple[int, int]] = {}
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        # Exponential moving average of job run time, seeded with a guess
+        self.avg_duration = 5.0
+        self._tasks = []
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Number of waiting jobs that will start before this one."""
+        key = self.pending.get(job_id)
+        if key is None:
+            return None
+        return sum(1 for other in self.pending.values() if other < key)
+
+    def estimate_wait(self, ahead: int) -> float:
+        """Rough seconds until a job with `ahead` jobs in front of it starts."""
+        if self.running < self.workers and ahead == 0:
+            return 0.0
+        return math.ceil((ahead + 1) / self.workers) * self.avg_duration
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": len(self.pending),
+            "max_queue_depth": self.max_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "avg_duration_seconds": round(self.avg_duration, 2),
+        }
+
+
+class JobScheduler:
+    """
+    Runs generation jobs through per-backend pools.
+
+    Each backend gets its own worker count, so a burst of Magenta jobs
+    (which load TensorFlow models) cannot starve cheap Simple jobs.
+    Within a pool, higher-priority jobs start first; equal priorities
+    run in submission order. Submissions beyond the queue-depth limit
+    are rejected with a Retry-After hint.
+    """
+
+    def __init__(self):
+        self.pools: Dict[str, BackendPool] = {
+            BackendType.MAGENTA.value: BackendPool(
+                "magenta", magenta_slots(), settings.SCHEDULER_MAX_QUEUE_DEPTH),
+            BackendType.HUGGINGFACE.value: BackendPool(
+                "huggingface", settings.SCHEDULER_HUGGINGFACE_WORKERS, settings.SCHEDULER_MAX_QUEUE_DEPTH),
+            BackendType.SIMPLE.value: BackendPool(
+                "simple", settings.SCHEDULER_SIMPLE_WORKERS, settings.SCHEDULER_MAX_QUEUE_DEPTH),
+        }
+        self._jobs: Dict[str, Tuple[BackendPool, Callable[[], Awaitable[None]]]] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._seq = itertools.count()
+        self._started = False
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    def start(self):
+        """Start worker tasks for every pool."""
+        if self._started:
+            return
+        self._started = True
+        for pool in self.pools.values():
+            for _ in range(pool.workers):
+                pool._tasks.append(asyncio.create_task(self._worker(pool)))
+
+    def submit(
+        self,
+        job_id: str,
+        backend: BackendType,
+        run: Callable[[], Awaitable[None]],
+        priority: JobPriority = JobPriority.NORMAL
+    ) -> Tuple[bool, Optional[int]]:
+        """
+        Queue a job.
+
+        Args:
+            job_id: Job identifier
+            backend: Backend pool to run in
+            run: Coroutine factory that performs the job
+            priority: Priority class
+
+        Returns:
+            Tuple of (accepted, retry_after_seconds)
+        """
+        self.start()
+        pool = self.pools[backend.value]
+
+        if len(pool.pending) >= pool.max_depth:
+            pool.rejected += 1
+            return False, max(1, math.ceil(pool.estimate_wait(len(pool.pending))))
+
+        key = (PRIORITY_RANK[priority], next(self._seq))
+        pool.pending[job_id] = key
+        self._jobs[job_id] = (pool, run)
+        pool.queue.put_nowait((key, job_id))
+        return True, None
+
+    def queue_info(self, job_id: str) -> Tuple[Optional[int], Optional[float]]:
+        """Return (queue_position, estimated_wait_seconds) for a waiting job."""
+        entry = self._jobs.get(job_id)
+        if entry is None:
+            return None, None
+        pool = entry[0]
+        ahead = pool.position(job_id)
+        if ahead is None:
+            return None, None
+        return ahead + 1, round(pool.estimate_wait(ahead), 1)
+
+    def __contains__(self, job_id: str) -> bool:
+        """Whether a job is queued or running here."""
+        return job_id in self._jobs
+
+    async def cancel(self, job_id: str, timeout: float = 5.0) -> bool:
+        """
+        Cancel a queued or running job.
+
+        Queued jobs are withdrawn immediately. Running jobs get their task
+        cancelled, which propagates into the backend (subprocess kill,
+        Gradio job cancel, procedural loop stop); this waits up to
+        `timeout` seconds for that cleanup so the worker slot is free
+        when it returns.
+
+        Returns:
+            True if the job was queued or running
+        """
+        entry = self._jobs.get(job_id)
+        if entry is None:
+            return False
+        pool = entry[0]
+
+        if pool.pending.pop(job_id, None) is not None:
+            self._jobs.pop(job_id, None)
+            pool.cancelled += 1
+            return True
+
+        task = self._running.get(job_id)
+        if task is None:
+            return False
+        task.cancel()
+        await asyncio.wait([task], timeout=timeout)
+        return True
+
+    async def _worker(self, pool: BackendPool):
+        while True:
+            _, job_id = await pool.queue.get()
+            if pool.pending.pop(job_id, None) is None:
+                continue  # withdrawn while waiting
+            _, run = self._jobs[job_id]
+
+            pool.running += 1
+            started = time.monotonic()
+            task = asyncio.create_task(run())
+            self._running[job_id] = task
+            try:
+                # wait() rather than await, so a cancelled job does not cancel the worker
+                await asyncio.wait([task])
+                if task.cancelled():
+                    pool.cancelled += 1
+                elif task.exception():
+                    print(f"Scheduled job {job_id} crashed: {task.exception()}")
+            finally:
+                elapsed = time.monotonic() - started
+                pool.running -= 1
+                if not task.cancelled():
+                    pool.avg_duration = 0.8 * pool.avg_duration + 0.2 * elapsed
+                    pool.completed += 1
+                self._running.pop(job_id, None)
+                self._jobs.pop(job_id, None)
+
+    def get_stats(self) -> dict:
+        """Return per-backend queue and worker counters."""
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+
+# Shared instance used by the generation endpoints
+scheduler = JobScheduler()
@@ -0,0 +1,97 @@
+"""
+Score service.
+Quantizes MIDI files into sheet-music scores and caches them per file version.
+"""
+import os
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Any, Iterator, Tuple, Optional
+
+from ..config import settings
+from ..utils.midi_notes import read_midi_notes
+from ..utils.score import quantize_score, iter_musicxml, grid_divisions
+
+MUSICXML_EXTENSION = ".musicxml"
+
+
+class ScoreService:
+    """
+    Builds JSON score models and MusicXML for MIDI files.
+
+    A file's version is its modification time, so edits through the piano
+    roll invalidate cached scores automatically. Score models are kept in a
+    small in-memory LRU; MusicXML is cached on disk next to the MIDI file.
+    """
+
+    def __init__(self, max_cached: int = None, grid: float = None):
+        self.max_cached = max_cached or settings.SCORE_CACHE_SIZE
+        self.grid = grid or settings.SCORE_GRID
+        grid_divisions(self.grid)  # reject an unsupported SCORE_GRID at startup
+        self._models: "OrderedDict[Tuple[str, int], Dict[str, Any]]" = OrderedDict()
+
+    @staticmethod
+    def version_of(midi_path: str) -> int:
+        """Return the cache version of a MIDI file."""
+        return os.stat(midi_path).st_mtime_ns
+
+    @staticmethod
+    def musicxml_path_for(midi_path: str) -> str:
+        return os.path.splitext(midi_path)[0] + MUSICXML_EXTENSION
+
+    async def get_score(self, midi_path: str) -> Dict[str, Any]:
+        """Return the quantized score model for a file, using the cache when current."""
+        key = (midi_path, self.version_of(midi_path))
+        if key in self._models:
+            self._models.move_to_end(key)
+            return self._models[key]
+
+        # Parse and quantize off the event loop
+        score = await asyncio.to_thread(self._build, midi_path)
+        self._models[key] = score
+        while len(self._models) > self.max_cached:
+            self._models.popitem(last=False)
+        return score
+
+    def _build(self, midi_path: str) -> Dict[str, Any]:
+        return quantize_score(read_midi_notes(midi_path), grid=self.grid)
+
+    def cached_musicxml(self, midi_path: str) -> Optional[str]:
+        """Return the cached MusicXML path if it is current, else None."""
+        xml_path = self.musicxml_path_for(midi_path)
+        if os.path.exists(xml_path) and os.stat(xml_path).st_mtime_ns >= self.version_of(midi_path):
+            return xml_path
+        return None
+
+    def stream_musicxml(self, midi_path: str, score: Dict[str, Any], title: str) -> Iterator[bytes]:
+        """
+        Render MusicXML measure by measure, writing it to the disk cache as it goes.
+
+        The score comes from get_score. The cache file only replaces the
+        previous one once the whole document has been written.
+        """
+        xml_path = self.musicxml_path_for(midi_path)
+        tmp_path = f"{xml_path}.{os.getpid()}.{id(score)}.tmp"
+
+        with open(tmp_path, "wb") as cache_file:
+            try:
+                for chunk in iter_musicxml(score, title=title):
+                    data = chunk.encode("utf-8")
+                    cache_file.write(data)
+                    yield data
+            except BaseException:
+                cache_file.close()
+                os.remove(tmp_path)
+                raise
+        os.replace(tmp_path, xml_path)
+
+    def invalidate(self, midi_path: str):
+        """Drop all cached scores for a file."""
+        for key in [k for k in self._models if k[0] == midi_path]:
+            del self._models[key]
+        xml_path = self.musicxml_path_for(midi_path)
+        if os.path.exists(xml_path):
+            os.remove(xml_path)
+
+
+# Shared instance used by the file endpoints
+score_service = ScoreService()
@@ -0,0 +1,422 @@
+"""
+Shared state for multi-process deployments.
+Job snapshots, the generation job queue and the job event log, behind one
+small interface so API processes and standalone workers can coordinate.
+(Socket.IO sessions are reached through SOCKETIO_MESSAGE_QUEUE instead.)
+"""
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+import itertools
+from abc import ABC, abstractmethod
+from contextlib import closing
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+
+
+class SharedState(ABC):
+    """
+    Interface for state shared between API processes and generation workers.
+
+    Every method is synchronous; callers on the event loop should run them
+    in a worker thread. Implementations:
+
+    - LocalSharedState: in-process stand-in for tests and single-process runs
+    - SqliteSharedState: a SQLite file shared by all processes on one host
+    - RedisSharedState: a Redis server shared by processes on any host
+    """
+
+    # Job snapshots (job_id -> GenerationJob JSON)
+    @abstractmethod
+    def save_job(self, job_id: str, data: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_job(self, job_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    # Job queue
+    @abstractmethod
+    def enqueue(self, job_id: str, backend: str, priority: int, payload: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim(self, backends: List[str], worker_id: str) -> Optional[Tuple[str, str]]:
+        """Atomically take (and dequeue) the next job for one of `backends`; returns (job_id, payload)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove_queued(self, job_id: str) -> bool:
+        """Withdraw a job that has not been claimed yet."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def queue_depth(self, backend: str) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def queued_jobs(self) -> Dict[str, List[str]]:
+        """Waiting job ids per backend, in the order workers will claim them."""
+        raise NotImplementedError
+
+    # Event log (broadcast to every consumer)
+    @abstractmethod
+    def publish(self, kind: str, job_id: str, data: str = "", sid: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_events(self, after_id: int, limit: int = 200) -> List[dict]:
+        """Events with id > after_id, oldest first."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def last_event_id(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def prune_events(self, max_age_seconds: float):
+        raise NotImplementedError
+
+
+class LocalSharedState(SharedState):
+    """In-memory implementation; only shared within one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, str] = {}
+        self._queue: Dict[str, Tuple[int, int, str, str]] = {}  # job_id -> (priority, seq, backend, payload)
+        self._events: List[dict] = []
+        self._seq = itertools.count(1)
+
+    def save_job(self, job_id, data):
+        self._jobs[job_id] = data
+
+    def load_job(self, job_id):
+        return self._jobs.get(job_id)
+
+    def enqueue(self, job_id, backend, priority, payload):
+        with self._lock:
+            self._queue[job_id] = (priority, next(self._seq), backend, payload)
+
+    def claim(self, backends, worker_id):
+        with self._lock:
+            candidates = [
+                (entry[0], entry[1], job_id)
+                for job_id, entry in self._queue.items() if entry[2] in backends
+            ]
+            if not candidates:
+                return None
+            _, _, job_id = min(candidates)
+            return job_id, self._queue.pop(job_id)[3]
+
+    def remove_queued(self, job_id):
+        with self._lock:
+            return self._queue.pop(job_id, None) is not None
+
+    def queue_depth(self, backend):
+        return sum(1 for entry in self._queue.values() if entry[2] == backend)
+
+    def queued_jobs(self):
+        with self._lock:
+            ordered = sorted(self._queue.items(), key=lambda item: item[1][:2])
+        jobs: Dict[str, List[str]] = {}
+        for job_id, entry in ordered:
+            jobs.setdefault(entry[2], []).append(job_id)
+        return jobs
+
+    def publish(self, kind, job_id, data="", sid=None):
+        with self._lock:
+            event_id = next(self._seq)
+            self._events.append({
+                "id": event_id, "kind": kind, "job_id": job_id,
+                "sid": sid, "data": data, "created": time.time()
+            })
+            return event_id
+
+    def read_events(self, after_id, limit=200):
+        return [e for e in self._events if e["id"] > after_id][:limit]
+
+    def last_event_id(self):
+        return self._events[-1]["id"] if self._events else 0
+
+    def prune_events(self, max_age_seconds):
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            self._events = [e for e in self._events if e["created"] >= cutoff]
+
+
+class SqliteSharedState(SharedState):
+    """SQLite implementation shared by every process on the host (WAL mode)."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS shared_jobs (job_id TEXT PRIMARY KEY, data TEXT);"
+                "CREATE TABLE IF NOT EXISTS job_queue ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT UNIQUE, backend TEXT,"
+                " priority INTEGER, payload TEXT);"
+                "CREATE INDEX IF NOT EXISTS job_queue_next ON job_queue (backend, priority, seq);"
+                "CREATE TABLE IF NOT EXISTS job_events ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, job_id TEXT, sid TEXT,"
+                " data TEXT, created REAL);"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with closing(self._connect()) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def save_job(self, job_id, data):
+        self._execute("INSERT OR REPLACE INTO shared_jobs (job_id, data) VALUES (?, ?)", (job_id, data))
+
+    def load_job(self, job_id):
+        rows = self._execute("SELECT data FROM shared_jobs WHERE job_id = ?", (job_id,))
+        return rows[0][0] if rows else None
+
+    def enqueue(self, job_id, backend, priority, payload):
+        self._execute(
+            "INSERT OR REPLACE INTO job_queue (job_id, backend, priority, payload) VALUES (?, ?, ?, ?)",
+            (job_id, backend, priority, payload)
+        )
+
+    def claim(self, backends, worker_id):
+        placeholders = ",".join("?" for _ in backends)
+        with closing(self._connect()) as conn:
+            # IMMEDIATE takes the write lock up front, so two workers can't claim the same row
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT seq, job_id, payload FROM job_queue "
+                    f"WHERE backend IN ({placeholders}) ORDER BY priority, seq LIMIT 1",
+                    tuple(backends)
+                ).fetchone()
+                if row:
+                    conn.execute("DELETE FROM job_queue WHERE seq = ?", (row[0],))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return (row[1], row[2]) if row else None
+
+    def remove_queued(self, job_id):
+        with closing(self._connect()) as conn:
+            cur = conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+            return cur.rowcount > 0
+
+    def queue_depth(self, backend):
+        return self._execute(
+            "SELECT COUNT(*) FROM job_queue WHERE backend = ?", (backend,)
+        )[0][0]
+
+    def queued_jobs(self):
+        jobs: Dict[str, List[str]] = {}
+        for job_id, backend in self._execute("SELECT job_id, backend FROM job_queue ORDER BY priority, seq"):
+            jobs.setdefault(backend, []).append(job_id)
+        return jobs
+
+    def publish(self, kind, job_id, data="", sid=None):
+        with closing(self._connect()) as conn:
+            cur = conn.execute(
+                "INSERT INTO job_events (kind, job_id, sid, data, created) VALUES (?, ?, ?, ?, ?)",
+                (kind, job_id, sid, data, time.time())
+            )
+            return cur.lastrowid
+
+    def read_events(self, after_id, limit=200):
+        rows = self._execute(
+            "SELECT id, kind, job_id, sid, data, created FROM job_events WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id, limit)
+        )
+        return [
+            {"id": r[0], "kind": r[1], "job_id": r[2], "sid": r[3], "data": r[4], "created": r[5]}
+            for r in rows
+        ]
+
+    def last_event_id(self):
+        return self._execute("SELECT COALESCE(MAX(id), 0) FROM job_events")[0][0]
+
+    def prune_events(self, max_age_seconds):
+        self._execute("DELETE FROM job_events WHERE created < ?", (time.time() - max_age_seconds,))
+
+
+# Pop the best-ranked job across the backends' queues (KEYS[1] holds payloads)
+_CLAIM_SCRIPT = """
+local best, best_score, best_key
+for i = 2, #KEYS do
+    local top = redis.call('ZRANGE', KEYS[i], 0, 0, 'WITHSCORES')
+    if top[1] and (best_score == nil or tonumber(top[2]) < best_score) then
+        best, best_score, best_key = top[1], tonumber(top[2]), KEYS[i]
+    end
+end
+if not best then
+    return nil
+end
+redis.call('ZREM', best_key, best)
+local payload = redis.call('HGET', KEYS[1], best)
+redis.call('HDEL', KEYS[1], best)
+return {best, payload}
+"""
+
+# Number and append an event in one step, so readers never see a gap fill in later
+_PUBLISH_SCRIPT = """
+local id = redis.call('INCR', KEYS[1])
+local event = cjson.decode(ARGV[1])
+event['id'] = id
+redis.call('ZADD', KEYS[2], id, cjson.encode(event))
+return id
+"""
+
+
+class RedisSharedState(SharedState):
+    """
+    Redis implementation shared by processes on any host.
+
+    Job snapshots live in a hash, each backend's queue in a sorted set
+    scored by (priority, sequence), and the event log in a sorted set
+    scored by event id. Needs the redis package.
+    """
+
+    def __init__(self, url: str, prefix: str = "piano:"):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._claim = self.redis.register_script(_CLAIM_SCRIPT)
+        self._publish = self.redis.register_script(_PUBLISH_SCRIPT)
+
+    def _key(self, name: str) -> str:
+        return self.prefix + name
+
+    def save_job(self, job_id, data):
+        self.redis.hset(self._key("jobs"), job_id, data)
+
+    def load_job(self, job_id):
+        return self.redis.hget(self._key("jobs"), job_id)
+
+    def enqueue(self, job_id, backend, priority, payload):
+        seq = self.redis.incr(self._key("queue:seq"))
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key("queue:payloads"), job_id, payload)
+        pipe.hset(self._key("queue:backends"), job_id, backend)
+        # Scores stay exact doubles far beyond any realistic sequence number
+        pipe.zadd(self._key(f"queue:{backend}"), {job_id: priority * 1e12 + seq})
+        pipe.execute()
+
+    def claim(self, backends, worker_id):
+        keys = [self._key("queue:payloads")] + [self._key(f"queue:{b}") for b in backends]
+        claimed = self._claim(keys=keys)
+        if not claimed:
+            return None
+        self.redis.hdel(self._key("queue:backends"), claimed[0])
+        return claimed[0], claimed[1]
+
+    def remove_queued(self, job_id):
+        backend = self.redis.hget(self._key("queue:backends"), job_id)
+        if backend is None:
+            return False
+        removed = self.redis.zrem(self._key(f"queue:{backend}"), job_id)
+        self.redis.hdel(self._key("queue:payloads"), job_id)
+        self.redis.hdel(self._key("queue:backends"), job_id)
+        return removed > 0
+
+    def queue_depth(self, backend):
+        return self.redis.zcard(self._key(f"queue:{backend}"))
+
+    def queued_jobs(self):
+        backends = set(self.redis.hvals(self._key("queue:backends")))
+        return {backend: self.redis.zrange(self._key(f"queue:{backend}"), 0, -1) for backend in backends}
+
+    def publish(self, kind, job_id, data="", sid=None):
+        event = {"kind": kind, "job_id": job_id, "sid": sid, "data": data, "created": time.time()}
+        return self._publish(keys=[self._key("events:seq"), self._key("events")], args=[json.dumps(event)])
+
+    def read_events(self, after_id, limit=200):
+        rows = self.redis.zrangebyscore(self._key("events"), f"({after_id}", "+inf", start=0, num=limit)
+        return [json.loads(row) for row in rows]
+
+    def last_event_id(self):
+        return int(self.redis.get(self._key("events:seq")) or 0)
+
+    def prune_events(self, max_age_seconds):
+        cutoff = time.time() - max_age_seconds
+        while True:
+            events = [json.loads(row) for row in self.redis.zrange(self._key("events"), 0, 99)]
+            old = [e["id"] for e in events if e["created"] < cutoff]
+            if not old:
+                return
+            self.redis.zremrangebyscore(self._key("events"), "-inf", max(old))
+            if len(old) < len(events):
+                return
+
+
+class StateWriter:
+    """
+    Runs shared-state writes on one background thread, in submission order.
+
+    Keeps blocking SQLite/Redis calls off the event loop while preserving
+    the order of a process's job snapshots and queue operations.
+    """
+
+    def __init__(self, name: str = "shared-state"):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    def submit(self, fn, *args):
+        """Fire and forget; failures are logged."""
+        self._executor.submit(fn, *args).add_done_callback(self._report)
+
+    async def run(self, fn, *args):
+        """Run after every write submitted so far, and return its result."""
+        return await asyncio.wrap_future(self._executor.submit(fn, *args))
+
+    def close(self):
+        """Wait for outstanding writes."""
+        self._executor.shutdown(wait=True)
+
+    @staticmethod
+    def _report(future: Future):
+        if future.exception():
+            print(f"Shared state write failed: {future.exception()}")
+
+
+def create_shared_state(url: str) -> SharedState:
+    """
+    Build a shared-state backend from a URL.
+
+    Args:
+        url: "local://", "sqlite:///path/to/file.db" or a redis:// URL
+    """
+    if url.startswith("sqlite:///"):
+        return SqliteSharedState(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedState(url)
+    if url.startswith("local://"):
+        return LocalSharedState()
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
+
+
+def require_cross_process(state: SharedState):
+    """
+    Refuse to run worker mode on state other processes can't see.
+
+    With "local://" the API and each worker get a private queue, so jobs
+    would be accepted and never run.
+    """
+    if isinstance(state, LocalSharedState):
+        raise RuntimeError(
+            'GENERATION_MODE "worker" needs a SHARED_STATE_URL shared between processes '
+            '(e.g. "sqlite:///app/storage/shared.db"), not "local://"'
+        )
+
+
+# Process-wide instance
+shared_state = create_shared_state(settings.SHARED_STATE_URL)
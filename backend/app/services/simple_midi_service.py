@@ -4,8 +4,11 @@ Generates musically coherent piano pieces with melody, harmony, and dynamics.
 """
 import os
 import random
+import asyncio
 import datetime
+import threading
 from typing import Tuple, Optional, List
+from uuid import uuid4
 
 try:
     import mido
@@ -141,12 +144,50 @@ class SimpleMidiService:
         duration_sec: int = 30,
         mood: str = "Happy",
         key: str = "C major",
-        style: str = "Classical"
+        style: str = "Classical",
+        seed: Optional[int] = None,
+        start_pitch: Optional[int] = None,
+        beat_offset: float = 0.0
     ) -> Tuple[Optional[str], Optional[str]]:
-        """Generate a musically coherent MIDI piece."""
+        """
+        Generate a musically coherent MIDI piece.
+
+        The same seed and parameters always produce the same notes. The
+        piece is built in a worker thread; cancelling the caller stops the
+        note loops at the next step.
+
+        To continue an existing piece, pass its last melody pitch and its
+        length in beats: the melody resumes from that pitch and phrases,
+        dynamics and the chord cycle pick up where the piece left off.
+        """
         if not MIDO_AVAILABLE:
             return None, "mido library not available"
 
+        cancel = threading.Event()
+        try:
+            return await asyncio.to_thread(
+                self._build, tempo, duration_sec, mood, key, style, seed, cancel,
+                start_pitch, beat_offset
+            )
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+    def _build(
+        self,
+        tempo: int,
+        duration_sec: int,
+        mood: str,
+        key: str,
+        style: str,
+        seed: Optional[int],
+        cancel: threading.Event,
+        start_pitch: Optional[int] = None,
+        beat_offset: float = 0.0
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Build and save the MIDI file (runs off the event loop)."""
+        rng = random.Random(seed)
+
         try:
             mid = mido.MidiFile(ticks_per_beat=480)
             ticks_per_beat = 480
@@ -174,7 +215,7 @@ class SimpleMidiService:
             scale = get_scale(key)
             mood_cfg = MOOD_SETTINGS.get(mood, MOOD_SETTINGS["Happy"])
             style_patterns = MELODIC_PATTERNS.get(style, MELODIC_PATTERNS["Classical"])
-            chords = get_progression_chords(key, style)
+            chords = get_progression_chords(key, style, rng=rng)
 
             # Calculate total beats
             total_beats = (duration_sec * tempo) / 60.0
@@ -183,15 +224,19 @@ class SimpleMidiService:
             # Generate melody
             self._generate_melody(
                 melody_track, scale, style_patterns, mood_cfg,
-                total_beats, ticks_per_beat, tempo
+                total_beats, ticks_per_beat, tempo, rng, cancel,
+                start_pitch, beat_offset
             )
 
             # Generate accompaniment (chords)
             self._generate_accompaniment(
                 accomp_track, chords, mood_cfg, style,
-                total_beats, ticks_per_beat, tempo
+                total_beats, ticks_per_beat, tempo, rng, cancel, beat_offset
             )
 
+            if cancel.is_set():
+                return None, "Generation cancelled"
+
             # Add end-of-track
             melody_track.append(mido.MetaMessage('end_of_track', time=0))
             accomp_track.append(mido.MetaMessage('end_of_track', time=0))
@@ -199,7 +244,7 @@ class SimpleMidiService:
             # Save file
             os.makedirs(self.output_dir, exist_ok=True)
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"piano_{mood.lower()}_{style.lower()}_{key.replace(' ', '_')}_{timestamp}.mid"
+            filename = f"piano_{mood.lower()}_{style.lower()}_{key.replace(' ', '_')}_{timestamp}_{uuid4().hex[:8]}.mid"
             filepath = os.path.join(self.output_dir, filename)
 
             mid.save(filepath)
@@ -216,7 +261,11 @@ class SimpleMidiService:
         mood_cfg: dict,
         total_beats: float,
         ticks_per_beat: int,
-        tempo: int
+        tempo: int,
+        rng: random.Random,
+        cancel: threading.Event,
+        start_pitch: Optional[int] = None,
+        beat_offset: float = 0.0
     ):
         """Generate a melodic line using motifs and patterns."""
         motifs = style_patterns["motifs"]
@@ -224,6 +273,10 @@ class SimpleMidiService:
 
         current_beat = 0.0
         current_scale_idx = len(scale) // 2  # Start in middle of scale
+        if start_pitch is not None:
+            # Resume from the scale degree closest to where the piece left off
+            target = start_pitch - mood_cfg["octave_preference"] * 12
+            current_scale_idx = min(range(len(scale)), key=lambda i: abs(scale[i] - target))
         velocity_base = mood_cfg["velocity_base"]
         velocity_var = mood_cfg["velocity_variation"]
         density = mood_cfg["note_density"]
@@ -232,10 +285,10 @@ class SimpleMidiService:
         beats_per_phrase = 16.0  # 4 bars of 4/4
         phrase_num = 0
 
-        while current_beat < total_beats:
+        while current_beat < total_beats and not cancel.is_set():
             # Pick a motif and rhythm
-            motif = random.choice(motifs)
-            rhythm = random.choice(rhythm_patterns)
+            motif = rng.choice(motifs)
+            rhythm = rng.choice(rhythm_patterns)
 
             # Adjust rhythm for density
             rhythm = [r / density for r in rhythm]
@@ -244,9 +297,9 @@ class SimpleMidiService:
             pattern_len = min(len(motif), len(rhythm))
 
             # Add occasional rests between phrases
-            phrase_position = current_beat % beats_per_phrase
-            if phrase_position < 0.01 and phrase_num > 0 and random.random() < 0.3:
-                rest_beats = random.choice([0.5, 1.0, 1.5])
+            phrase_position = (current_beat + beat_offset) % beats_per_phrase
+            if phrase_position < 0.01 and phrase_num > 0 and rng.random() < 0.3:
+                rest_beats = rng.choice([0.5, 1.0, 1.5])
                 current_beat += rest_beats
 
             pending_gap = 0
@@ -264,15 +317,15 @@ class SimpleMidiService:
                 note = max(36, min(96, note))
 
                 # Calculate velocity with musical dynamics
-                phrase_pos_fraction = (current_beat % beats_per_phrase) / beats_per_phrase
+                phrase_pos_fraction = ((current_beat + beat_offset) % beats_per_phrase) / beats_per_phrase
                 # Crescendo in first half, decrescendo in second
                 dynamic_curve = 1.0 - abs(phrase_pos_fraction - 0.5) * 0.4
                 # Beat emphasis (stronger on beats 1 and 3)
-                beat_in_bar = current_beat % 4.0
+                beat_in_bar = (current_beat + beat_offset) % 4.0
                 beat_accent = 1.1 if beat_in_bar < 0.1 or abs(beat_in_bar - 2.0) < 0.1 else 1.0
 
                 velocity = int(velocity_base * dynamic_curve * beat_accent +
-                             random.randint(-velocity_var // 2, velocity_var // 2))
+                             rng.randint(-velocity_var // 2, velocity_var // 2))
                 velocity = max(30, min(127, velocity))
 
                 # Note duration
@@ -292,8 +345,8 @@ class SimpleMidiService:
                 current_scale_idx = target_idx  # Track position for next motif
 
             # After motif, maybe step to neighboring area
-            if random.random() < 0.3:
-                step = random.choice([-2, -1, 1, 2])
+            if rng.random() < 0.3:
+                step = rng.choice([-2, -1, 1, 2])
                 if mood_cfg["prefer_ascending"]:
                     step = abs(step)
                 current_scale_idx += step
@@ -315,7 +368,10 @@ class SimpleMidiService:
         style: str,
         total_beats: float,
         ticks_per_beat: int,
-        tempo: int
+        tempo: int,
+        rng: random.Random,
+        cancel: threading.Event,
+        beat_offset: float = 0.0
     ):
         """Generate chord accompaniment for the left hand."""
         chord_velocity = mood_cfg["chord_velocity"]
@@ -324,8 +380,8 @@ class SimpleMidiService:
         # Calculate how many beats each chord gets
         chord_cycle_beats = len(chords) * 4.0  # Each chord gets 4 beats by default
 
-        while current_beat < total_beats:
-            chord_idx = int((current_beat % chord_cycle_beats) / 4.0) % len(chords)
+        while current_beat < total_beats and not cancel.is_set():
+            chord_idx = int(((current_beat + beat_offset) % chord_cycle_beats) / 4.0) % len(chords)
             chord_notes = chords[chord_idx]
 
             if style == "Ambient":
@@ -341,12 +397,12 @@ class SimpleMidiService:
                     [0.5, 1.5, 1.0, 1.0],
                     [2.0, 1.0, 1.0],
                 ]
-                pattern = random.choice(comp_patterns)
+                pattern = rng.choice(comp_patterns)
                 pending_gap = 0
                 for dur in pattern:
                     if current_beat >= total_beats:
                         break
-                    vel = chord_velocity + random.randint(-10, 10)
+                    vel = chord_velocity + rng.randint(-10, 10)
                     vel = max(25, min(110, vel))
                     self._play_chord_sustained(track, chord_notes, vel, ticks_per_beat, dur * 0.8, time_offset=pending_gap)
                     pending_gap = int(dur * 0.2 * ticks_per_beat)
@@ -359,7 +415,7 @@ class SimpleMidiService:
                     [0, 2, 1, 2],    # Root-5th-3rd-5th
                     [0, 1, 2, 0],    # Simple arpeggio
                 ]
-                arp = random.choice(arp_patterns)
+                arp = rng.choice(arp_patterns)
                 beat_dur = 1.0
                 pending_gap = 0
                 for idx in arp:
@@ -367,7 +423,7 @@ class SimpleMidiService:
                         break
                     note_idx = idx % len(chord_notes)
                     note = chord_notes[note_idx]
-                    vel = chord_velocity + random.randint(-5, 5)
+                    vel = chord_velocity + rng.randint(-5, 5)
                     vel = max(25, min(110, vel))
                     dur_ticks = int(beat_dur * ticks_per_beat * 0.85)
                     gap_ticks = int(beat_dur * ticks_per_beat * 0.15)
@@ -378,7 +434,7 @@ class SimpleMidiService:
 
             else:  # Classical
                 # Alberti bass pattern or block chords alternating
-                if random.random() < 0.5:
+                if rng.random() < 0.5:
                     # Alberti bass: root-5th-3rd-5th
                     alberti = [0, 2, 1, 2] if len(chord_notes) >= 3 else [0, 1, 0, 1]
                     beat_dur = 1.0
@@ -388,7 +444,7 @@ class SimpleMidiService:
                             break
                         note_idx = idx % len(chord_notes)
                         note = chord_notes[note_idx]
-                        vel = chord_velocity + random.randint(-8, 8)
+                        vel = chord_velocity + rng.randint(-8, 8)
                         vel = max(25, min(110, vel))
                         dur_ticks = int(beat_dur * ticks_per_beat * 0.9)
                         gap_ticks = int(beat_dur * ticks_per_beat * 0.1)
@@ -398,7 +454,7 @@ class SimpleMidiService:
                         current_beat += beat_dur
                 else:
                     # Block chord on beat 1, single bass on beat 3
-                    vel = chord_velocity + random.randint(-5, 5)
+                    vel = chord_velocity + rng.randint(-5, 5)
                     vel = max(25, min(110, vel))
                     self._play_chord_sustained(track, chord_notes, vel, ticks_per_beat, 2.0)
                     current_beat += 2.0
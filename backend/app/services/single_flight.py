@@ -0,0 +1,126 @@
+"""
+Single-flight coalescing of identical generation requests.
+Concurrent submissions of the same seeded parameters (or explicit "same as"
+requests) attach to one in-flight generation and share its result. A
+request that cancels while others still share the generation only detaches.
+"""
+import asyncio
+import hashlib
+from typing import Dict, List, Optional, Callable, Awaitable, Tuple
+
+from ..models import MusicParameters, MidiFileMetadata
+
+ProgressCallback = Callable[[str, int, str], Awaitable[None]]
+
+
+class Flight:
+    """One in-flight generation and everyone waiting on it."""
+
+    def __init__(self, job_id: str, key: Optional[str]):
+        self.job_id = job_id
+        self.key = key
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.listeners: List[ProgressCallback] = []
+        self.last_progress: Optional[Tuple[str, int, str]] = None
+        # Requests sharing the result: the leader plus everyone who joined
+        self.holders = 1
+
+
+class SingleFlight:
+    """Registry of in-flight generations, addressable by parameter key or job id."""
+
+    def __init__(self):
+        self._by_key: Dict[str, Flight] = {}
+        self._by_job: Dict[str, Flight] = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "detached": 0}
+
+    @staticmethod
+    def key_for(parameters: MusicParameters) -> Optional[str]:
+        """Coalescing key for deterministic requests; unseeded requests get none."""
+        if parameters.seed is None:
+            return None
+        # The latency budget changes how a result is delivered, not the result
+        data = parameters.model_dump_json(exclude={"latency_budget"})
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def get(self, job_id: str) -> Optional[Flight]:
+        return self._by_job.get(job_id)
+
+    def join(self, key: Optional[str] = None, job_id: Optional[str] = None) -> Optional[Flight]:
+        """Find an in-flight generation to attach to, counting the coalesced request."""
+        flight = (job_id and self._by_job.get(job_id)) or (key and self._by_key.get(key))
+        if flight:
+            flight.holders += 1
+            self.stats["coalesced"] += 1
+        return flight or None
+
+    def leave(self, job_id: str) -> bool:
+        """
+        Detach one request from a flight's job instead of cancelling it.
+
+        Returns:
+            True if others still share the job (it keeps running); False
+            if there is no flight or this was its last request
+        """
+        flight = self._by_job.get(job_id)
+        if flight is None or flight.holders <= 1:
+            return False
+        flight.holders -= 1
+        self.stats["detached"] += 1
+        return True
+
+    def lead(self, job_id: str, key: Optional[str] = None) -> Flight:
+        """Register a new in-flight generation."""
+        flight = Flight(job_id, key)
+        self._by_job[job_id] = flight
+        if key:
+            self._by_key[key] = flight
+        self.stats["leaders"] += 1
+        return flight
+
+    async def progress(self, flight: Flight, stage: str, progress: int, message: str):
+        """Forward a progress update to every attached request."""
+        flight.last_progress = (stage, progress, message)
+        for listener in list(flight.listeners):
+            try:
+                await listener(stage, progress, message)
+            except Exception as e:
+                print(f"Coalesced progress listener failed: {e}")
+
+    def finish(
+        self,
+        flight: Flight,
+        result: Optional[MidiFileMetadata],
+        error: Optional[str]
+    ):
+        """Publish the result and close the flight to new joiners."""
+        self._by_job.pop(flight.job_id, None)
+        if flight.key and self._by_key.get(flight.key) is flight:
+            del self._by_key[flight.key]
+        if not flight.future.done():
+            flight.future.set_result((result, error))
+
+    async def wait(
+        self,
+        flight: Flight,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> Tuple[Optional[MidiFileMetadata], Optional[str]]:
+        """Wait for a flight's result, receiving its progress meanwhile."""
+        if progress_callback:
+            flight.listeners.append(progress_callback)
+            if flight.last_progress:
+                await progress_callback(*flight.last_progress)
+        try:
+            return await asyncio.shield(flight.future)
+        finally:
+            if progress_callback in flight.listeners:
+                flight.listeners.remove(progress_callback)
+            if not flight.future.done():
+                flight.holders -= 1  # the waiter was cancelled
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "in_flight": len(self._by_job)}
+
+
+# Shared registry for the REST and Socket.IO generation paths
+single_flight = SingleFlight()
@@ -0,0 +1,38 @@
+"""
+Socket.IO client managers.
+With SOCKETIO_MESSAGE_QUEUE set, every API process and generation worker
+shares one message queue, so any of them can emit to any connected session.
+"""
+from typing import Optional
+
+import socketio
+
+from ..config import settings
+
+
+def create_client_manager(write_only: bool = False) -> Optional[socketio.AsyncManager]:
+    """
+    Build the client manager for SOCKETIO_MESSAGE_QUEUE.
+
+    - redis:// / rediss:// / unix:// URLs use the Redis pub/sub manager
+      (anything speaking the Redis protocol works, including the local
+      stand-in in benchmarks/fake_redis.py).
+    - amqp:// URLs use the RabbitMQ manager.
+    - Unset returns None: the default in-memory manager, which only
+      reaches sessions connected to the same process.
+
+    Args:
+        write_only: For processes that only emit (generation workers);
+                    they don't listen to the queue or accept connections
+
+    Returns:
+        A client manager, or None for the in-memory default
+    """
+    url = settings.SOCKETIO_MESSAGE_QUEUE
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return socketio.AsyncRedisManager(url, channel=settings.SOCKETIO_CHANNEL, write_only=write_only)
+    if url.startswith("amqp://"):
+        return socketio.AsyncAioPikaManager(url, channel=settings.SOCKETIO_CHANNEL, write_only=write_only)
+    raise ValueError(f"Unsupported SOCKETIO_MESSAGE_QUEUE: {url}")
@@ -0,0 +1,285 @@
+"""
+Idle-time pre-generation pool.
+Tracks which parameter combinations are requested most and, while the
+server is idle, pre-generates pieces for them so matching requests can be
+served instantly.
+"""
+import os
+import time
+import glob
+import shutil
+import asyncio
+import datetime
+from collections import deque
+from typing import Dict, Deque, Optional, Tuple
+from uuid import uuid4
+
+from ..models import (
+    GenerationJob,
+    GenerationStage,
+    GenerationStatus,
+    JobPriority,
+    MidiFileMetadata,
+    MusicParameters
+)
+from ..config import settings
+from ..utils.thumbnail import thumbnail_path_for
+from .generation_service import GenerationService
+from .job_runner import run_generation, apply_result
+from .job_store import job_store, FINISHED_STATUSES
+from .scheduler import scheduler
+from .worker_bridge import worker_bridge
+
+ComboKey = Tuple[str, str, str, int, str, str]
+
+
+class WarmPool:
+    """
+    Pool of ready-made pieces for popular parameter combinations.
+
+    - record() counts requests per combination; counts halve every
+      WARM_POOL_DECAY_SECONDS so the hot set follows current traffic.
+    - A background loop tops up the WARM_POOL_HOT_COMBOS hottest
+      combinations to WARM_POOL_SIZE pieces each, but only while the
+      backend has nothing queued or running and system load is low. After
+      each piece it sleeps long enough to keep refill work within
+      WARM_POOL_CPU_BUDGET of wall time (0 disables refills).
+    - Refills are low-priority jobs in the backend's scheduler pool, or in
+      worker mode in the shared queue, so they take the same slots as user
+      jobs and never run ahead of them. Workers must share WARM_POOL_PATH.
+    - take() hands out a pooled piece, moving it into the gallery.
+
+    Requests with a custom prompt or a seed are never served from the pool.
+    """
+
+    def __init__(self):
+        self.cpu_budget = min(1.0, settings.WARM_POOL_CPU_BUDGET)
+        self.enabled = settings.WARM_POOL_ENABLED and self.cpu_budget > 0
+        self.size = settings.WARM_POOL_SIZE
+        self.hot_combos = settings.WARM_POOL_HOT_COMBOS
+        self.backends = {
+            b.strip() for b in settings.WARM_POOL_BACKENDS.split(",") if b.strip()
+        }
+        self.pool_path = settings.WARM_POOL_PATH
+
+        self._counts: Dict[ComboKey, float] = {}
+        self._params: Dict[ComboKey, MusicParameters] = {}
+        self._pieces: Dict[ComboKey, Deque[MidiFileMetadata]] = {}
+        self._last_decay = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._generator = GenerationService(storage_path=self.pool_path)
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "generated": 0,
+            "discarded": 0,
+            "queue_full": 0,
+            "busy_seconds": 0.0,
+        }
+
+    @staticmethod
+    def key_for(parameters: MusicParameters) -> Optional[ComboKey]:
+        """Combination key, or None for requests the pool cannot serve."""
+        if parameters.prompt or parameters.seed is not None:
+            return None
+        return (
+            parameters.backend.value, parameters.style.value, parameters.key.value,
+            parameters.tempo, parameters.mood.value, parameters.duration.value
+        )
+
+    def record(self, parameters: MusicParameters):
+        """Count a request towards its combination's popularity."""
+        key = self.key_for(parameters)
+        if key is None or key[0] not in self.backends:
+            return
+
+        now = time.monotonic()
+        if now - self._last_decay >= settings.WARM_POOL_DECAY_SECONDS:
+            self._last_decay = now
+            self._counts = {k: c / 2 for k, c in self._counts.items() if c >= 1}
+            self._params = {
+                k: p for k, p in self._params.items() if k in self._counts or self._pieces.get(k)
+            }
+
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self._params[key] = parameters
+
+    async def take(self, parameters: MusicParameters) -> Optional[MidiFileMetadata]:
+        """
+        Serve a pre-generated piece for these parameters.
+
+        Returns:
+            Metadata of the piece, now in the gallery, or None on a miss
+        """
+        key = self.key_for(parameters)
+        if not self.enabled or key is None or key[0] not in self.backends:
+            return None
+
+        pieces = self._pieces.get(key)
+        if not pieces:
+            self.stats["misses"] += 1
+            return None
+
+        piece = pieces.popleft()
+        src = os.path.join(self.pool_path, piece.filename)
+        dst = os.path.join(settings.GENERATED_MIDI_PATH, piece.filename)
+        shutil.move(src, dst)
+        if os.path.exists(thumbnail_path_for(src)):
+            shutil.move(thumbnail_path_for(src), thumbnail_path_for(dst))
+
+        self.stats["hits"] += 1
+        return piece.model_copy(update={
+            "parameters": parameters,
+            "created_at": datetime.datetime.now()
+        })
+
+    def _hot_deficits(self):
+        """Hot combinations that are below target size, hottest first."""
+        hot = sorted(self._counts.items(), key=lambda kv: kv[1], reverse=True)
+        for key, count in hot[:self.hot_combos]:
+            if count < settings.WARM_POOL_MIN_REQUESTS:
+                break
+            if len(self._pieces.get(key, ())) < self.size:
+                yield key
+
+    @staticmethod
+    async def _is_idle(backend: str) -> bool:
+        if settings.GENERATION_MODE == "worker":
+            # Jobs run in worker processes: look at the shared queue instead
+            if worker_bridge.running(backend):
+                return False
+            if await asyncio.to_thread(worker_bridge.state.queue_depth, backend):
+                return False
+        else:
+            pool = scheduler.pools.get(backend)
+            if pool is not None and (pool.pending or pool.running):
+                return False
+        if hasattr(os, "getloadavg"):
+            load = os.getloadavg()[0] / (os.cpu_count() or 1)
+            if load > settings.WARM_POOL_MAX_LOAD:
+                return False
+        return True
+
+    async def _submit(self, job: GenerationJob) -> bool:
+        """Queue a refill job at low priority; False if the backend's queue is full."""
+        if settings.GENERATION_MODE == "worker":
+            job_store.add(job)
+            accepted, _ = await worker_bridge.enqueue(job, warm=True)
+            if not accepted:
+                apply_result(job, None, "Queue full")
+            return accepted
+
+        accepted, _ = scheduler.submit(
+            job.job_id,
+            job.parameters.backend,
+            lambda: run_generation(job.job_id, job.parameters, service=self._generator),
+            priority=JobPriority.LOW
+        )
+        if accepted:
+            job_store.add(job)
+        return accepted
+
+    @staticmethod
+    async def _wait(job_id: str) -> Tuple[GenerationJob, float]:
+        """Wait for a refill job to finish; returns the job and how long it ran."""
+        started = None
+        while True:
+            version = job_store.version(job_id)
+            job = job_store.get(job_id)
+            if started is None and job.status != GenerationStatus.PENDING:
+                started = time.monotonic()
+            if job.status in FINISHED_STATUSES:
+                return job, time.monotonic() - started
+            await job_store.wait_for_change(job_id, version, settings.WARM_POOL_INTERVAL)
+
+    async def _refill_one(self, key: ComboKey) -> Optional[float]:
+        """
+        Generate one piece for a combination as a low-priority job.
+
+        Returns:
+            Seconds the job ran, or None if the backend's queue was full
+        """
+        parameters = self._params[key]
+        job = GenerationJob(
+            job_id=f"warm-{uuid4()}",
+            status=GenerationStatus.PENDING,
+            stage=GenerationStage.INITIALIZING,
+            progress=0,
+            message="Warm pool refill",
+            parameters=parameters,
+            created_at=datetime.datetime.now(),
+            priority=JobPriority.LOW
+        )
+        if not await self._submit(job):
+            self.stats["queue_full"] += 1
+            return None
+
+        job, elapsed = await self._wait(job.job_id)
+        result, error = job.result, job.error
+        self.stats["busy_seconds"] += elapsed
+
+        if result and result.backend == parameters.backend:
+            self._pieces.setdefault(key, deque()).append(result)
+            self.stats["generated"] += 1
+        else:
+            # Fell back to another engine; a live request might not
+            if result:
+                self._remove_files(result.filename)
+            self.stats["discarded"] += 1
+            print(f"Warm pool refill for {key} not kept: {error or 'fallback result'}")
+        return elapsed
+
+    def _remove_files(self, filename: str):
+        path = os.path.join(self.pool_path, filename)
+        for p in (path, thumbnail_path_for(path)):
+            if os.path.exists(p):
+                os.remove(p)
+
+    async def _refill_loop(self):
+        while True:
+            await asyncio.sleep(settings.WARM_POOL_INTERVAL)
+            for key in list(self._hot_deficits()):
+                if not await self._is_idle(key[0]):
+                    continue
+                try:
+                    elapsed = await self._refill_one(key)
+                except Exception as e:
+                    print(f"Warm pool refill failed for {key}: {e}")
+                    continue
+                if elapsed is None:
+                    break  # busy after all; try again next round
+                # Stay within the CPU budget: busy / (busy + idle) <= budget
+                await asyncio.sleep(elapsed * (1 - self.cpu_budget) / self.cpu_budget)
+
+    def start(self):
+        """Start the refill loop, discarding pieces left over from a previous run."""
+        if not self.enabled or self._task is not None:
+            return
+        os.makedirs(self.pool_path, exist_ok=True)
+        for leftover in glob.glob(os.path.join(self.pool_path, "*")):
+            os.remove(leftover)
+        self._task = asyncio.create_task(self._refill_loop())
+
+    def get_stats(self) -> dict:
+        """Return hit rate, pool contents and refill counters."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hot = sorted(self._counts.items(), key=lambda kv: kv[1], reverse=True)[:self.hot_combos]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "target_size": self.size,
+            "cpu_budget": self.cpu_budget,
+            "ready": sum(len(p) for p in self._pieces.values()),
+            "hot": [
+                {"combo": "/".join(str(part) for part in key),
+                 "requests": round(count, 1),
+                 "ready": len(self._pieces.get(key, ()))}
+                for key, count in hot
+            ],
+        }
+
+
+# Shared instance used by the generation endpoints
+warm_pool = WarmPool()
@@ -0,0 +1,195 @@
+"""
+API-side bridge to standalone generation workers.
+Enqueues jobs into shared state and turns the shared job event log back
+into job store updates.
+"""
+import os
+import json
+import math
+import time
+import socket
+import asyncio
+from typing import Dict, Optional, Tuple
+
+from ..models import GenerationJob, GenerationStatus
+from ..config import settings
+from .shared_state import SharedState, StateWriter, shared_state
+from .job_store import job_store, FINISHED_STATUSES
+from .scheduler import PRIORITY_RANK
+
+class WorkerBridge:
+    """
+    Connects one API process to the shared job queue and event log.
+
+    Every API process consumes every job event, so status lookups, SSE,
+    long-polls and Socket.IO relays work no matter which process accepted
+    the job. With a Socket.IO message queue, workers also emit straight to
+    the session that submitted a job.
+
+    Writes go through a StateWriter, so they stay off the event loop and
+    land in the order they were made. Queue positions come from a snapshot
+    of the shared queue refreshed about once a second; wait estimates use
+    the run times and concurrency observed in the event log.
+    """
+
+    def __init__(self, state: SharedState, node_id: str = None):
+        self.state = state
+        self.node_id = node_id or settings.NODE_ID or f"{socket.gethostname()}-{os.getpid()}"
+        self._cursor = 0
+        self._task: Optional[asyncio.Task] = None
+        self._writer = StateWriter("worker-bridge")
+        self._positions: Dict[str, Tuple[str, int]] = {}  # job_id -> (backend, jobs ahead)
+        self._running: Dict[str, Tuple[str, float]] = {}  # job_id -> (backend, monotonic start)
+        self._avg_duration: Dict[str, float] = {}  # backend -> moving average run time
+        self.stats = {"enqueued": 0, "rejected": 0, "events": 0}
+
+    async def enqueue(
+        self,
+        job: GenerationJob,
+        sid: Optional[str] = None,
+        alias: Optional[str] = None,
+        inline: Optional[dict] = None,
+        warm: bool = False
+    ) -> Tuple[bool, Optional[int]]:
+        """
+        Queue a job for the worker processes.
+
+        With a sid, the worker emits the job's Socket.IO events to that
+        session itself, under the session's jobId `alias` (needs
+        SOCKETIO_MESSAGE_QUEUE). Warm pool refills (`warm`) are stored in
+        WARM_POOL_PATH instead of the gallery.
+
+        Returns:
+            Tuple of (accepted, retry_after_seconds)
+        """
+        backend = job.parameters.backend.value
+        payload = json.dumps({
+            "job": job.model_dump_json(), "sid": sid, "alias": alias, "inline": inline, "warm": warm
+        })
+        accepted = await self._writer.run(
+            self._enqueue, job.job_id, backend, PRIORITY_RANK[job.priority], payload
+        )
+        if not accepted:
+            self.stats["rejected"] += 1
+            return False, max(1, math.ceil(settings.SHARED_QUEUE_RETRY_AFTER))
+        self.stats["enqueued"] += 1
+        return True, None
+
+    def _enqueue(self, job_id: str, backend: str, priority: int, payload: str) -> bool:
+        if self.state.queue_depth(backend) >= settings.SCHEDULER_MAX_QUEUE_DEPTH:
+            return False
+        self.state.enqueue(job_id, backend, priority, payload)
+        return True
+
+    def queue_info(self, job_id: str) -> Tuple[Optional[int], Optional[float]]:
+        """Return (queue_position, estimated_wait_seconds) for a job waiting in the shared queue."""
+        entry = self._positions.get(job_id)
+        if entry is None:
+            return None, None
+        backend, ahead = entry
+        running = sum(1 for b, _ in self._running.values() if b == backend)
+        wait = math.ceil((ahead + 1) / max(1, running)) * self._avg_duration.get(backend, 5.0)
+        return ahead + 1, round(wait, 1)
+
+    def running(self, backend: str) -> int:
+        """Jobs of a backend running in worker processes, as last reported."""
+        return sum(1 for b, _ in self._running.values() if b == backend)
+
+    def _refresh_positions(self):
+        queued = self.state.queued_jobs()
+        self._positions = {
+            job_id: (backend, ahead)
+            for backend, job_ids in queued.items()
+            for ahead, job_id in enumerate(job_ids)
+        }
+
+    def _observe(self, job: GenerationJob):
+        """Track run times and concurrency per backend from job snapshots."""
+        backend = job.parameters.backend.value
+        if job.status == GenerationStatus.IN_PROGRESS and job.job_id not in self._running:
+            self._running[job.job_id] = (backend, time.monotonic())
+            self._positions.pop(job.job_id, None)
+        elif job.status in FINISHED_STATUSES and job.job_id in self._running:
+            _, started = self._running.pop(job.job_id)
+            if job.status != GenerationStatus.CANCELLED:
+                elapsed = time.monotonic() - started
+                previous = self._avg_duration.get(backend, elapsed)
+                self._avg_duration[backend] = 0.8 * previous + 0.2 * elapsed
+
+    def publish_job(self, job: GenerationJob):
+        """Share a job change made by this API process (creation, cancellation)."""
+        self._writer.submit(self._save_and_publish, job.job_id, job.model_dump_json())
+
+    def _save_and_publish(self, job_id: str, data: str):
+        self.state.save_job(job_id, data)
+        self.state.publish("job", job_id, data)
+
+    async def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job wherever it is.
+
+        Returns:
+            True if the job was still queued and has been withdrawn; False
+            if a cancel request was broadcast to the workers instead
+        """
+        return await self._writer.run(self._cancel, job_id)
+
+    def _cancel(self, job_id: str) -> bool:
+        if self.state.remove_queued(job_id):
+            return True
+        self.state.publish("cancel", job_id)
+        return False
+
+    async def detach(self, job_id: str):
+        """Tell workers to stop emitting a job to the session that submitted it."""
+        await self._writer.run(self.state.publish, "detach", job_id)
+
+    async def _handle(self, event: dict):
+        if event["kind"] != "job":
+            return
+        job = GenerationJob.model_validate_json(event["data"])
+        self._observe(job)
+        job_store.apply(job)
+
+    async def _consume_loop(self):
+        self._cursor = self.state.last_event_id()
+        polls = 0
+        while True:
+            events = await asyncio.to_thread(self.state.read_events, self._cursor)
+            for event in events:
+                self._cursor = event["id"]
+                self.stats["events"] += 1
+                try:
+                    await self._handle(event)
+                except Exception as e:
+                    print(f"Job event {event['id']} failed: {e}")
+            if not events:
+                await asyncio.sleep(settings.SHARED_EVENT_POLL_INTERVAL)
+
+            polls += 1
+            if polls % 10 == 0:
+                try:
+                    await asyncio.to_thread(self._refresh_positions)
+                except Exception as e:
+                    print(f"Queue snapshot failed: {e}")
+            if polls % 600 == 0:
+                await asyncio.to_thread(self.state.prune_events, settings.SHARED_EVENT_RETENTION)
+
+    def start(self):
+        """Start consuming job events."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._consume_loop())
+
+    async def stop(self):
+        """Stop consuming and wait for outstanding writes."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self._writer.close)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "node_id": self.node_id, "cursor": self._cursor}
+
+
+# Shared instance used by the API when GENERATION_MODE is "worker"
+worker_bridge = WorkerBridge(shared_state)
@@ -110,10 +110,10 @@ def get_scale_degree_note(key: str, degree: int) -> int:
     return root + degrees[idx] + (octave * 12)
 
 
-def get_progression_chords(key: str, style: str) -> List[List[int]]:
+def get_progression_chords(key: str, style: str, rng: random.Random = None) -> List[List[int]]:
     """Get chord voicings for a progression in the given key and style."""
     progressions = CHORD_PROGRESSIONS.get(style, CHORD_PROGRESSIONS["Classical"])
-    progression = random.choice(progressions)
+    progression = (rng or random).choice(progressions)
 
     chords = []
     for degree, chord_type in progression:
@@ -0,0 +1,126 @@
+"""
+MIDI splicing utilities.
+Appends one MIDI file to the end of another, trims leading material and
+transposes in place, for continuing existing pieces and reusing Magenta
+CLI output.
+"""
+from typing import List, Tuple
+
+try:
+    import mido
+    MIDO_AVAILABLE = True
+except ImportError:
+    MIDO_AVAILABLE = False
+
+# Setup messages that should only appear once, at the start. The appended
+# section plays in the base piece's tempo (it is placed in beats).
+_SETUP_TYPES = {
+    "track_name", "program_change", "set_tempo", "time_signature",
+    "key_signature", "end_of_track",
+}
+
+
+def _absolute(track, scale: float = 1.0) -> List[Tuple[int, "mido.Message"]]:
+    """Track messages with absolute tick times (optionally rescaled)."""
+    events, tick = [], 0
+    for msg in track:
+        tick += msg.time
+        events.append((round(tick * scale), msg))
+    return events
+
+
+def _relative(events: List[Tuple[int, "mido.Message"]]) -> "mido.MidiTrack":
+    track, prev = mido.MidiTrack(), 0
+    for tick, msg in sorted(events, key=lambda e: e[0]):
+        track.append(msg.copy(time=max(0, tick - prev)))
+        prev = tick
+    return track
+
+
+def end_tick(mid: "mido.MidiFile") -> int:
+    """Tick of the last note-off (or last event) across all tracks."""
+    last = 0
+    for track in mid.tracks:
+        for tick, msg in _absolute(track):
+            if not msg.is_meta:
+                last = max(last, tick)
+    return last
+
+
+def append_midi(base_path: str, addition_path: str, out_path: str, align_beats: int = 0) -> float:
+    """
+    Write base followed by addition to out_path.
+
+    Track i of the addition is appended to track i of the base (extra
+    tracks are added as-is). The addition is rescaled to the base's
+    ticks-per-beat and starts right after the base's last note, rounded
+    up to a multiple of align_beats when given (e.g. 4 for the next bar).
+
+    Returns:
+        Start of the appended section, in beats
+    """
+    base = mido.MidiFile(base_path)
+    addition = mido.MidiFile(addition_path)
+    offset = end_tick(base)
+    if align_beats:
+        bar = align_beats * base.ticks_per_beat
+        offset = -(-offset // bar) * bar
+    scale = base.ticks_per_beat / addition.ticks_per_beat
+
+    out = mido.MidiFile(ticks_per_beat=base.ticks_per_beat)
+    for index in range(max(len(base.tracks), len(addition.tracks))):
+        events = []
+        if index < len(base.tracks):
+            events += [(t, m) for t, m in _absolute(base.tracks[index]) if m.type != "end_of_track"]
+        if index < len(addition.tracks):
+            appended = [
+                (offset + t, m) for t, m in _absolute(addition.tracks[index], scale)
+                if index >= len(base.tracks) or m.type not in _SETUP_TYPES
+            ]
+            events += [(t, m) for t, m in appended if m.type != "end_of_track"]
+        track = _relative(events)
+        track.append(mido.MetaMessage("end_of_track", time=0))
+        out.tracks.append(track)
+
+    out.save(out_path)
+    return offset / base.ticks_per_beat
+
+
+def trim_start(path: str, seconds: float):
+    """
+    Drop notes that start before `seconds` and shift the rest to time zero.
+
+    Used to strip the primer Magenta echoes at the start of its output.
+    """
+    mid = mido.MidiFile(path)
+    tempo = 500000
+    for msg in mid.tracks[0]:
+        if msg.type == "set_tempo":
+            tempo = msg.tempo
+            break
+    cut = int(mido.second2tick(seconds, mid.ticks_per_beat, tempo))
+
+    for index, track in enumerate(mid.tracks):
+        kept, dropped = [], set()
+        for tick, msg in _absolute(track):
+            if msg.type == "note_on" and msg.velocity > 0 and tick < cut:
+                dropped.add((msg.channel, msg.note))
+                continue
+            if msg.type in ("note_off", "note_on") and (msg.channel, msg.note) in dropped:
+                dropped.discard((msg.channel, msg.note))
+                continue
+            kept.append((max(0, tick - cut), msg))
+        mid.tracks[index] = _relative(kept)
+    mid.save(path)
+
+
+def transpose_file(path: str, semitones: int, low: int = 21, high: int = 108):
+    """Shift every note in place by `semitones`, clamped to the piano range."""
+    if not semitones:
+        return
+    mid = mido.MidiFile(path)
+    for track in mid.tracks:
+        for index, msg in enumerate(track):
+            if msg.type in ("note_on", "note_off"):
+                track[index] = msg.copy(note=max(low, min(high, msg.note + semitones)))
+    mid.save(path)
@@ -0,0 +1,90 @@
+"""
+MIDI note extraction utilities.
+Parses a MIDI file into a flat, time-sorted list of notes (seconds-based).
+"""
+from typing import Dict, Any
+
+try:
+    import mido
+    MIDO_AVAILABLE = True
+except ImportError:
+    MIDO_AVAILABLE = False
+
+
+def read_midi_notes(filepath: str) -> Dict[str, Any]:
+    """
+    Read all notes from a MIDI file.
+
+    Args:
+        filepath: Path to the MIDI file
+
+    Returns:
+        Dict with notes, tempo (BPM), duration, ticks_per_beat,
+        track_count and note_count
+    """
+    mid = mido.MidiFile(filepath)
+    notes = []
+    tempo = 500000  # default 120 BPM
+
+    for track_idx, track in enumerate(mid.tracks):
+        current_time = 0  # in ticks
+        active_notes = {}  # note -> (start_tick, velocity)
+
+        for msg in track:
+            current_time += msg.time
+
+            if msg.type == 'set_tempo':
+                tempo = msg.tempo
+
+            if msg.type == 'note_on' and msg.velocity > 0:
+                active_notes[msg.note] = (current_time, msg.velocity)
+            elif msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0):
+                if msg.note in active_notes:
+                    start_tick, velocity = active_notes.pop(msg.note)
+                    dur_ticks = current_time - start_tick
+                    # Convert ticks to seconds
+                    start_sec = mido.tick2second(start_tick, mid.ticks_per_beat, tempo)
+                    dur_sec = mido.tick2second(dur_ticks, mid.ticks_per_beat, tempo)
+                    if dur_sec > 0:
+                        notes.append({
+                            "midi": msg.note,
+                            "time": round(start_sec, 4),
+                            "duration": round(dur_sec, 4),
+                            "velocity": velocity,
+                            "track": track_idx,
+                        })
+
+    # Sort by time
+    notes.sort(key=lambda n: (n["time"], n["midi"]))
+
+    bpm = round(mido.tempo2bpm(tempo))
+    total_duration = max((n["time"] + n["duration"] for n in notes), default=0)
+
+    return {
+        "notes": notes,
+        "tempo": bpm,
+        "duration": round(total_duration, 2),
+        "ticks_per_beat": mid.ticks_per_beat,
+        "track_count": len(mid.tracks),
+        "note_count": len(notes),
+    }
+
+
+def columnar_notes(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert read_midi_notes() output to a column-per-field layout.
+
+    Parallel arrays are about half the size of a list of note objects once
+    serialized, which matters when notes are pushed with every result.
+    """
+    notes = parsed["notes"]
+    return {
+        "midi": [n["midi"] for n in notes],
+        "time": [n["time"] for n in notes],
+        "duration": [n["duration"] for n in notes],
+        "velocity": [n["velocity"] for n in notes],
+        "track": [n["track"] for n in notes],
+        "tempo": parsed["tempo"],
+        "total_duration": parsed["duration"],
+        "note_count": parsed["note_count"],
+    }
@@ -0,0 +1,69 @@
+"""
+Generation parameters stored inside MIDI files.
+The key goes in a standard key_signature meta message; style and mood,
+which MIDI has no message for, go in a text meta message. Continuations
+read them back so a new section matches the piece it extends.
+"""
+from typing import Dict
+
+try:
+    import mido
+    MIDO_AVAILABLE = True
+except ImportError:
+    MIDO_AVAILABLE = False
+
+TAG_PREFIX = "piano-music-gen:"
+
+
+def _mido_key(key: str) -> str:
+    """'Bb major' -> 'Bb', 'A minor' -> 'Am'."""
+    tonic, _, mode = key.partition(" ")
+    return tonic + ("m" if mode == "minor" else "")
+
+
+def _music_key(key: str) -> str:
+    """'Bb' -> 'Bb major', 'Am' -> 'A minor'."""
+    if key.endswith("m"):
+        return f"{key[:-1]} minor"
+    return f"{key} major"
+
+
+def write_tags(path: str, key: str, style: str, mood: str):
+    """Replace the parameter tags at the start of the first track."""
+    mid = mido.MidiFile(path)
+    track = mid.tracks[0]
+    kept = []
+    carry = 0
+    for msg in track:
+        if msg.type == "key_signature" or (msg.type == "text" and msg.text.startswith(TAG_PREFIX)):
+            carry += msg.time  # keep the following events where they were
+            continue
+        kept.append(msg.copy(time=msg.time + carry))
+        carry = 0
+
+    track[:] = [
+        mido.MetaMessage("key_signature", key=_mido_key(key), time=0),
+        mido.MetaMessage("text", text=f"{TAG_PREFIX}style={style};mood={mood}", time=0),
+    ] + kept
+    mid.save(path)
+
+
+def read_tags(path: str) -> Dict[str, str]:
+    """
+    Read the key, style and mood a file was generated with.
+
+    Returns:
+        Dict with whichever of "key", "style" and "mood" the file carries
+        (the first key_signature counts, so files from other tools work too)
+    """
+    tags: Dict[str, str] = {}
+    for track in mido.MidiFile(path).tracks:
+        for msg in track:
+            if msg.type == "key_signature" and "key" not in tags:
+                tags["key"] = _music_key(msg.key)
+            elif msg.type == "text" and msg.text.startswith(TAG_PREFIX):
+                for item in msg.text[len(TAG_PREFIX):].split(";"):
+                    name, _, value = item.partition("=")
+                    if name in ("style", "mood") and value:
+                        tags[name] = value
+    return tags
@@ -0,0 +1,251 @@
+"""
+Score quantization and MusicXML export.
+Turns second-based notes into a beat-grid score split into two hands,
+mirroring the layout SheetMusic.tsx renders (4/4, treble and bass staves).
+"""
+from functools import lru_cache
+from typing import List, Dict, Any, Iterator
+from xml.sax.saxutils import escape
+
+BEATS_PER_MEASURE = 4
+
+# MusicXML note types and their length in quarter notes, longest first
+NOTE_VALUES = [
+    ("whole", 4.0),
+    ("half", 2.0),
+    ("quarter", 1.0),
+    ("eighth", 0.5),
+    ("16th", 0.25),
+    ("32nd", 0.125),
+    ("64th", 0.0625),
+]
+
+# Grids the note values above can notate: 1/grid divisions per beat
+SUPPORTED_DIVISIONS = (1, 2, 4, 8, 16)
+
+
+def grid_divisions(grid: float) -> int:
+    """
+    Divisions per beat for a grid size in beats.
+
+    Raises:
+        ValueError: If the grid isn't a whole note value from a quarter
+                    down to a 64th (triplet grids can't be notated here)
+    """
+    divisions = round(1 / grid) if grid > 0 else 0
+    if divisions not in SUPPORTED_DIVISIONS or abs(divisions * grid - 1) > 1e-9:
+        raise ValueError(f"Unsupported score grid {grid}: use 1, 1/2, 1/4, 1/8 or 1/16 of a beat")
+    return divisions
+
+
+@lru_cache(maxsize=None)
+def note_types(divisions: int) -> List[tuple]:
+    """
+    Note durations in grid divisions mapped to MusicXML note types, longest
+    first: (value, type, dotted) for each plain and dotted value up to a
+    whole note that is a whole number of divisions. With a supported grid
+    the smallest is one division, so every length can be written.
+    """
+    types = []
+    for note_type, quarters in NOTE_VALUES:
+        for dotted in (True, False):
+            value = quarters * divisions * (1.5 if dotted else 1)
+            if value >= 1 and value == int(value) and value <= 4 * divisions:
+                types.append((int(value), note_type, dotted))
+    return sorted(types, key=lambda t: -t[0])
+
+
+STEP_NAMES = ["C", "C", "D", "D", "E", "F", "F", "G", "G", "A", "A", "B"]
+STEP_ALTERS = [0, 1, 0, 1, 0, 0, 1, 0, 1, 0, 1, 0]
+
+
+def quantize_score(
+    parsed: Dict[str, Any],
+    grid: float = 0.25,
+    beats_per_measure: int = BEATS_PER_MEASURE
+) -> Dict[str, Any]:
+    """
+    Quantize parsed notes to a beat grid and split them into hands.
+
+    Hands follow the generator's track layout (first note-bearing track is
+    the right hand, the next the left hand). Single-track files are split
+    at middle C like the browser renderer does.
+
+    Args:
+        parsed: Output of read_midi_notes
+        grid: Grid size in beats (0.25 = sixteenth notes), see grid_divisions
+        beats_per_measure: Beats per measure
+
+    Returns:
+        Compact score model. Each measure holds "treble" and "bass" lists of
+        [onset, duration, [pitches...]] chords, in grid divisions.
+    """
+    notes = parsed["notes"]
+    tempo = parsed["tempo"] or 120
+    divisions = grid_divisions(grid)
+    measure_len = beats_per_measure * divisions
+    bps = tempo / 60.0
+
+    tracks = sorted({n.get("track", 0) for n in notes})
+    split_by_track = len(tracks) >= 2
+    left_tracks = set(tracks[1:])
+
+    # Quantize onsets/durations to whole grid divisions
+    quantized = []
+    for n in notes:
+        onset = int(round(n["time"] * bps * divisions))
+        length = max(1, int(round(n["duration"] * bps * divisions)))
+        if split_by_track:
+            hand = "bass" if n.get("track", 0) in left_tracks else "treble"
+        else:
+            hand = "treble" if n["midi"] >= 60 else "bass"
+        quantized.append((onset, length, n["midi"], hand))
+
+    total = max((o + d for o, d, _, _ in quantized), default=0)
+    measure_count = max(1, -(-total // measure_len))
+    measures = [{"treble": {}, "bass": {}} for _ in range(measure_count)]
+
+    # Group notes sharing an onset into chords, clipped at the barline
+    for onset, length, pitch, hand in quantized:
+        m_idx, beat = divmod(onset, measure_len)
+        length = min(length, measure_len - beat)
+        chords = measures[m_idx][hand]
+        if beat in chords:
+            chords[beat][0] = max(chords[beat][0], length)
+            chords[beat][1].append(pitch)
+        else:
+            chords[beat] = [length, [pitch]]
+
+    return {
+        "tempo": tempo,
+        "beats_per_measure": beats_per_measure,
+        "divisions": divisions,
+        "measures": [
+            {hand: _to_voice(m[hand], measure_len) for hand in ("treble", "bass")}
+            for m in measures
+        ],
+    }
+
+
+def _to_voice(chords: Dict[int, list], measure_len: int) -> List[list]:
+    """Order chords by onset and clip each so the voice never overlaps itself."""
+    onsets = sorted(chords)
+    voice = []
+    for i, onset in enumerate(onsets):
+        length, pitches = chords[onset]
+        next_onset = onsets[i + 1] if i + 1 < len(onsets) else measure_len
+        voice.append([onset, min(length, next_onset - onset), sorted(set(pitches))])
+    return voice
+
+
+def _split_duration(length: int, divisions: int) -> List[tuple]:
+    """Split a duration into representable note values (tied when more than one)."""
+    parts = []
+    for value, note_type, dotted in note_types(divisions):
+        while length >= value:
+            parts.append((value, note_type, dotted))
+            length -= value
+    return parts
+
+
+def _note_xml(value: int, note_type: str, dotted: bool, staff: int,
+              pitch: int = None, chord: bool = False,
+              tie_start: bool = False, tie_stop: bool = False) -> str:
+    """Render one <note> element (a rest when pitch is None)."""
+    parts = ["<note>"]
+    if chord:
+        parts.append("<chord/>")
+    if pitch is None:
+        parts.append("<rest/>")
+    else:
+        alter = STEP_ALTERS[pitch % 12]
+        parts.append(
+            f"<pitch><step>{STEP_NAMES[pitch % 12]}</step>"
+            + (f"<alter>{alter}</alter>" if alter else "")
+            + f"<octave>{pitch // 12 - 1}</octave></pitch>"
+        )
+    parts.append(f"<duration>{value}</duration>")
+    if tie_stop:
+        parts.append('<tie type="stop"/>')
+    if tie_start:
+        parts.append('<tie type="start"/>')
+    parts.append(f"<voice>{staff}</voice><type>{note_type}</type>")
+    if dotted:
+        parts.append("<dot/>")
+    parts.append(f"<staff>{staff}</staff></note>")
+    return "".join(parts)
+
+
+def _rests_xml(length: int, divisions: int, staff: int) -> str:
+    return "".join(_note_xml(v, t, d, staff) for v, t, d in _split_duration(length, divisions))
+
+
+def _voice_xml(voice: List[list], measure_len: int, divisions: int, staff: int) -> str:
+    """Render a voice as notes and rests filling the whole measure."""
+    out = []
+    position = 0
+    for onset, length, pitches in voice:
+        if onset > position:
+            out.append(_rests_xml(onset - position, divisions, staff))
+        pieces = _split_duration(length, divisions)
+        for p_idx, (value, note_type, dotted) in enumerate(pieces):
+            for c_idx, pitch in enumerate(pitches):
+                out.append(_note_xml(
+                    value, note_type, dotted, staff, pitch,
+                    chord=c_idx > 0,
+                    tie_start=p_idx < len(pieces) - 1,
+                    tie_stop=p_idx > 0,
+                ))
+        position = onset + length
+    if position < measure_len:
+        out.append(_rests_xml(measure_len - position, divisions, staff))
+    return "".join(out)
+
+
+def iter_musicxml(score: Dict[str, Any], title: str = "Piano Piece") -> Iterator[str]:
+    """
+    Render a score model as MusicXML, one chunk per measure.
+
+    Args:
+        score: Output of quantize_score
+        title: Work title
+
+    Yields:
+        MusicXML text chunks
+    """
+    divisions = score["divisions"]
+    beats = score["beats_per_measure"]
+    measure_len = beats * divisions
+
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 3.1 Partwise//EN" '
+        '"http://www.musicxml.org/dtds/partwise.dtd">\n'
+        '<score-partwise version="3.1">'
+        f"<work><work-title>{escape(title)}</work-title></work>"
+        '<part-list><score-part id="P1"><part-name>Piano</part-name></score-part></part-list>'
+        '<part id="P1">'
+    )
+
+    for m_idx, measure in enumerate(score["measures"]):
+        chunk = [f'<measure number="{m_idx + 1}">']
+        if m_idx == 0:
+            chunk.append(
+                f"<attributes><divisions>{divisions}</divisions>"
+                "<key><fifths>0</fifths></key>"
+                f"<time><beats>{beats}</beats><beat-type>4</beat-type></time>"
+                "<staves>2</staves>"
+                "<clef number=\"1\"><sign>G</sign><line>2</line></clef>"
+                "<clef number=\"2\"><sign>F</sign><line>4</line></clef>"
+                "</attributes>"
+                '<direction placement="above"><direction-type><metronome>'
+                f"<beat-unit>quarter</beat-unit><per-minute>{score['tempo']}</per-minute>"
+                f'</metronome></direction-type><sound tempo="{score["tempo"]}"/></direction>'
+            )
+        chunk.append(_voice_xml(measure["treble"], measure_len, divisions, 1))
+        chunk.append(f"<backup><duration>{measure_len}</duration></backup>")
+        chunk.append(_voice_xml(measure["bass"], measure_len, divisions, 2))
+        chunk.append("</measure>")
+        yield "".join(chunk)
+
+    yield "</part></score-partwise>\n"
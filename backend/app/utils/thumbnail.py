@@ -0,0 +1,106 @@
+"""
+Piano-roll thumbnail rendering.
+Renders a small SVG preview of a MIDI file that is stored next to it,
+so the gallery can show previews without fetching or parsing notes.
+"""
+import os
+from typing import List, Dict, Any, Optional
+
+from .midi_notes import read_midi_notes, MIDO_AVAILABLE
+
+THUMBNAIL_WIDTH = 240
+THUMBNAIL_HEIGHT = 64
+THUMBNAIL_EXTENSION = ".svg"
+
+# Fill colour per track (right hand, left hand, anything else)
+TRACK_COLORS = ["#6366f1", "#10b981", "#f59e0b"]
+
+
+def thumbnail_path_for(midi_path: str) -> str:
+    """Return the thumbnail path stored next to a MIDI file."""
+    return os.path.splitext(midi_path)[0] + THUMBNAIL_EXTENSION
+
+
+def render_piano_roll_svg(
+    notes: List[Dict[str, Any]],
+    duration: float,
+    width: int = THUMBNAIL_WIDTH,
+    height: int = THUMBNAIL_HEIGHT
+) -> str:
+    """
+    Render notes as a compact SVG piano roll.
+
+    Notes are first split into columnar arrays (time, duration, pitch,
+    velocity, track) and scaled in a single pass per column.
+
+    Args:
+        notes: Notes as returned by read_midi_notes
+        duration: Total duration in seconds
+        width: Image width in pixels
+        height: Image height in pixels
+
+    Returns:
+        SVG document as a string
+    """
+    header = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}">'
+        f'<rect width="{width}" height="{height}" fill="#111827"/>'
+    )
+    if not notes or duration <= 0:
+        return header + "</svg>"
+
+    times = [n["time"] for n in notes]
+    durations = [n["duration"] for n in notes]
+    pitches = [n["midi"] for n in notes]
+    velocities = [n["velocity"] for n in notes]
+    tracks = [n.get("track", 0) for n in notes]
+
+    low = min(pitches) - 1
+    high = max(pitches) + 1
+    row_h = height / (high - low + 1)
+    x_scale = width / duration
+
+    xs = [t * x_scale for t in times]
+    ws = [max(1.0, d * x_scale) for d in durations]
+    ys = [(high - p) * row_h for p in pitches]
+    opacities = [0.35 + 0.65 * (v / 127) for v in velocities]
+    colors = [TRACK_COLORS[min(t, len(TRACK_COLORS) - 1)] for t in tracks]
+
+    rh = max(1.0, row_h)
+    rects = [
+        f'<rect x="{x:.1f}" y="{y:.1f}" width="{w:.1f}" height="{rh:.1f}" '
+        f'fill="{c}" fill-opacity="{o:.2f}"/>'
+        for x, y, w, o, c in zip(xs, ys, ws, opacities, colors)
+    ]
+    return header + "".join(rects) + "</svg>"
+
+
+def write_thumbnail(midi_path: str) -> Optional[str]:
+    """
+    Render and store the thumbnail for a MIDI file.
+
+    The file is written to a temporary path and moved into place so that
+    concurrent readers never see a partial image.
+
+    Args:
+        midi_path: Path to the MIDI file
+
+    Returns:
+        Path of the written thumbnail, or None if rendering failed
+    """
+    if not MIDO_AVAILABLE:
+        return None
+
+    try:
+        parsed = read_midi_notes(midi_path)
+        svg = render_piano_roll_svg(parsed["notes"], parsed["duration"])
+        thumb_path = thumbnail_path_for(midi_path)
+        tmp_path = thumb_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(svg)
+        os.replace(tmp_path, thumb_path)
+        return thumb_path
+    except Exception as e:
+        print(f"Thumbnail rendering failed for {midi_path}: {e}")
+        return None
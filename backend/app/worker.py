@@ -0,0 +1,187 @@
+"""
+Standalone generation worker.
+Pulls jobs from shared state, runs them through the normal generation path
+and publishes every job update back to the API processes. With
+SOCKETIO_MESSAGE_QUEUE set, it also emits Socket.IO events straight to the
+session that submitted a job.
+
+Usage (from backend/):
+    SHARED_STATE_URL=sqlite:///app/storage/shared.db python -m app.worker
+"""
+import os
+import json
+import socket
+import asyncio
+import argparse
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .config import settings
+from .models import GenerationJob, GenerationStatus
+from .services.shared_state import SharedState, StateWriter, shared_state, require_cross_process
+from .services.job_store import job_store, FINISHED_STATUSES
+from .services.scheduler import scheduler
+from .services.magenta_pool import magenta_pool
+from .services.socket_manager import create_client_manager
+from .services.generation_service import GenerationService
+from .services.job_runner import run_generation, mark_cancelled, upgrade_possible
+from .services.job_events import emit_job_update
+
+
+class GenerationWorker:
+    """
+    Claims queued jobs while its local scheduler has free slots for them.
+
+    Per-backend concurrency comes from the same SCHEDULER_*_WORKERS
+    settings the API uses inline, so one worker per core scales Magenta
+    and Simple independently. Cancel and detach requests arrive through
+    the event log.
+
+    Socket.IO emits go through one queue and a single sender task, so a
+    session sees a job's events in order even when they are published
+    faster than the message queue accepts them. The API announces a job
+    before it is claimed and reports cancellations, so workers send
+    neither.
+    """
+
+    def __init__(self, state: SharedState, backends: List[str], worker_id: str = None):
+        self.state = state
+        self.backends = backends
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._routes: Dict[str, Tuple[str, str, dict]] = {}  # job_id -> (Socket.IO sid, client jobId, inline options)
+        # Jobs whose session detached before any worker claimed them (most recent last)
+        self._detached: "OrderedDict[str, bool]" = OrderedDict()
+        self._cursor = 0
+        self._writer = StateWriter("worker")
+        self._emitter = create_client_manager(write_only=True)
+        self._outbox: Optional[asyncio.Queue] = None
+        # Generates warm pool refills into WARM_POOL_PATH; created on first use
+        self._warm_service: Optional[GenerationService] = None
+
+    def _publish(self, job: GenerationJob):
+        self._writer.submit(self._save_and_publish, job.job_id, job.model_dump_json())
+
+        route = self._routes.get(job.job_id)
+        if route is None:
+            return
+        if self._outbox is not None and job.status != GenerationStatus.CANCELLED:
+            self._outbox.put_nowait((route, job.model_copy(deep=True)))
+        if job.status not in FINISHED_STATUSES:
+            return
+        if job.status == GenerationStatus.COMPLETED and job.result and not job.upgrade and upgrade_possible(job):
+            # A hedged result may still be followed by its AI upgrade; stop waiting after WS_UPGRADE_WAIT
+            asyncio.get_running_loop().call_later(settings.WS_UPGRADE_WAIT, self._routes.pop, job.job_id, None)
+        else:
+            self._routes.pop(job.job_id, None)
+
+    def _save_and_publish(self, job_id: str, data: str):
+        self.state.save_job(job_id, data)
+        self.state.publish("job", job_id, data)
+
+    async def _send_events(self):
+        while True:
+            (sid, alias, inline), job = await self._outbox.get()
+            try:
+                await emit_job_update(self._emitter, sid, job, alias, inline=inline)
+            except Exception as e:
+                print(f"Socket.IO emit for {job.job_id} failed: {e}")
+
+    def _free_backends(self) -> List[str]:
+        return [
+            b for b in self.backends
+            if scheduler.pools[b].running + len(scheduler.pools[b].pending) < scheduler.pools[b].workers
+        ]
+
+    async def _claim(self) -> bool:
+        free = self._free_backends()
+        if not free:
+            return False
+        claimed = await asyncio.to_thread(self.state.claim, free, self.worker_id)
+        if not claimed:
+            return False
+
+        job_id, payload = claimed
+        message = json.loads(payload)
+        job = GenerationJob.model_validate_json(message["job"])
+        detached = self._detached.pop(job_id, False)
+        if message.get("sid") and not detached:
+            self._routes[job_id] = (message["sid"], message.get("alias") or job_id, message.get("inline") or {})
+
+        service = None
+        if message.get("warm"):
+            if self._warm_service is None:
+                self._warm_service = GenerationService(storage_path=settings.WARM_POOL_PATH)
+            service = self._warm_service
+
+        job_store.add(job)
+        scheduler.submit(
+            job_id,
+            job.parameters.backend,
+            lambda: run_generation(job_id, job.parameters, service=service),
+            priority=job.priority
+        )
+        return True
+
+    async def _check_cancels(self):
+        events = await asyncio.to_thread(self.state.read_events, self._cursor)
+        for event in events:
+            self._cursor = event["id"]
+            if event["kind"] == "detach":
+                # The submitting session cancelled, but coalesced requests keep the job
+                if self._routes.pop(event["job_id"], None) is None:
+                    self._detached[event["job_id"]] = True
+                    while len(self._detached) > 1000:
+                        self._detached.popitem(last=False)
+                continue
+            if event["kind"] != "cancel":
+                continue
+            job = job_store.get(event["job_id"])
+            if job is not None and job.status not in FINISHED_STATUSES:
+                # Running jobs mark themselves cancelled; queued ones need it here
+                await scheduler.cancel(job.job_id)
+                if job.status not in FINISHED_STATUSES:
+                    mark_cancelled(job)
+
+    async def run(self):
+        """Claim and run jobs until cancelled."""
+        job_store.attach_shared(self.state, publisher=self._publish)
+        job_store.start()
+        scheduler.start()
+        self._cursor = self.state.last_event_id()
+        sender = None
+        if self._emitter is not None:
+            self._outbox = asyncio.Queue()
+            sender = asyncio.create_task(self._send_events())
+        print(f"Worker {self.worker_id} serving {', '.join(self.backends)}")
+
+        try:
+            while True:
+                await self._check_cancels()
+                claimed = await self._claim()
+                if not claimed:
+                    await asyncio.sleep(settings.SHARED_EVENT_POLL_INTERVAL)
+        finally:
+            if sender:
+                sender.cancel()
+            await job_store.stop()
+            await asyncio.to_thread(self._writer.close)
+            if magenta_pool.started:
+                await magenta_pool.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Piano Music Generator worker")
+    parser.add_argument(
+        "--backends",
+        default=settings.WORKER_BACKENDS,
+        help="Comma-separated backends this worker serves"
+    )
+    args = parser.parse_args()
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    require_cross_process(shared_state)
+    asyncio.run(GenerationWorker(shared_state, backends).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Local stand-in for Redis pub/sub.
+
+Speaks just enough of the Redis protocol (HELLO, PING, SUBSCRIBE,
+UNSUBSCRIBE, PUBLISH) for python-socketio's AsyncRedisManager, so the
+Socket.IO message queue can be exercised (and tested) without a Redis
+server. Both RESP2 and RESP3 clients work; every other command gets an
+error reply, which redis-py tolerates for its optional connection setup.
+
+Usage (from backend/):
+    python -m benchmarks.fake_redis --port 6380
+    SOCKETIO_MESSAGE_QUEUE=redis://127.0.0.1:6380/0 ...
+"""
+import asyncio
+import argparse
+from typing import Dict, List, Set
+
+
+def _bulk(value: bytes) -> bytes:
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _array(*items: bytes, push: bool = False) -> bytes:
+    """An array, or with push a RESP3 out-of-band push (pub/sub messages)."""
+    return (b">" if push else b"*") + b"%d\r\n" % len(items) + b"".join(items)
+
+
+class FakeRedis:
+    """Channel subscriptions per connection; PUBLISH fans out to every subscriber."""
+
+    def __init__(self):
+        self._subscribers: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        self._resp3: Set[asyncio.StreamWriter] = set()
+        self.stats = {"connections": 0, "published": 0, "delivered": 0}
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> List[bytes]:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("closed")
+        if not line.startswith(b"*"):
+            return line.split()  # inline command (e.g. from redis-cli)
+        args = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats["connections"] += 1
+        channels: Set[bytes] = set()
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if not args:
+                    continue
+                command = args[0].upper()
+                push = writer in self._resp3
+                if command == b"HELLO" and len(args) > 1 and args[1] in (b"2", b"3"):
+                    if args[1] == b"3":
+                        self._resp3.add(writer)
+                        writer.write(b"%1\r\n" + _bulk(b"proto") + b":3\r\n")
+                    else:
+                        self._resp3.discard(writer)
+                        writer.write(_array(_bulk(b"proto"), b":2\r\n"))
+                elif command == b"PING":
+                    if channels and not push:
+                        writer.write(_array(_bulk(b"pong"), _bulk(b"")))
+                    else:
+                        writer.write(b"+PONG\r\n")
+                elif command == b"SUBSCRIBE":
+                    for channel in args[1:]:
+                        channels.add(channel)
+                        self._subscribers.setdefault(channel, set()).add(writer)
+                        writer.write(_array(_bulk(b"subscribe"), _bulk(channel), b":%d\r\n" % len(channels), push=push))
+                elif command == b"UNSUBSCRIBE":
+                    for channel in args[1:] or list(channels):
+                        channels.discard(channel)
+                        self._subscribers.get(channel, set()).discard(writer)
+                        writer.write(_array(_bulk(b"unsubscribe"), _bulk(channel), b":%d\r\n" % len(channels), push=push))
+                elif command == b"PUBLISH" and len(args) == 3:
+                    receivers = list(self._subscribers.get(args[1], ()))
+                    for receiver in receivers:
+                        receiver.write(_array(
+                            _bulk(b"message"), _bulk(args[1]), _bulk(args[2]), push=receiver in self._resp3
+                        ))
+                    self.stats["published"] += 1
+                    self.stats["delivered"] += len(receivers)
+                    writer.write(b":%d\r\n" % len(receivers))
+                else:
+                    writer.write(b"-ERR unknown command '%s'\r\n" % args[0])
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            for channel in channels:
+                self._subscribers.get(channel, set()).discard(writer)
+            self._resp3.discard(writer)
+            writer.close()
+
+
+async def serve(host: str, port: int) -> asyncio.AbstractServer:
+    """Start a fake Redis server on the running loop."""
+    fake = FakeRedis()
+    return await asyncio.start_server(fake.handle, host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Redis pub/sub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+
+    async def run():
+        server = await serve(args.host, args.port)
+        print(f"Fake Redis listening on redis://{args.host}:{args.port}/0")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
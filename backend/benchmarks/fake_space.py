@@ -0,0 +1,105 @@
+"""
+Local stand-in for a HuggingFace music Space.
+
+Serves the same /predict API as the real Spaces (prompt, length) through
+Gradio, so HuggingFaceService talks to it with its normal gradio_client
+code path. Latency, failure rate and the result shape are configurable.
+Needs the gradio package (benchmark only).
+
+Result shapes:
+    url      a URL of a MIDI file served by this process
+    base64   the MIDI file as a base64 string
+    dict     {"url": ...}
+    list     [url]
+    file     a Gradio file output; the client downloads it and gets a local
+             path (this is how raw bytes reach a gradio_client caller)
+    mixed    a random JSON shape per request
+
+Usage (from backend/):
+    python -m benchmarks.fake_space --port 7860 --latency 2 --jitter 1 --failure-rate 0.1 --shape mixed
+"""
+import time
+import base64
+import random
+import argparse
+import tempfile
+
+import uvicorn
+import gradio as gr
+from fastapi import FastAPI, Response
+
+# One quarter-note middle C: header, then a track with note on, note off, end of track
+MIDI_BYTES = (
+    b"MThd" + (6).to_bytes(4, "big") + (0).to_bytes(2, "big") + (1).to_bytes(2, "big") + (480).to_bytes(2, "big")
+    + b"MTrk" + (13).to_bytes(4, "big")
+    + bytes([0x00, 0x90, 60, 64, 0x83, 0x60, 0x80, 60, 0x00, 0x00, 0xFF, 0x2F, 0x00])
+)
+
+JSON_SHAPES = ("url", "base64", "dict", "list")
+
+
+def build_app(base_url: str, latency: float, jitter: float, failure_rate: float, shape: str, concurrency: int) -> FastAPI:
+    """Build the FastAPI app serving the MIDI file and the Gradio /predict API."""
+    app = FastAPI()
+    stats = {"requests": 0, "failures": 0}
+    midi_url = f"{base_url}/files/piece.mid"
+
+    @app.get("/files/piece.mid")
+    async def piece():
+        return Response(MIDI_BYTES, media_type="audio/midi")
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    def predict(prompt: str, length: float):
+        stats["requests"] += 1
+        time.sleep(max(0.0, random.gauss(latency, jitter)))
+        if random.random() < failure_rate:
+            stats["failures"] += 1
+            raise gr.Error("Simulated Space failure")
+
+        chosen = random.choice(JSON_SHAPES) if shape == "mixed" else shape
+        if chosen == "file":
+            tf = tempfile.NamedTemporaryFile(delete=False, suffix=".mid")
+            tf.write(MIDI_BYTES)
+            tf.close()
+            return tf.name
+        if chosen == "base64":
+            return base64.b64encode(MIDI_BYTES).decode()
+        if chosen == "dict":
+            return {"url": midi_url}
+        if chosen == "list":
+            return [midi_url]
+        return midi_url
+
+    demo = gr.Interface(
+        fn=predict,
+        inputs=[gr.Textbox(label="prompt"), gr.Number(label="length")],
+        outputs=gr.File() if shape == "file" else gr.JSON(),
+        api_name="predict",
+    )
+    demo.queue(default_concurrency_limit=concurrency)
+    return gr.mount_gradio_app(app, demo, path="/")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake HuggingFace music Space")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7860)
+    parser.add_argument("--latency", type=float, default=2.0, help="mean seconds per prediction")
+    parser.add_argument("--jitter", type=float, default=0.5, help="standard deviation of the latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--shape", choices=JSON_SHAPES + ("file", "mixed"), default="url")
+    parser.add_argument("--concurrency", type=int, default=8, help="predictions served in parallel")
+    args = parser.parse_args()
+
+    app = build_app(
+        f"http://{args.host}:{args.port}", args.latency, args.jitter,
+        args.failure_rate, args.shape, args.concurrency
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Load test for the HuggingFace generation path.
+
+Drives GenerationService (hedging, breakers, Simple MIDI fallback) against
+Spaces given by URL, normally the local fake (benchmarks.fake_space), and
+reports throughput, latency percentiles and how often each path won.
+
+Usage (from backend/, with the fake Space running):
+    python -m benchmarks.hf_load --space http://127.0.0.1:7860/ --requests 50 --concurrency 8
+"""
+import time
+import asyncio
+import argparse
+from collections import Counter
+
+from app.config import settings
+from app.models import MusicParameters, BackendType, MusicStyle, MusicKey, Mood, Duration
+
+
+def _percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(fraction * len(values)))], 2)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="HuggingFace path load test")
+    parser.add_argument("--space", default="http://127.0.0.1:7860/", help="primary Space URL")
+    parser.add_argument("--fallback-space", default=None, help="fallback Space URL (defaults to --space)")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-budget", type=float, default=None,
+                        help="seconds before Simple MIDI is raced (default: HEDGE_LATENCY_BUDGET)")
+    parser.add_argument("--prompts", type=int, default=None,
+                        help="distinct prompts to cycle through (default: one per request)")
+    parser.add_argument("--cache", choices=("off", "exact", "deadline"), default="off")
+    parser.add_argument("--keep-files", action="store_true", help="keep generated files in the gallery")
+    args = parser.parse_args()
+
+    # Point the service at the fake Space before anything reads the settings
+    settings.HF_PRIMARY_MODEL = args.space
+    settings.HF_FALLBACK_MODEL = args.fallback_space or args.space
+    settings.HEDGE_DELIVER_UPGRADE = False
+
+    from app.services.generation_service import GenerationService, hedge_stats
+    from app.services.circuit_breaker import breakers
+    from app.services.gradio_pool import gradio_clients
+    from app.services.prompt_cache import prompt_cache
+
+    prompt_cache.policy = args.cache
+    service = GenerationService()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, outcomes = [], Counter()
+
+    async def one(index: int):
+        parameters = MusicParameters(
+            backend=BackendType.HUGGINGFACE,
+            style=MusicStyle.CLASSICAL,
+            key=MusicKey.C_MAJOR,
+            tempo=100,
+            mood=Mood.HAPPY,
+            duration=Duration.THIRTY_SEC,
+            prompt=f"load test piece {index % (args.prompts or args.requests)}",
+            latency_budget=args.latency_budget,
+        )
+        async with semaphore:
+            started = time.monotonic()
+            result, error = await service.generate(parameters)
+            latencies.append(time.monotonic() - started)
+        if result is None:
+            outcomes["failed"] += 1
+            print(f"  failed: {error}")
+            return
+        outcomes["cache" if result.cached else result.backend.value] += 1
+        if not args.keep_files:
+            service._discard(result)
+
+    started = time.monotonic()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    wall = time.monotonic() - started
+
+    print(f"requests:        {args.requests} at concurrency {args.concurrency}")
+    print(f"wall time:       {wall:.2f}s ({args.requests / wall:.2f} req/s)")
+    print(f"latency p50/p99: {_percentile(latencies, 0.5)}s / {_percentile(latencies, 0.99)}s")
+    for backend, count in sorted(outcomes.items()):
+        print(f"served by {backend + ':':<12} {count} ({100 * count / args.requests:.0f}%)")
+    print("hedging:", hedge_stats.get_stats())
+    print("hf clients:", gradio_clients.get_stats())
+    print("breakers:", [(b["name"], b["state"]) for b in breakers.for_backend("huggingface")])
+    if args.cache != "off":
+        print("cache:", prompt_cache.get_stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
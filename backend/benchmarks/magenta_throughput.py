@@ -0,0 +1,91 @@
+"""
+Magenta throughput benchmark: in-process resident generator vs worker processes.
+
+Runs the same burst of generations through both paths and reports
+requests per second and latency percentiles. Needs Magenta and the
+attention_rnn bundle installed.
+
+Usage (from backend/):
+    python -m benchmarks.magenta_throughput --requests 16 --concurrency 4 --workers 2
+"""
+import os
+import time
+import asyncio
+import argparse
+import statistics
+
+from app.config import settings
+from app.services.magenta_service import MagentaService
+from app.services.magenta_pool import MagentaProcessPool
+
+
+async def _burst(run, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            started = time.monotonic()
+            path, error = await run()
+            latencies.append(time.monotonic() - started)
+            if path and os.path.exists(path):
+                os.remove(path)
+            else:
+                failures += 1
+                print(f"  failed: {error}")
+
+    started = time.monotonic()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    wall = time.monotonic() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "failures": failures,
+        "wall_seconds": round(wall, 2),
+        "requests_per_second": round(requests / wall, 3),
+        "p50_seconds": round(statistics.median(latencies), 2),
+        "p95_seconds": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Magenta throughput benchmark")
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--steps", type=int, default=128)
+    args = parser.parse_args()
+
+    service = MagentaService()
+    if not os.path.exists(service.bundle_file):
+        raise SystemExit(f"Bundle not found at {service.bundle_file}")
+
+    # In-process: resident generator, inference serialized in a thread
+    settings.MAGENTA_WORKERS = 0
+    await service.preload()
+    in_process = await _burst(
+        lambda: service._generate_python_api(args.steps, "60", "C major"),
+        args.requests, args.concurrency
+    )
+    print("in-process:", in_process)
+
+    # Worker processes (wait for every worker to load its model first)
+    pool = MagentaProcessPool(args.workers)
+    pool.start(service.bundle_file)
+    while pool.get_stats()["ready_workers"] + len(pool._fatal) < args.workers:
+        await asyncio.sleep(0.5)
+    workers = await _burst(
+        lambda: pool.generate(service.bundle_file, [60], args.steps, 0),
+        args.requests, args.concurrency
+    )
+    stats = pool.get_stats()
+    await pool.stop()
+    print(f"{args.workers} workers:", workers, "avg batch size:", stats["avg_batch_size"])
+
+    if in_process["requests_per_second"]:
+        print(f"speedup: {workers['requests_per_second'] / in_process['requests_per_second']:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
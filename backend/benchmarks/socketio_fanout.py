@@ -0,0 +1,163 @@
+"""
+Socket.IO fan-out latency across API processes.
+
+Starts N Socket.IO server processes sharing one message queue (the local
+fake Redis unless --redis is given), connects clients to all of them, then
+emits generation_progress events from a write-only client manager, the way
+a generation worker does. Reports how many events arrived and how long
+they took, per server process.
+
+Emitter and clients run in this process, so latency is measured on one
+clock; it includes the queue hop, the server process and the client.
+The servers are bare AsyncServers built with create_client_manager(), so
+only the fan-out path is measured. Needs redis and python-socketio's
+asyncio client (aiohttp).
+
+Usage (from backend/):
+    python -m benchmarks.socketio_fanout --processes 4 --clients 5 --events 500
+    python -m benchmarks.socketio_fanout --broadcast --redis redis://127.0.0.1:6379/0
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from collections import defaultdict
+
+import socketio
+
+from app.config import settings
+
+
+def _percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(fraction * len(values)))] * 1000, 2)
+
+
+def serve(port: int, url: str):
+    """Run one Socket.IO server process on the message queue at url."""
+    import uvicorn
+    from app.services.socket_manager import create_client_manager
+
+    settings.SOCKETIO_MESSAGE_QUEUE = url
+    sio = socketio.AsyncServer(async_mode="asgi", client_manager=create_client_manager())
+
+    @sio.event
+    async def connect(sid, environ):
+        await sio.enter_room(sid, "bench")
+
+    uvicorn.run(socketio.ASGIApp(sio), host="127.0.0.1", port=port, log_level="warning")
+
+
+async def _connect(url: str, timeout: float = 15.0) -> socketio.AsyncClient:
+    deadline = time.monotonic() + timeout
+    while True:
+        client = socketio.AsyncClient()
+        try:
+            await client.connect(url, transports=["websocket"])
+            return client
+        except socketio.exceptions.ConnectionError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def run(args):
+    from app.services.socket_manager import create_client_manager
+
+    processes = []
+    try:
+        url = args.redis
+        if url is None:
+            url = f"redis://127.0.0.1:{args.base_port - 1}/0"
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.fake_redis", "--port", str(args.base_port - 1)]
+            ))
+        for i in range(args.processes):
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.socketio_fanout", "--serve", str(args.base_port + i), "--redis", url]
+            ))
+
+        latencies = defaultdict(list)  # server index -> seconds
+        sent_at = {}
+        clients = []  # (server index, client)
+        for i in range(args.processes * args.clients):
+            server = i % args.processes
+            client = await _connect(f"http://127.0.0.1:{args.base_port + server}")
+
+            def on_progress(data, server=server):
+                latencies[server].append(time.perf_counter() - sent_at[data["jobId"]])
+
+            client.on("generation_progress", on_progress)
+            clients.append((server, client))
+
+        settings.SOCKETIO_MESSAGE_QUEUE = url
+        emitter = create_client_manager(write_only=True)
+        await asyncio.sleep(0.5)  # let every server finish subscribing
+
+        started = time.perf_counter()
+        for n in range(args.events):
+            job_id = f"bench-{n}"
+            room = "bench" if args.broadcast else random.choice(clients)[1].get_sid()
+            sent_at[job_id] = time.perf_counter()
+            await emitter.emit("generation_progress", {
+                "jobId": job_id, "stage": "generating", "progress": n / args.events, "message": "fan-out"
+            }, room=room)
+            if args.interval:
+                await asyncio.sleep(args.interval)
+        emit_seconds = time.perf_counter() - started
+
+        expected = args.events * (len(clients) if args.broadcast else 1)
+        deadline = time.monotonic() + args.timeout
+        while sum(map(len, latencies.values())) < expected and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        received = sum(map(len, latencies.values()))
+        every = [value for values in latencies.values() for value in values]
+        print(f"servers:         {args.processes} x {args.clients} clients on {url}")
+        print(f"events:          {args.events} {'broadcast' if args.broadcast else 'to one session each'}"
+              f" in {emit_seconds:.2f}s ({args.events / emit_seconds:.0f}/s)")
+        print(f"deliveries:      {received}/{expected} ({expected - received} lost)")
+        if every:
+            print(f"latency p50/p99/max: {_percentile(every, 0.5)} / {_percentile(every, 0.99)}"
+                  f" / {_percentile(every, 1.0)} ms")
+        for server in range(args.processes):
+            values = latencies.get(server)
+            if values:
+                print(f"  server {server}: {len(values):>6} events, p50 {_percentile(values, 0.5)} ms,"
+                      f" p99 {_percentile(values, 0.99)} ms")
+            else:
+                print(f"  server {server}: no events")
+
+        for _, client in clients:
+            await client.disconnect()
+    finally:
+        # Servers first, so they don't log the queue going away
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket.IO message queue fan-out benchmark")
+    parser.add_argument("--processes", type=int, default=4, help="Socket.IO server processes")
+    parser.add_argument("--clients", type=int, default=5, help="clients connected to each server")
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=0.002, help="seconds between emits")
+    parser.add_argument("--broadcast", action="store_true",
+                        help="emit every event to every client (default: one random session per event)")
+    parser.add_argument("--redis", default=None, help="message queue URL (default: start benchmarks.fake_redis)")
+    parser.add_argument("--base-port", type=int, default=8101, help="first server port (fake Redis uses the one before)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for stragglers")
+    parser.add_argument("--serve", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        serve(args.serve, args.redis)
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
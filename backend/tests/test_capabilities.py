@@ -0,0 +1,64 @@
+"""
+HuggingFace capability probe: a client setup that outlives the probe
+timeout is not duplicated by later probes, and its client is pooled once
+it lands.
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("gradio_client")
+
+from app.config import settings
+from app.services import capabilities
+
+
+class _Pool:
+    """Gradio client pool whose client setup waits on an event."""
+
+    def __init__(self):
+        self.ready = None
+        self.setups = 0
+        self.released = []
+
+    async def acquire(self, model, token=None):
+        self.setups += 1
+        await self.ready.wait()
+        return f"client for {model}"
+
+    def release(self, model, token, pooled, healthy):
+        self.released.append((pooled, healthy))
+
+    def ping(self, pooled, token=None):
+        return True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = _Pool()
+    monkeypatch.setattr(capabilities, "gradio_clients", pool)
+    monkeypatch.setattr(capabilities, "_setups", {})
+    monkeypatch.setattr(settings, "HF_PRIMARY_MODEL", "space/primary")
+    monkeypatch.setattr(settings, "HF_FALLBACK_MODEL", "space/primary")
+    monkeypatch.setattr(settings, "CAPABILITY_PROBE_TIMEOUT", 0.05)
+    return pool
+
+
+def test_hung_setup_is_not_repeated_and_its_client_is_pooled(pool):
+    async def scenario():
+        pool.ready = asyncio.Event()
+        first = await capabilities.probe_huggingface()
+        second = await capabilities.probe_huggingface()
+        pool.ready.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        third = await capabilities.probe_huggingface()
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+
+    assert first[0] is False and "no response" in first[1] and "still waiting" in first[1]
+    assert second[0] is False and "still waiting" in second[1]
+    assert pool.setups == 2  # the timed-out setup, then the probe after it landed
+    assert pool.released[0] == ("client for space/primary", True)
+    assert third == (True, "space/primary reachable")
@@ -0,0 +1,123 @@
+"""
+Circuit breaker state machine: opening on the error rate, fast-failing,
+the single half-open probe, and the latency/stats report.
+"""
+import pytest
+
+from app.config import settings
+from app.services import circuit_breaker
+from app.services.circuit_breaker import BreakerRegistry, CircuitBreaker, CLOSED, HALF_OPEN, OPEN
+
+
+@pytest.fixture(autouse=True)
+def breaker_settings(monkeypatch):
+    monkeypatch.setattr(settings, "BREAKER_WINDOW", 10)
+    monkeypatch.setattr(settings, "BREAKER_MIN_CALLS", 3)
+    monkeypatch.setattr(settings, "BREAKER_ERROR_RATE", 0.5)
+    monkeypatch.setattr(settings, "BREAKER_OPEN_SECONDS", 30.0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic() for the breaker module."""
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_stays_closed_below_min_calls():
+    breaker = CircuitBreaker("huggingface:model")
+    breaker.record_failure(1.0, "boom")
+    breaker.record_failure(1.0, "boom")
+
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_opens_at_error_rate_and_fails_fast(clock):
+    breaker = CircuitBreaker("huggingface:model")
+    breaker.record_success(1.0)
+    breaker.record_failure(1.0, "timeout")
+    assert breaker.state == CLOSED
+
+    breaker.record_failure(1.0, "timeout")
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.totals["opened"] == 1 and breaker.totals["rejected"] == 1
+    assert breaker.stats()["retry_in_seconds"] == 30.0
+    assert breaker.stats()["last_error"] == "timeout"
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("huggingface:model")
+    for _ in range(3):
+        breaker.record_failure(1.0)
+    clock[0] += 31
+
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes_with_a_fresh_window(clock):
+    breaker = CircuitBreaker("huggingface:model")
+    for _ in range(3):
+        breaker.record_failure(1.0)
+    clock[0] += 31
+    breaker.allow()
+
+    breaker.record_success(2.0)
+
+    assert breaker.state == CLOSED
+    assert breaker.error_rate() == 0.0
+    assert breaker.stats()["window_calls"] == 1
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker("huggingface:model")
+    for _ in range(3):
+        breaker.record_failure(1.0)
+    clock[0] += 31
+    breaker.allow()
+
+    breaker.record_failure(1.0, "still down")
+
+    assert breaker.state == OPEN
+    assert breaker.totals["opened"] == 2
+    assert not breaker.allow()
+
+
+def test_release_frees_the_probe_slot(clock):
+    breaker = CircuitBreaker("huggingface:model")
+    for _ in range(3):
+        breaker.record_failure(1.0)
+    clock[0] += 31
+    assert breaker.allow()
+
+    breaker.release()
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_latency_quantiles_cover_the_window():
+    breaker = CircuitBreaker("magenta:basic_rnn")
+    for latency in range(1, 21):
+        breaker.record_success(float(latency))
+
+    stats = breaker.stats()
+    assert stats["window_calls"] == 10  # BREAKER_WINDOW
+    assert stats["p50_latency_seconds"] == 16.0
+    assert stats["p95_latency_seconds"] == 20.0
+    assert stats["successes"] == 20
+
+
+def test_registry_groups_breakers_by_backend():
+    registry = BreakerRegistry()
+    registry.get("huggingface:b").record_success(1.0)
+    registry.get("huggingface:a")
+    registry.get("magenta:basic_rnn")
+
+    assert registry.get("huggingface:a") is registry.get("huggingface:a")
+    assert [s["name"] for s in registry.for_backend("huggingface")] == ["huggingface:a", "huggingface:b"]
@@ -0,0 +1,41 @@
+"""
+Finalizing a generated file: it is tagged with its parameters, and the
+metadata describes the file as it ends up on disk.
+"""
+import asyncio
+import os
+
+import pytest
+
+mido = pytest.importorskip("mido")
+
+from app.models import BackendType, Duration, Mood, MusicKey, MusicParameters, MusicStyle
+from app.services.generation_service import GenerationService
+from app.utils.midi_tags import read_tags
+
+
+def _piece(path) -> str:
+    mid = mido.MidiFile(ticks_per_beat=480)
+    mid.tracks.append(mido.MidiTrack([
+        mido.Message("note_on", note=60, velocity=80, time=0),
+        mido.Message("note_off", note=60, velocity=0, time=480),
+    ]))
+    mid.save(str(path))
+    return str(path)
+
+
+def test_finalized_metadata_matches_the_tagged_file(tmp_path):
+    service = GenerationService(storage_path=str(tmp_path))
+    parameters = MusicParameters(
+        backend=BackendType.SIMPLE, style=MusicStyle.JAZZ, key=MusicKey.BB_MAJOR,
+        tempo=100, mood=Mood.DREAMY, duration=Duration.THIRTY_SEC,
+    )
+    temp_path = _piece(tmp_path / "generated.part")
+    untagged_size = os.path.getsize(temp_path)
+
+    metadata, error = asyncio.run(service._finalize_file(temp_path, parameters, BackendType.SIMPLE))
+
+    final_path = os.path.join(str(tmp_path), metadata.filename)
+    assert error is None
+    assert read_tags(final_path) == {"key": "Bb major", "style": "Jazz", "mood": "Dreamy"}
+    assert metadata.file_size == os.path.getsize(final_path) > untagged_size
@@ -0,0 +1,86 @@
+"""
+Jobs coalesced onto another request's generation always reach a final
+status, even when the generation they follow never reports a result.
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from app.api import generation
+from app.services import job_runner
+from app.models import (
+    BackendType, Duration, GenerationJob, GenerationStage, GenerationStatus,
+    Mood, MusicKey, MusicParameters, MusicStyle
+)
+from app.services.job_store import JobStore
+from app.services.single_flight import SingleFlight
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = JobStore(db_path=str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(generation, "job_store", store)
+    monkeypatch.setattr(job_runner, "job_store", store)
+    store.add(GenerationJob(
+        job_id="follower",
+        status=GenerationStatus.PENDING,
+        stage=GenerationStage.INITIALIZING,
+        progress=0,
+        parameters=MusicParameters(
+            backend=BackendType.SIMPLE, style=MusicStyle.POP, key=MusicKey.C_MAJOR,
+            tempo=120, mood=Mood.HAPPY, duration=Duration.THIRTY_SEC, seed=1,
+        ),
+        created_at=datetime.now(),
+    ))
+    return store
+
+
+@pytest.fixture
+def flights(monkeypatch):
+    flights = SingleFlight()
+    monkeypatch.setattr(generation, "single_flight", flights)
+    return flights
+
+
+def test_leader_failure_reaches_the_follower(store, flights):
+    async def scenario():
+        flight = flights.lead("leader")
+        follower = asyncio.create_task(generation._follow_flight("follower", flight))
+        await asyncio.sleep(0)
+        flights.finish(flight, None, "Space unavailable")
+        await follower
+
+    asyncio.run(scenario())
+    job = store.get("follower")
+    assert job.status == GenerationStatus.FAILED
+    assert job.error == "Space unavailable"
+
+
+def test_cancelled_follower_is_marked_cancelled(store, flights):
+    async def scenario():
+        follower = asyncio.create_task(generation._follow_flight("follower", flights.lead("leader")))
+        await asyncio.sleep(0)
+        follower.cancel()
+        await asyncio.gather(follower, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert store.get("follower").status == GenerationStatus.CANCELLED
+    assert "follower" not in generation._followers
+
+
+def test_wait_error_fails_the_follower(store, flights, monkeypatch):
+    async def broken_wait(flight, progress_callback=None):
+        raise RuntimeError("flight lost")
+
+    monkeypatch.setattr(flights, "wait", broken_wait)
+
+    async def scenario():
+        await generation._follow_flight("follower", flights.lead("leader"))
+
+    asyncio.run(scenario())
+    job = store.get("follower")
+    assert job.status == GenerationStatus.FAILED
+    assert job.error == "flight lost"
@@ -0,0 +1,75 @@
+"""
+HuggingFace result checks: the MIDI header sniff and size cap, for files
+on disk and for streamed downloads.
+"""
+import os
+
+import pytest
+
+pytest.importorskip("gradio_client")
+
+from app.config import settings
+from app.services import huggingface_service
+from app.services.huggingface_service import _check_midi, _download
+
+
+class _Response:
+    """Just enough of a streamed requests.Response."""
+
+    def __init__(self, chunks, length=None):
+        self.chunks = chunks
+        self.headers = {"Content-Length": str(length)} if length is not None else {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield from self.chunks
+
+
+@pytest.fixture
+def staging(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "GENERATED_MIDI_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 100)
+    return tmp_path
+
+
+def _serve(monkeypatch, response):
+    monkeypatch.setattr(huggingface_service._http, "get", lambda url, **kwargs: response)
+
+
+def test_check_midi(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 100)
+    assert _check_midi(b"MThd", 100) is None
+    assert "larger" in _check_midi(b"MThd", 101)
+    assert "not a MIDI" in _check_midi(b"<htm", 10)
+    assert "not a MIDI" in _check_midi(b"", 0)
+
+
+def test_download_stages_a_valid_result(staging, monkeypatch):
+    _serve(monkeypatch, _Response([b"MT", b"hd\0\0\0\x06", b"rest"], length=14))
+
+    path = _download("https://space/file=result.mid")
+
+    assert path.endswith(".part") and os.path.dirname(path) == str(staging)
+    assert open(path, "rb").read() == b"MThd\0\0\0\x06rest"
+
+
+@pytest.mark.parametrize("response,error", [
+    (_Response([b"MThd"], length=101), "larger"),
+    (_Response([b"MThd", b"x" * 60, b"x" * 60]), "larger"),
+    (_Response([b"<html>error page</html>"]), "not a MIDI"),
+    (_Response([b"MT"]), "not a MIDI"),
+])
+def test_download_rejects_bad_results_without_leaving_files(staging, monkeypatch, response, error):
+    _serve(monkeypatch, response)
+
+    with pytest.raises(ValueError, match=error):
+        _download("https://space/file=result.mid")
+    assert os.listdir(staging) == []
@@ -0,0 +1,71 @@
+"""
+Job store: lazy database creation, TTL/cap eviction of finished jobs and
+persistence through the write-behind flush.
+"""
+import asyncio
+import os
+from datetime import datetime
+
+from app.models import (
+    BackendType, Duration, GenerationJob, GenerationStage, GenerationStatus,
+    Mood, MusicKey, MusicParameters, MusicStyle
+)
+from app.services.job_store import JobStore
+
+
+def _job(job_id: str, status=GenerationStatus.PENDING) -> GenerationJob:
+    return GenerationJob(
+        job_id=job_id,
+        status=status,
+        stage=GenerationStage.INITIALIZING,
+        progress=0,
+        parameters=MusicParameters(
+            backend=BackendType.SIMPLE, style=MusicStyle.POP, key=MusicKey.C_MAJOR,
+            tempo=120, mood=Mood.HAPPY, duration=Duration.THIRTY_SEC,
+        ),
+        created_at=datetime.now(),
+    )
+
+
+def test_database_is_created_on_first_use(tmp_path):
+    db_path = tmp_path / "storage" / "jobs.db"
+    store = JobStore(db_path=str(db_path))
+    assert not db_path.parent.exists()
+
+    assert store.get("missing") is None
+    assert db_path.exists()
+
+
+def test_cap_evicts_oldest_finished_jobs_but_never_running_ones(tmp_path):
+    store = JobStore(db_path=str(tmp_path / "jobs.db"), max_entries=2)
+    store.add(_job("running-1"))
+    store.add(_job("running-2"))
+    store.add(_job("done-1", GenerationStatus.COMPLETED))
+    store.add(_job("running-3"))
+
+    stats = store.get_stats()
+    assert stats["evicted_cap"] == 1
+    assert (stats["in_memory"], stats["running_in_memory"]) == (3, 3)  # the cap is soft
+
+
+def test_evicted_jobs_are_loaded_back_from_sqlite(tmp_path):
+    store = JobStore(db_path=str(tmp_path / "jobs.db"), max_entries=1)
+    store.add(_job("done-1", GenerationStatus.COMPLETED))
+    store.add(_job("done-2", GenerationStatus.FAILED))
+    asyncio.run(store.flush())
+
+    job = store.get("done-1")
+    assert job is not None and job.status == GenerationStatus.COMPLETED
+    assert store.stats["db_hits"] == 1
+
+
+def test_jobs_left_running_by_a_dead_process_are_failed(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    old = JobStore(db_path=db_path)
+    old.add(_job("orphan", GenerationStatus.IN_PROGRESS))
+    asyncio.run(old.flush())
+
+    job = JobStore(db_path=db_path).get("orphan")
+    assert job.status == GenerationStatus.FAILED
+    assert "restart" in job.error
+    assert os.path.exists(db_path)
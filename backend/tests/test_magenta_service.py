@@ -0,0 +1,54 @@
+"""
+Magenta generation order: pooled CLI surplus is served before any new
+generation, and is moved to the requested key.
+"""
+import asyncio
+
+import pytest
+
+mido = pytest.importorskip("mido")
+
+from app.services import magenta_service
+from app.services.magenta_service import MagentaService, VariationPool
+
+
+def _piece(path, note=60) -> str:
+    mid = mido.MidiFile(ticks_per_beat=480)
+    mid.tracks.append(mido.MidiTrack([
+        mido.Message("note_on", note=note, velocity=80, time=0),
+        mido.Message("note_off", note=note, velocity=0, time=480),
+    ]))
+    mid.save(str(path))
+    return str(path)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(magenta_service, "magenta_variations", VariationPool(4))
+    service = MagentaService(bundle_dir=str(tmp_path / "models"), output_dir=str(tmp_path / "out"))
+    calls = []
+
+    async def no_generation(option, run):
+        calls.append(option)
+        return None, f"{option} unavailable"
+
+    monkeypatch.setattr(service, "_guarded", no_generation)
+    service.calls = calls
+    return service
+
+
+def test_pooled_surplus_is_served_before_generating(service, tmp_path):
+    magenta_service.magenta_variations.add((64, "60"), _piece(tmp_path / "surplus.mid"))
+
+    out_path, error = asyncio.run(service.generate(steps=64, primer="60", target_key="D major"))
+
+    assert error is None and service.calls == []
+    notes = [m.note for m in mido.MidiFile(out_path).tracks[0] if m.type == "note_on"]
+    assert notes == [62]
+
+
+def test_empty_pool_falls_through_to_the_python_api_then_the_cli(service):
+    out_path, error = asyncio.run(service.generate(steps=64, primer="60"))
+
+    assert out_path is None and error == "cli unavailable"
+    assert service.calls == ["python", "cli"]
@@ -0,0 +1,113 @@
+"""
+MIDI splicing: appending a section after a piece, trimming a primer off
+the start, transposing, and the generation tags continuations read back.
+"""
+import pytest
+
+mido = pytest.importorskip("mido")
+
+from app.utils.midi_append import append_midi, end_tick, transpose_file, trim_start
+from app.utils.midi_tags import read_tags, write_tags
+
+
+def _write(path, notes, ticks_per_beat=480, tempo=500000, name="Piano"):
+    """A one-track file of (note, start_beat, beats) notes."""
+    mid = mido.MidiFile(ticks_per_beat=ticks_per_beat)
+    events = []
+    for note, start, beats in notes:
+        events.append((round(start * ticks_per_beat), mido.Message("note_on", note=note, velocity=80)))
+        events.append((round((start + beats) * ticks_per_beat), mido.Message("note_off", note=note, velocity=0)))
+    track = mido.MidiTrack([
+        mido.MetaMessage("track_name", name=name, time=0),
+        mido.MetaMessage("set_tempo", tempo=tempo, time=0),
+    ])
+    prev = 0
+    for tick, msg in sorted(events, key=lambda e: e[0]):
+        track.append(msg.copy(time=tick - prev))
+        prev = tick
+    mid.tracks.append(track)
+    mid.save(str(path))
+    return str(path)
+
+
+def _notes(path):
+    """(note, start_tick) of every note_on, plus ticks per beat."""
+    mid = mido.MidiFile(path)
+    notes, tick = [], 0
+    for msg in mid.tracks[0]:
+        tick += msg.time
+        if msg.type == "note_on" and msg.velocity > 0:
+            notes.append((msg.note, tick))
+    return notes, mid.ticks_per_beat
+
+
+def test_end_tick_is_the_last_note_event(tmp_path):
+    path = _write(tmp_path / "base.mid", [(60, 0, 1), (64, 1, 2)])
+    assert end_tick(mido.MidiFile(path)) == 3 * 480
+
+
+def test_append_places_the_addition_after_the_base(tmp_path):
+    base = _write(tmp_path / "base.mid", [(60, 0, 1), (62, 1, 1.5)])
+    addition = _write(tmp_path / "addition.mid", [(67, 0, 1), (69, 1, 1)], ticks_per_beat=96, tempo=400000)
+    out = str(tmp_path / "out.mid")
+
+    start = append_midi(base, addition, out)
+
+    notes, ticks_per_beat = _notes(out)
+    assert start == 2.5
+    assert ticks_per_beat == 480
+    assert notes == [(60, 0), (62, 480), (67, 1200), (69, 1680)]
+    # Setup from the addition is dropped: one name, the base's tempo
+    messages = list(mido.MidiFile(out).tracks[0])
+    assert [m.tempo for m in messages if m.type == "set_tempo"] == [500000]
+    assert sum(m.type == "track_name" for m in messages) == 1
+    assert messages[-1].type == "end_of_track"
+
+
+def test_append_aligns_to_the_next_bar(tmp_path):
+    base = _write(tmp_path / "base.mid", [(60, 0, 5)])
+    addition = _write(tmp_path / "addition.mid", [(67, 0, 1)])
+    out = str(tmp_path / "out.mid")
+
+    assert append_midi(base, addition, out, align_beats=4) == 8.0
+    assert _notes(out)[0][-1] == (67, 8 * 480)
+
+
+def test_trim_start_drops_the_primer(tmp_path):
+    # 120 BPM: one beat is half a second
+    path = _write(tmp_path / "magenta.mid", [(60, 0, 1), (62, 1, 1), (64, 2, 1), (65, 3, 1)])
+
+    trim_start(path, 1.0)
+
+    notes, _ = _notes(path)
+    assert notes == [(64, 0), (65, 480)]
+    mid = mido.MidiFile(path)
+    offs = [m.note for m in mid.tracks[0] if m.type == "note_off"]
+    assert offs == [64, 65]
+
+
+def test_tags_round_trip_and_replace_earlier_tags(tmp_path):
+    path = _write(tmp_path / "piece.mid", [(60, 0, 1)])
+    write_tags(path, "A minor", "Classical", "Melancholic")
+    write_tags(path, "Bb major", "Jazz", "Dreamy")
+
+    assert read_tags(path) == {"key": "Bb major", "style": "Jazz", "mood": "Dreamy"}
+    messages = list(mido.MidiFile(path).tracks[0])
+    assert sum(m.type == "key_signature" for m in messages) == 1
+    assert _notes(path)[0] == [(60, 0)]
+
+
+def test_tags_from_files_without_them(tmp_path):
+    path = _write(tmp_path / "piece.mid", [(60, 0, 1)])
+    assert read_tags(path) == {}
+
+
+def test_transpose_shifts_notes_within_the_piano_range(tmp_path):
+    path = _write(tmp_path / "magenta.mid", [(60, 0, 1), (105, 1, 1), (22, 2, 1)])
+
+    transpose_file(path, 5)
+    assert [note for note, _ in _notes(path)[0]] == [65, 108, 27]
+    transpose_file(path, -7)
+    assert [note for note, _ in _notes(path)[0]] == [58, 101, 21]
+    offs = [m.note for m in mido.MidiFile(path).tracks[0] if m.type == "note_off"]
+    assert offs == [58, 101, 21]
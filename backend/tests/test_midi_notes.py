@@ -0,0 +1,69 @@
+"""
+Note extraction for the piano roll and the inline generation_complete
+payload: read_midi_notes and its column-per-field layout.
+"""
+import json
+
+import pytest
+
+mido = pytest.importorskip("mido")
+
+from app.utils.midi_notes import columnar_notes, read_midi_notes
+
+
+def _write(path):
+    """Right hand C-E, left hand a held C, at 100 BPM."""
+    mid = mido.MidiFile(ticks_per_beat=480)
+    right = mido.MidiTrack([
+        mido.MetaMessage("set_tempo", tempo=mido.bpm2tempo(100), time=0),
+        mido.Message("note_on", note=60, velocity=90, time=0),
+        mido.Message("note_off", note=60, velocity=0, time=480),
+        mido.Message("note_on", note=64, velocity=70, time=0),
+        mido.Message("note_on", note=64, velocity=0, time=240),
+    ])
+    left = mido.MidiTrack([
+        mido.Message("note_on", note=48, velocity=60, time=0),
+        mido.Message("note_off", note=48, velocity=0, time=960),
+    ])
+    mid.tracks.extend([right, left])
+    mid.save(str(path))
+    return str(path)
+
+
+def test_read_midi_notes(tmp_path):
+    parsed = read_midi_notes(_write(tmp_path / "piece.mid"))
+
+    assert parsed["tempo"] == 100
+    assert parsed["note_count"] == 3 and parsed["track_count"] == 2
+    assert [(n["midi"], n["time"], n["duration"], n["track"]) for n in parsed["notes"]] == [
+        (48, 0.0, 1.2, 1), (60, 0.0, 0.6, 0), (64, 0.6, 0.3, 0),
+    ]
+    assert parsed["duration"] == 1.2
+
+
+def test_columnar_notes_keeps_every_field_in_order(tmp_path):
+    parsed = read_midi_notes(_write(tmp_path / "piece.mid"))
+    columns = columnar_notes(parsed)
+
+    assert columns["midi"] == [48, 60, 64]
+    assert columns["velocity"] == [60, 90, 70]
+    assert columns["track"] == [1, 0, 0]
+    rows = list(zip(columns["midi"], columns["time"], columns["duration"], columns["velocity"], columns["track"]))
+    assert rows == [(n["midi"], n["time"], n["duration"], n["velocity"], n["track"]) for n in parsed["notes"]]
+    assert (columns["tempo"], columns["total_duration"], columns["note_count"]) == (100, 1.2, 3)
+
+
+def test_columnar_notes_is_smaller_once_serialized():
+    parsed = {
+        "notes": [
+            {"midi": 60 + i % 12, "time": i * 0.25, "duration": 0.25, "velocity": 80, "track": i % 2}
+            for i in range(200)
+        ],
+        "tempo": 120, "duration": 50.0, "note_count": 200,
+    }
+    assert len(json.dumps(columnar_notes(parsed))) < len(json.dumps(parsed["notes"])) * 0.6
+
+
+def test_columnar_notes_of_an_empty_piece():
+    columns = columnar_notes({"notes": [], "tempo": 120, "duration": 0, "note_count": 0})
+    assert columns["midi"] == [] and columns["note_count"] == 0
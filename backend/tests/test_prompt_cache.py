@@ -0,0 +1,139 @@
+"""
+HuggingFace result cache: keying, reuse policies, variant rotation and
+age/size eviction, on a temporary cache directory.
+"""
+import os
+import time
+
+import pytest
+
+from app.config import settings
+from app.services.prompt_cache import PromptCache
+
+
+@pytest.fixture
+def midi_dir(tmp_path, monkeypatch):
+    """Staging directory for lookup() copies."""
+    staged = tmp_path / "generated"
+    staged.mkdir()
+    monkeypatch.setattr(settings, "GENERATED_MIDI_PATH", str(staged))
+    return staged
+
+
+def _piece(tmp_path, name: str = "piece.mid", size: int = 64) -> str:
+    path = tmp_path / name
+    path.write_bytes(b"MThd" + b"\0" * (size - 4))
+    return str(path)
+
+
+def test_normalize_ignores_case_spacing_and_trailing_punctuation():
+    assert PromptCache.normalize("  Calm   Piano  in C major!! ") == "calm piano in c major"
+
+
+def test_key_depends_on_model_prompt_and_parameters(tmp_path):
+    cache = PromptCache(path=str(tmp_path / "cache"), policy="exact")
+    key = cache.key_for("model-a", "Calm piano.", {"length": 16, "tempo": 90})
+
+    assert key == cache.key_for("model-a", "calm  piano", {"tempo": 90, "length": 16})
+    assert key != cache.key_for("model-b", "calm piano", {"length": 16, "tempo": 90})
+    assert key != cache.key_for("model-a", "calm piano", {"length": 32, "tempo": 90})
+
+
+def test_unknown_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        PromptCache(path=str(tmp_path / "cache"), policy="always")
+
+
+def test_exact_policy_serves_a_staged_copy(tmp_path, midi_dir):
+    cache = PromptCache(path=str(tmp_path / "cache"), policy="exact")
+    key = cache.key_for("model", "calm piano", {})
+    assert cache.lookup([key]) is None
+
+    cache.store(key, _piece(tmp_path))
+    served = cache.lookup(["missing", key])
+
+    assert served is not None and os.path.dirname(served) == str(midi_dir)
+    assert open(served, "rb").read().startswith(b"MThd")
+    os.remove(served)  # the caller owns the copy; the entry stays
+    assert cache.lookup([key]) is not None
+    assert cache.stats["hits"] == 2 and cache.stats["misses"] == 1
+
+
+def test_off_policy_never_reads_or_writes(tmp_path, midi_dir):
+    cache = PromptCache(path=str(tmp_path / "cache"), policy="off")
+    key = cache.key_for("model", "calm piano", {})
+    cache.store(key, _piece(tmp_path))
+
+    assert os.listdir(cache.path) == []
+    assert cache.lookup([key]) is None
+
+
+def test_deadline_policy_serves_slow_or_unestimated_generations(tmp_path, midi_dir, monkeypatch):
+    monkeypatch.setattr(settings, "HF_CACHE_DEADLINE", 30.0)
+    cache = PromptCache(path=str(tmp_path / "cache"), policy="deadline")
+    key = cache.key_for("model", "calm piano", {})
+    cache.store(key, _piece(tmp_path))
+
+    assert cache.lookup([key], expected_latency=10.0) is None
+    assert cache.stats["bypassed"] == 1
+    assert cache.lookup([key], expected_latency=45.0) is not None
+    # No latency estimate yet (cold start): serve the hit
+    assert cache.lookup([key], expected_latency=None) is not None
+
+
+def test_store_keeps_the_newest_variants(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "HF_CACHE_VARIANTS", 2)
+    cache = PromptCache(path=str(tmp_path / "cache"), policy="exact")
+    key = cache.key_for("model", "calm piano", {})
+    for created in (100, 200):
+        name = f"{key}_{int(time.time()) - created}_old{created}.mid"
+        os.replace(_piece(tmp_path), os.path.join(cache.path, name))
+
+    cache.store(key, _piece(tmp_path))
+
+    names = sorted(os.listdir(cache.path))
+    assert len(names) == 2
+    assert not any(name.endswith("_old200.mid") for name in names)
+    assert cache.stats["evicted"] == 1
+
+
+def test_expired_entries_are_ignored_and_evicted(tmp_path, midi_dir, monkeypatch):
+    monkeypatch.setattr(settings, "HF_CACHE_MAX_AGE", 60)
+    cache = PromptCache(path=str(tmp_path / "cache"), policy="exact")
+    key = cache.key_for("model", "calm piano", {})
+    stale = os.path.join(cache.path, f"{key}_{int(time.time()) - 120}_stale.mid")
+    os.replace(_piece(tmp_path), stale)
+
+    assert cache.lookup([key]) is None
+
+    cache.store(cache.key_for("model", "other prompt", {}), _piece(tmp_path))
+    assert not os.path.exists(stale)
+
+
+def test_size_cap_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "HF_CACHE_MAX_BYTES", 250)
+    cache = PromptCache(path=str(tmp_path / "cache"), policy="exact")
+    keys = [cache.key_for("model", f"prompt {n}", {}) for n in range(3)]
+    for n, key in enumerate(keys[:2]):
+        cache.store(key, _piece(tmp_path, size=100))
+        path = cache._variants(key)[0]
+        os.utime(path, (time.time() - 100 + n, time.time() - 100 + n))
+
+    cache.store(keys[2], _piece(tmp_path, size=100))
+
+    assert cache._variants(keys[0]) == []
+    assert cache._variants(keys[1]) and cache._variants(keys[2])
+    assert cache.get_stats()["bytes"] == 200
+
+
+def test_stats_come_from_the_last_scan(tmp_path, monkeypatch):
+    cache = PromptCache(path=str(tmp_path / "cache"), policy="exact")
+    cache.store(cache.key_for("model", "calm piano", {}), _piece(tmp_path, size=100))
+    cache.store(cache.key_for("model", "calm piano", {}), _piece(tmp_path, size=50))
+
+    def no_scan():
+        raise AssertionError("get_stats scanned the cache directory")
+
+    monkeypatch.setattr(cache, "_entries", no_scan)
+    stats = cache.get_stats()
+    assert (stats["entries"], stats["keys"], stats["bytes"]) == (2, 1, 150)
@@ -0,0 +1,101 @@
+"""
+Score quantization: grid validation, note values per grid, hand splitting,
+chords and barline clipping, and the MusicXML rendering of a score.
+"""
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from app.utils.score import grid_divisions, iter_musicxml, note_types, quantize_score
+
+
+def _parsed(*notes, tempo=120):
+    """read_midi_notes-shaped input from (midi, time, duration[, track]) tuples."""
+    return {
+        "tempo": tempo,
+        "notes": [
+            {"midi": n[0], "time": n[1], "duration": n[2], "velocity": 80, "track": n[3] if len(n) > 3 else 0}
+            for n in notes
+        ],
+    }
+
+
+@pytest.mark.parametrize("grid,divisions", [(1, 1), (0.5, 2), (0.25, 4), (0.125, 8), (0.0625, 16)])
+def test_supported_grids(grid, divisions):
+    assert grid_divisions(grid) == divisions
+
+
+@pytest.mark.parametrize("grid", [0, -0.25, 2, 1 / 3, 0.2, 1 / 32])
+def test_unsupported_grids_are_rejected(grid):
+    with pytest.raises(ValueError):
+        grid_divisions(grid)
+
+
+@pytest.mark.parametrize("divisions", [1, 2, 4, 8, 16])
+def test_every_length_in_a_measure_is_notatable(divisions):
+    types = note_types(divisions)
+    assert types[0][0] == 4 * divisions  # a whole note fills the measure
+    assert types[-1][0] == 1
+    assert [t[0] for t in types] == sorted((t[0] for t in types), reverse=True)
+
+
+def test_note_types_include_dotted_values():
+    assert (12, "half", True) in note_types(4)
+    assert (6, "quarter", True) in note_types(4)
+    assert (3, "eighth", True) in note_types(4)
+    assert all(value >= 1 for value, _, _ in note_types(1))
+
+
+def test_single_track_splits_at_middle_c():
+    # 120 BPM: a beat is half a second
+    score = quantize_score(_parsed((64, 0, 0.5), (48, 0, 1.0), (60, 0.5, 0.25)))
+
+    measure = score["measures"][0]
+    assert score["divisions"] == 4
+    assert measure["treble"] == [[0, 4, [64]], [4, 2, [60]]]
+    assert measure["bass"] == [[0, 8, [48]]]
+
+
+def test_two_tracks_become_two_hands():
+    score = quantize_score(_parsed((40, 0, 0.5, 0), (80, 0, 0.5, 1)))
+
+    measure = score["measures"][0]
+    assert measure["treble"] == [[0, 4, [40]]]
+    assert measure["bass"] == [[0, 4, [80]]]
+
+
+def test_chords_share_an_onset_and_voices_never_overlap():
+    score = quantize_score(_parsed((64, 0, 1.0), (67, 0, 0.5), (72, 0.5, 0.5)))
+
+    # The chord is clipped where the next onset starts
+    assert score["measures"][0]["treble"] == [[0, 4, [64, 67]], [4, 4, [72]]]
+
+
+def test_notes_are_clipped_at_the_barline():
+    score = quantize_score(_parsed((64, 1.5, 1.0)), grid=0.5)
+
+    assert len(score["measures"]) == 2
+    assert score["measures"][0]["treble"] == [[6, 2, [64]]]
+    assert score["measures"][1]["treble"] == []
+
+
+def test_empty_piece_has_one_measure():
+    score = quantize_score(_parsed(tempo=0))
+    assert score["tempo"] == 120
+    assert score["measures"] == [{"treble": [], "bass": []}]
+
+
+def test_musicxml_fills_every_measure():
+    score = quantize_score(_parsed((61, 0, 0.75), (48, 0.5, 1.5)), grid=0.125)
+    root = ET.fromstring("".join(iter_musicxml(score, title="Waltz & Co")).split("\n", 2)[2])
+
+    assert root.find("work/work-title").text == "Waltz & Co"
+    measure_len = 4 * score["divisions"]
+    for measure in root.iter("measure"):
+        for staff in ("1", "2"):
+            notes = [n for n in measure.iter("note") if n.find("staff").text == staff and n.find("chord") is None]
+            assert sum(int(n.find("duration").text) for n in notes) == measure_len
+
+    first = next(root.iter("note"))
+    assert (first.find("pitch/step").text, first.find("pitch/alter").text) == ("C", "1")
+    assert first.find("type").text == "quarter" and first.find("dot") is not None
@@ -0,0 +1,118 @@
+"""
+Single-flight coalescing: keys for seeded requests, joining by key or job
+id, progress fan-out and the shared result.
+"""
+import asyncio
+
+from app.models import BackendType, Duration, Mood, MusicKey, MusicParameters, MusicStyle
+from app.services.single_flight import SingleFlight
+
+
+def _parameters(**overrides) -> MusicParameters:
+    values = dict(
+        backend=BackendType.SIMPLE, style=MusicStyle.JAZZ, key=MusicKey.C_MAJOR,
+        tempo=100, mood=Mood.DREAMY, duration=Duration.THIRTY_SEC, seed=7,
+    )
+    values.update(overrides)
+    return MusicParameters(**values)
+
+
+def test_only_seeded_requests_get_a_key():
+    assert SingleFlight.key_for(_parameters(seed=None)) is None
+    assert SingleFlight.key_for(_parameters()) == SingleFlight.key_for(_parameters(latency_budget=5.0))
+    assert SingleFlight.key_for(_parameters()) != SingleFlight.key_for(_parameters(seed=8))
+    assert SingleFlight.key_for(_parameters()) != SingleFlight.key_for(_parameters(tempo=120))
+
+
+def test_join_by_key_or_job_id():
+    async def scenario():
+        flights = SingleFlight()
+        key = SingleFlight.key_for(_parameters())
+        assert flights.join(key=key) is None
+
+        flight = flights.lead("job-1", key)
+        assert flights.join(key=key) is flight
+        assert flights.join(job_id="job-1") is flight
+        assert flights.join(key="other", job_id="job-2") is None
+        return flight.holders, flights.get_stats()
+
+    holders, stats = asyncio.run(scenario())
+    assert holders == 3
+    assert (stats["leaders"], stats["coalesced"], stats["in_flight"]) == (1, 2, 1)
+
+
+def test_waiters_share_progress_and_result():
+    async def scenario():
+        flights = SingleFlight()
+        flight = flights.lead("job-1", "key")
+        seen = {"early": [], "late": []}
+
+        async def listener(name, stage, progress, message):
+            seen[name].append(progress)
+
+        early = asyncio.create_task(flights.wait(flight, lambda *a: listener("early", *a)))
+        await asyncio.sleep(0)
+        await flights.progress(flight, "generating", 40, "Generating")
+        # A late joiner is replayed the latest progress first
+        late = asyncio.create_task(flights.wait(flight, lambda *a: listener("late", *a)))
+        await asyncio.sleep(0)
+        await flights.progress(flight, "generating", 80, "Generating")
+
+        flights.finish(flight, None, "Generation failed")
+        results = await asyncio.gather(early, late)
+        return results, seen, flight.listeners, flights.join(key="key")
+
+    results, seen, listeners, rejoined = asyncio.run(scenario())
+    assert results == [(None, "Generation failed")] * 2
+    assert seen == {"early": [40, 80], "late": [40, 80]}
+    assert listeners == []
+    assert rejoined is None  # finished flights take no new joiners
+
+
+def test_failing_listener_does_not_stop_the_others():
+    async def scenario():
+        flights = SingleFlight()
+        flight = flights.lead("job-1")
+        seen = []
+
+        async def broken(*args):
+            raise RuntimeError("socket gone")
+
+        async def working(stage, progress, message):
+            seen.append(progress)
+
+        flight.listeners.extend([broken, working])
+        await flights.progress(flight, "generating", 10, "Generating")
+        return seen
+
+    assert asyncio.run(scenario()) == [10]
+
+
+def test_leave_detaches_until_the_last_holder():
+    async def scenario():
+        flights = SingleFlight()
+        flight = flights.lead("job-1", "key")
+        flights.join(key="key")
+
+        first = flights.leave("job-1")
+        last = flights.leave("job-1")
+        return first, last, flight.holders, flights.leave("missing"), flights.stats["detached"]
+
+    # The last holder gets False: cancelling the job is up to the caller
+    assert asyncio.run(scenario()) == (True, False, 1, False, 1)
+
+
+def test_cancelled_waiter_gives_up_its_hold():
+    async def scenario():
+        flights = SingleFlight()
+        flight = flights.lead("job-1", "key")
+        flights.join(key="key")
+        waiter = asyncio.create_task(flights.wait(flight))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return flight.holders, flight.future.cancelled(), flights.leave("job-1")
+
+    # The shared result is untouched, and the leader is now the only holder
+    assert asyncio.run(scenario()) == (1, False, False)
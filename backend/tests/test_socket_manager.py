@@ -0,0 +1,67 @@
+"""
+Socket.IO message queue: an emit from a write-only manager (as a worker
+sends it) reaches a client connected to a server in another "process",
+through the local Redis stand-in.
+"""
+import asyncio
+import socket
+
+import pytest
+
+socketio = pytest.importorskip("socketio")
+pytest.importorskip("redis")
+pytest.importorskip("aiohttp")
+uvicorn = pytest.importorskip("uvicorn")
+
+from app.config import settings
+from app.services.socket_manager import create_client_manager
+from benchmarks.fake_redis import serve
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_unset_queue_uses_in_memory_manager(monkeypatch):
+    monkeypatch.setattr(settings, "SOCKETIO_MESSAGE_QUEUE", None)
+    assert create_client_manager() is None
+
+
+def test_unsupported_queue_url(monkeypatch):
+    monkeypatch.setattr(settings, "SOCKETIO_MESSAGE_QUEUE", "kafka://localhost")
+    with pytest.raises(ValueError):
+        create_client_manager()
+
+
+def test_write_only_manager_reaches_remote_session(monkeypatch):
+    redis_port, http_port = _free_port(), _free_port()
+    monkeypatch.setattr(settings, "SOCKETIO_MESSAGE_QUEUE", f"redis://127.0.0.1:{redis_port}/0")
+
+    async def scenario():
+        fake = await serve("127.0.0.1", redis_port)
+        sio = socketio.AsyncServer(async_mode="asgi", client_manager=create_client_manager())
+        server = uvicorn.Server(uvicorn.Config(
+            socketio.ASGIApp(sio), host="127.0.0.1", port=http_port, log_level="warning"
+        ))
+        serving = asyncio.create_task(server.serve())
+        client = socketio.AsyncClient()
+        received = asyncio.get_running_loop().create_future()
+        client.on("generation_progress", lambda data: received.done() or received.set_result(data))
+        try:
+            while not server.started:
+                await asyncio.sleep(0.05)
+            await client.connect(f"http://127.0.0.1:{http_port}", transports=["websocket"])
+            await asyncio.sleep(0.3)  # let the server's manager subscribe
+
+            emitter = create_client_manager(write_only=True)
+            await emitter.emit("generation_progress", {"jobId": "job-1", "progress": 50}, room=client.get_sid())
+            return await asyncio.wait_for(received, 5)
+        finally:
+            await client.disconnect()
+            server.should_exit = True
+            await serving
+            fake.close()
+
+    assert asyncio.run(scenario()) == {"jobId": "job-1", "progress": 50}
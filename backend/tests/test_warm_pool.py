@@ -0,0 +1,86 @@
+"""
+Warm pool refills: they run as low-priority scheduler jobs, only while
+the backend is idle, and land in the pool until a request takes them.
+"""
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("mido")
+
+from app.config import settings
+from app.models import BackendType, Duration, JobPriority, Mood, MusicKey, MusicParameters, MusicStyle
+from app.services import job_runner, warm_pool as warm_pool_module
+from app.services.job_store import JobStore
+from app.services.scheduler import JobScheduler
+from app.services.warm_pool import WarmPool
+
+
+def _parameters() -> MusicParameters:
+    return MusicParameters(
+        backend=BackendType.SIMPLE, style=MusicStyle.CLASSICAL, key=MusicKey.G_MAJOR,
+        tempo=90, mood=Mood.DREAMY, duration=Duration.THIRTY_SEC,
+    )
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    """A warm pool with its own scheduler and job store, in the inline generation mode."""
+    monkeypatch.setattr(settings, "GENERATION_MODE", "inline")
+    monkeypatch.setattr(settings, "WARM_POOL_PATH", str(tmp_path / "warm"))
+    monkeypatch.setattr(settings, "GENERATED_MIDI_PATH", str(tmp_path / "gallery"))
+    monkeypatch.setattr(settings, "WARM_POOL_MIN_REQUESTS", 1)
+    monkeypatch.setattr(settings, "WARM_POOL_MAX_LOAD", float("inf"))
+    os.makedirs(settings.WARM_POOL_PATH)
+    os.makedirs(settings.GENERATED_MIDI_PATH)
+
+    store = JobStore(db_path=str(tmp_path / "jobs.db"))
+    scheduler = JobScheduler()
+    for module in (warm_pool_module, job_runner):
+        monkeypatch.setattr(module, "job_store", store)
+    monkeypatch.setattr(warm_pool_module, "scheduler", scheduler)
+    monkeypatch.setattr(job_runner, "scheduler", scheduler)
+    return WarmPool()
+
+
+def test_refill_runs_as_a_low_priority_job_and_is_served(pool):
+    parameters = _parameters()
+    pool.record(parameters)
+    key = pool.key_for(parameters)
+    submitted = []
+    scheduler = warm_pool_module.scheduler
+    submit = scheduler.submit
+    scheduler.submit = lambda job_id, backend, run, priority: submitted.append(priority) or submit(
+        job_id, backend, run, priority)
+
+    async def scenario():
+        assert await pool._is_idle("simple")
+        elapsed = await pool._refill_one(key)
+        return elapsed, await pool.take(parameters)
+
+    elapsed, piece = asyncio.run(scenario())
+    assert submitted == [JobPriority.LOW]
+    assert elapsed is not None and pool.stats["generated"] == 1
+    assert piece is not None
+    assert os.path.exists(os.path.join(settings.GENERATED_MIDI_PATH, piece.filename))
+    assert os.listdir(settings.WARM_POOL_PATH) == []
+
+
+def test_busy_backend_is_not_idle(pool):
+    warm_pool_module.scheduler.pools["simple"].running = 1
+    assert not asyncio.run(pool._is_idle("simple"))
+
+
+def test_full_queue_skips_the_refill(pool, monkeypatch):
+    parameters = _parameters()
+    pool.record(parameters)
+    monkeypatch.setattr(warm_pool_module.scheduler.pools["simple"], "max_depth", 0)
+
+    assert asyncio.run(pool._refill_one(pool.key_for(parameters))) is None
+    assert pool.stats["queue_full"] == 1
+
+
+def test_zero_cpu_budget_disables_refills(monkeypatch):
+    monkeypatch.setattr(settings, "WARM_POOL_CPU_BUDGET", 0.0)
+    assert not WarmPool().enabled
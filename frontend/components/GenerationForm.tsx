@@ -76,6 +76,7 @@ export default function GenerationForm({ onGenerate, isGenerating }: GenerationF
           <option value="simple">Built-in Piano Engine (Recommended)</option>
           <option value="huggingface">HuggingFace Space (Requires API Key)</option>
           <option value="magenta">Local Magenta (Requires Install)</option>
+          <option value="auto">Auto (Fastest Available AI)</option>
         </select>
 
         {backend === 'magenta' && (
@@ -3,7 +3,7 @@
  * Mirrors backend Pydantic models.
  */
 
-export type BackendType = 'huggingface' | 'magenta' | 'simple';
+export type BackendType = 'huggingface' | 'magenta' | 'simple' | 'auto';
 
 export type MusicStyle = 'Classical' | 'Jazz' | 'Pop' | 'Ambient';
 
@@ -13,7 +13,9 @@ export type Mood = 'Happy' | 'Melancholic' | 'Dreamy' | 'Intense';
 
 export type Duration = '30 sec' | '1 min' | '2 min';
 
-export type GenerationStatus = 'pending' | 'in_progress' | 'completed' | 'failed';
+export type GenerationStatus = 'pending' | 'in_progress' | 'completed' | 'failed' | 'cancelled';
+
+export type JobPriority = 'high' | 'normal' | 'low';
 
 export type GenerationStage = 'initializing' | 'generating' | 'processing' | 'complete' | 'error';
 
@@ -25,10 +27,14 @@ export interface MusicParameters {
   mood: Mood;
   duration: Duration;
   prompt?: string; // Optional custom prompt for HuggingFace
+  seed?: number; // Identical seeded requests share one generation
+  latency_budget?: number; // Seconds before Simple MIDI races the AI backend (0 disables)
 }
 
 export interface GenerationRequest {
   parameters: MusicParameters;
+  priority?: JobPriority;
+  same_as?: string; // Attach to this in-flight job
 }
 
 export interface MidiFileMetadata {
@@ -41,6 +47,17 @@ export interface MidiFileMetadata {
   duration_seconds?: number;
   track_count?: number;
   note_count?: number;
+  thumbnail_url?: string; // Versioned piano-roll SVG preview
+  cached?: boolean; // Served from the HuggingFace prompt cache
+}
+
+export interface ContinueRequest {
+  backend?: 'simple' | 'magenta';
+  duration?: Duration; // Length of the new section
+  style?: MusicStyle; // Omitted: the source file's style, key and mood
+  key?: MusicKey;
+  mood?: Mood;
+  seed?: number;
 }
 
 export interface GenerationJob {
@@ -54,6 +71,29 @@ export interface GenerationJob {
   completed_at?: string;
   result?: MidiFileMetadata;
   error?: string;
+  priority?: JobPriority;
+  queue_position?: number; // 1-based, only while pending
+  estimated_wait_seconds?: number;
+  routing?: RoutingDecision; // Set when the request used the auto backend
+  upgrade?: MidiFileMetadata; // AI result that arrived after a faster Simple MIDI result
+}
+
+export interface RoutingCandidate {
+  backend: BackendType;
+  available: boolean;
+  expected_latency_seconds: number;
+  success_rate: number;
+  samples: number;
+  probe_latency_seconds?: number;
+  breaker_open: boolean;
+  message?: string;
+}
+
+export interface RoutingDecision {
+  chosen: BackendType;
+  reason: string;
+  latency_target_seconds: number;
+  candidates: RoutingCandidate[];
 }
 
 export interface GenerationProgressEvent {
@@ -69,8 +109,35 @@ export interface GenerationCompleteEvent {
   filename: string;
   fileSize: number;
   downloadUrl: string;
+  midi?: ArrayBuffer; // With inlineMidi: the file itself (binary attachment)
+  notes?: ColumnarNotes; // With inlineNotes
+}
+
+// Payload of the generate_request Socket.IO event
+export interface GenerateSocketRequest {
+  jobId: string; // Names the job in this connection's events; the server job id is its own UUID
+  parameters: MusicParameters;
+  priority?: JobPriority;
+  sameAs?: string;
+  inlineMidi?: boolean; // Attach the MIDI bytes to generation_complete
+  inlineNotes?: boolean; // Attach the parsed notes to generation_complete
+}
+
+// Notes as parallel arrays (index i of each array is one note)
+export interface ColumnarNotes {
+  midi: number[];
+  time: number[]; // seconds
+  duration: number[]; // seconds
+  velocity: number[];
+  track: number[];
+  tempo: number;
+  total_duration: number;
+  note_count: number;
 }
 
+// Sent as generation_upgrade when a hedged AI run finishes after Simple MIDI won
+export type GenerationUpgradeEvent = GenerationCompleteEvent;
+
 export interface GenerationErrorEvent {
   jobId: string;
   error: string;
@@ -86,14 +153,74 @@ export interface PaginatedResponse<T> {
   has_prev: boolean;
 }
 
+export interface ResidentModelStatus {
+  bundle: string;
+  config: string;
+  loaded: boolean;
+  loaded_at?: number; // Unix time of the last (re)load
+  load_seconds?: number;
+  loads: number;
+  uses: number;
+  error?: string;
+}
+
 export interface HealthResponse {
   status: 'healthy' | 'degraded' | 'unhealthy';
   backends: Record<string, boolean>;
   timestamp: string;
+  resident_models: ResidentModelStatus[];
+  checked_at?: string; // Oldest cached capability probe used
+}
+
+export interface CapabilityStatus {
+  available: boolean;
+  message: string;
+  probe_seconds: number;
+  checked_at: number; // Unix time
+  age_seconds: number;
+}
+
+export interface ReadinessResponse {
+  ready: boolean;
+  reasons: string[];
+  capabilities: Record<string, CapabilityStatus>;
+  job_store_started: boolean;
+  scheduler_started: boolean;
+  timestamp: string;
+}
+
+export interface BreakerStatus {
+  name: string; // e.g. "huggingface:facebook/musicgen-small", "magenta:cli"
+  state: 'closed' | 'open' | 'half_open';
+  error_rate: number;
+  window_calls: number;
+  p50_latency_seconds?: number;
+  p95_latency_seconds?: number;
+  retry_in_seconds?: number;
+  last_error?: string;
+  successes: number;
+  failures: number;
+  rejected: number;
+  opened: number;
 }
 
 export interface BackendStatus {
   name: string;
   available: boolean;
   message?: string;
+  breakers: BreakerStatus[];
+  cache?: PromptCacheStats; // HuggingFace only
+}
+
+export interface PromptCacheStats {
+  policy: 'off' | 'exact' | 'deadline';
+  hits: number;
+  misses: number;
+  bypassed: number; // Cached variant existed but a fresh generation was expected to be fast enough
+  stored: number;
+  evicted: number;
+  hit_rate: number | null;
+  entries: number;
+  keys: number;
+  bytes: number;
 }